@@ -0,0 +1,216 @@
+"""
+Batch verification over a process pool.
+
+Inputs are JavaScript files given directly, as directories (searched
+recursively for *.js), as glob patterns, or as manifest files.  A manifest
+lists one check per line, either `original.js` (prepack is run) or
+`original.js prepack_output.js` (the given output is checked), or the same as
+JSON objects `{"original": ..., "prepack": ...}`.  Relative manifest paths are
+taken relative to the manifest.
+
+Prepack outputs are not originals: a directory or glob pairs `name.js` with
+a `name.prepack.js` next to it, and a file that any input names as a prepack
+output is never checked on its own.
+
+One JSON line is written per file as soon as it finishes:
+    {"file": ..., "prepack": ..., "verdict": "unsat" | "sat" | "error",
+     "counterexample": [{"var": ..., "original": ..., "prepack": ...}],
+     "unrollDepth": ..., "timings": {...}, "stats": {...}, "error": ...}
+"""
+
+import contextlib
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import verify
+
+# Name of the prepack output that sits next to name.js
+PREPACK_SUFFIX = '.prepack.js'
+
+def readManifest(manifestFile):
+    entries = []
+    baseDir = os.path.dirname(os.path.abspath(manifestFile))
+    with open(manifestFile) as f:
+        for line in f:
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+            if line.startswith('{'):
+                item = json.loads(line)
+                original, prepackFile = item['original'], item.get('prepack')
+            else:
+                fields = line.split()
+                original = fields[0]
+                prepackFile = fields[1] if len(fields) > 1 else None
+            original = os.path.join(baseDir, original)
+            if prepackFile is not None:
+                prepackFile = os.path.join(baseDir, prepackFile)
+            entries.append((original, prepackFile))
+    return entries
+
+def pairOutputs(paths):
+    # (original, prepackFile) of the scripts a directory or glob found, with
+    # every name.prepack.js taken as the output of name.js
+    entries = []
+    for path in paths:
+        if path.endswith(PREPACK_SUFFIX):
+            continue
+        prepackFile = path[:-len('.js')] + PREPACK_SUFFIX
+        entries.append((path, prepackFile if os.path.isfile(prepackFile) else None))
+    return entries
+
+def collectInputs(specs):
+    """
+    Expand files, directories, globs and manifests into (original, prepackFile)
+    pairs, prepackFile is None when prepack should be run
+    """
+    entries = []
+    for spec in specs:
+        if os.path.isdir(spec):
+            for dirPath, dirNames, fileNames in os.walk(spec):
+                dirNames.sort()
+                entries += pairOutputs([os.path.join(dirPath, name) for name in sorted(fileNames) if name.endswith('.js')])
+        elif any(c in spec for c in '*?['):
+            entries += pairOutputs([path for path in sorted(glob.glob(spec, recursive=True)) if path.endswith('.js')])
+        elif spec.endswith('.js'):
+            entries.append((spec, None))
+        else:
+            entries += readManifest(spec)
+    # A manifest's prepack outputs may sit among the originals a directory or glob found
+    prepackFiles = set(os.path.abspath(prepackFile) for _, prepackFile in entries if prepackFile is not None)
+    return [(original, prepackFile) for original, prepackFile in entries if os.path.abspath(original) not in prepackFiles]
+
+def sliceWorkers(jobs):
+    # Slice threads per job, so all the jobs' solvers together use the cores once
+    return max(1, (os.cpu_count() or 1) // jobs)
+
+_workerOptions = {}
+
+def _initWorker(options):
+    # Each worker process has its own copy of the verify module globals
+    _workerOptions.update(options)
+    verify.DEBUG_MODE = False
+    verify.SLICE_WORKERS = options['sliceWorkers']
+    if options['cacheDir'] is not None:
+        verify.PREPACK_CACHE = verify.PrepackCache(options['cacheDir'], options['cacheSize'])
+    if options['portfolio'] is not None:
+        verify.SOLVER_PORTFOLIO = options['portfolio']
+    if options['verdictCacheDir'] is not None:
+        verify.VERDICT_CACHE = verify.VerdictCache(options['verdictCacheDir'], verify.VERDICT_CACHE_BYTES)
+    if options['summaryCacheDir'] is not None:
+        verify.SUMMARY_CACHE = verify.FunctionSummaryCache(options['summaryCacheDir'])
+    if options['prepackWorkers'] > 0:
+        verify.PREPACK_POOL = verify.PrepackWorkerPool(options['prepackWorkers'], options['workerCmd'], options['prepackTimeout'])
+
+def verifyEntry(entry):
+    original, prepackFile = entry
+    record = {'file': original, 'prepack': prepackFile}
+    startTime = time.perf_counter()
+    try:
+        with open(original) as f:
+            program = f.read()
+        prepackOutput = None
+        if prepackFile is not None:
+            with open(prepackFile, 'rb') as f:
+                prepackOutput = f.read()
+
+        # The translator reports progress with print, keep it out of the JSON stream
+        with open(os.devnull, 'w') as devNull, contextlib.redirect_stdout(devNull):
+            smtResult = verify.verifyProgram(program, original, insertFake=_workerOptions.get('insertFake', False),
+                                             incremental=_workerOptions.get('incremental', False),
+                                             prepackOutput=prepackOutput,
+                                             unrollDepth=_workerOptions.get('unrollDepth', 2))
+
+        record['verdict'] = 'sat' if smtResult.verdict == 'sat' else 'unsat'
+        record['counterexample'] = [{'var': var, 'original': varVal, 'ppVar': ppVar, 'prepack': ppVarVal}
+                                    for var, varVal, ppVar, ppVarVal in smtResult.mismatches]
+        record['unrollDepth'] = smtResult.unrollDepth
+        record['timings'] = smtResult.timings
+        record['stats'] = smtResult.stats
+    except (KeyboardInterrupt, GeneratorExit):
+        raise
+    except BaseException as e:
+        # The translator exit()s on unsupported input, report it as an error for this file only
+        record['verdict'] = 'error'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+
+    record.setdefault('timings', {})['total'] = time.perf_counter() - startTime
+    return record
+
+def runBatch(specs, jobs=None, out=None, insertFake=False, incremental=False, unrollDepth=2,
+             cacheDir=verify.DEFAULT_CACHE_DIR, cacheSize=verify.DEFAULT_MAX_BYTES,
+             prepackWorkers=1, workerCmd=None, prepackTimeout=verify.DEFAULT_TIMEOUT, summaryCacheDir=None,
+             portfolio=None, verdictCacheDir=verify.VERDICT_CACHE_DIR):
+    """
+    Verify every input across jobs processes (default: one per core) and
+    write one JSON line per file to out in completion order.  Returns the
+    number of files per verdict.
+    """
+    out = out if out is not None else sys.stdout
+    entries = collectInputs(specs)
+    options = {'insertFake': insertFake, 'incremental': incremental, 'unrollDepth': unrollDepth,
+               'cacheDir': cacheDir, 'cacheSize': cacheSize, 'prepackWorkers': prepackWorkers,
+               'workerCmd': workerCmd, 'prepackTimeout': prepackTimeout,
+               'summaryCacheDir': summaryCacheDir, 'portfolio': portfolio, 'verdictCacheDir': verdictCacheDir}
+    jobs = jobs if jobs else os.cpu_count() or 1
+    jobs = max(1, min(jobs, len(entries)))
+    options['sliceWorkers'] = sliceWorkers(jobs)
+
+    summary = {}
+    with multiprocessing.Pool(jobs, initializer=_initWorker, initargs=(options,)) as pool:
+        for record in pool.imap_unordered(verifyEntry, entries):
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            summary[record['verdict']] = summary.get(record['verdict'], 0) + 1
+    return summary
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description="verify many JavaScript files against their prepack output")
+    parser.add_argument("inputs", nargs='+', help="JavaScript files, directories, glob patterns or manifest files")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="worker processes (default: number of cores)")
+    parser.add_argument("-o", "--output", default=None, help="write JSON lines here instead of stdout")
+    parser.add_argument("-d", "--debug", help="insert fake code for debugging", action="store_true")
+    parser.add_argument("-i", "--incremental", help="deepen loops incrementally, reusing the translation and solver",
+                    action="store_true")
+    parser.add_argument("--no-prepack-cache", help="always run prepack instead of using the on-disk cache",
+                    action="store_true")
+    parser.add_argument("--prepack-cache-dir", default=verify.DEFAULT_CACHE_DIR, help="prepack output cache directory")
+    parser.add_argument("--prepack-cache-size", type=int, default=verify.DEFAULT_MAX_BYTES // (1024 * 1024),
+                    help="prepack output cache size in MB")
+    parser.add_argument("--prepack-workers", type=int, default=1,
+                    help="resident prepack workers per process, 0 to spawn prepack per file (default 1)")
+    parser.add_argument("--prepack-worker-cmd", default=None, help="command line of a prepack worker")
+    parser.add_argument("--prepack-timeout", type=float, default=verify.DEFAULT_TIMEOUT,
+                    help="seconds allowed per prepack request")
+    parser.add_argument("--summary-cache-dir", default=None,
+                    help="share translated function summaries between workers and runs through this directory")
+    parser.add_argument("--no-verdict-cache", help="always check instead of reusing the result of an earlier check",
+                    action="store_true")
+    parser.add_argument("--verdict-cache-dir", default=verify.VERDICT_CACHE_DIR, help="verdict cache directory")
+    parser.add_argument("--portfolio", nargs='?', const='', default=None, metavar="CONFIGS",
+                    help="race solver configurations per query, comma separated (default: every installed one)")
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        summary = runBatch(args.inputs, jobs=args.jobs, out=out, insertFake=args.debug, incremental=args.incremental,
+                           cacheDir=None if args.no_prepack_cache else args.prepack_cache_dir,
+                           cacheSize=args.prepack_cache_size * 1024 * 1024,
+                           prepackWorkers=args.prepack_workers,
+                           workerCmd=args.prepack_worker_cmd.split() if args.prepack_worker_cmd else None,
+                           prepackTimeout=args.prepack_timeout,
+                           summaryCacheDir=args.summary_cache_dir,
+                           portfolio=None if args.portfolio is None else [name for name in args.portfolio.split(',') if name],
+                           verdictCacheDir=None if args.no_verdict_cache else args.verdict_cache_dir)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    print (', '.join('{} {}'.format(count, verdict) for verdict, count in sorted(summary.items())), file=sys.stderr)
+    exit(1 if summary.get('sat') or summary.get('error') else 0)
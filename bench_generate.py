@@ -0,0 +1,244 @@
+"""
+Synthetic programs for scaling benchmarks.
+
+Generates closed programs in the subset the checker translates, along
+independent axes (ProgramShape), together with their prepack-style output:
+one `name = value;` line per global, the final values computed by running
+the program under node, independently of the checker's own evaluators.  The
+bumped variant adds 1 to one global's value, so checking it must answer sat.
+
+The generated code stays within what the encoding gets right: every else-if
+chain ends in an else and assigns the same globals in every branch, from
+globals the chain doesn't assign; helper functions call no other function;
+loops count a local up to their trip count.  Sums are masked to 12 bits so
+no value wraps, whatever the shape.
+"""
+
+import json
+import os
+import random
+import subprocess
+
+import esprima
+
+from concrete_eval import topLevelNames
+
+MASK = 4095
+# Runs the program from stdin and prints the final values of the globals named in argv as JSON
+NODE_SCRIPT = '''
+const vm = require('vm');
+const context = {};
+vm.createContext(context);
+vm.runInContext(require('fs').readFileSync(0, 'utf8'), context);
+console.log(JSON.stringify(JSON.parse(process.argv[1]).map((name) => context[name])));
+'''
+
+class ProgramShape:
+    """
+    ProgramShape
+        globals: number of global variables
+        functions: number of helper functions
+        functionDepth: nesting depth of the branch chains in each function body
+        callSites: calls of each function from the main body
+        chainLength: branches of every else-if chain, the final else included
+        chains: else-if chains in the main body
+        nestingDepth: nesting depth of the main body's chains
+        loops: while loops in the main body
+        loopTrips: iterations of each loop
+    """
+
+    AXES = ('globals', 'functions', 'functionDepth', 'callSites', 'chainLength', 'chains', 'nestingDepth',
+            'loops', 'loopTrips')
+
+    def __init__(self, **axes):
+        self.globals = 16
+        self.functions = 2
+        self.functionDepth = 1
+        self.callSites = 2
+        self.chainLength = 2
+        self.chains = 2
+        self.nestingDepth = 1
+        self.loops = 1
+        self.loopTrips = 4
+        for name, value in axes.items():
+            if name not in self.AXES:
+                raise ValueError('unknown axis {}'.format(name))
+            setattr(self, name, value)
+        # Every chain needs a selector, a global to read and two to assign
+        self.globals = max(self.globals, 4)
+
+    def settings(self):
+        return {name: getattr(self, name) for name in self.AXES}
+
+class Generator:
+    """
+    Generator
+        shape: ProgramShape of the programs
+        rng: random.Random the choices come from
+        lines: source lines written so far
+    """
+
+    def __init__(self, shape, seed=0):
+        self.shape = shape
+        self.rng = random.Random(seed)
+        self.lines = []
+
+    def emit(self, indent, text):
+        self.lines.append('    ' * indent + text)
+
+    def globalNames(self):
+        return ['g{}'.format(index) for index in range(self.shape.globals)]
+
+    def value(self, reads):
+        # Expression over reads, small whatever the values of reads
+        a = self.rng.choice(reads)
+        b = self.rng.choice(reads)
+        form = self.rng.randrange(3)
+        if form == 0:
+            return '({} + {}) & {}'.format(a, self.rng.randrange(1, 10), MASK)
+        if form == 1:
+            return '({} + {}) & {}'.format(a, b, MASK)
+        return '({} - {} + {}) & {}'.format(a, b, self.rng.randrange(10), MASK)
+
+    def chain(self, indent, depth, targets, reads):
+        # if (s == c1) {...} else if (s == c2) {...} ... else {...}, every branch assigning targets
+        selector = self.rng.choice(reads)
+        for branch in range(self.shape.chainLength):
+            if branch == 0:
+                self.emit(indent, 'if ({} == {}) {{'.format(selector, self.rng.randrange(8)))
+            elif branch < self.shape.chainLength - 1:
+                self.lines[-1] += ' else if ({} == {}) {{'.format(selector, self.rng.randrange(8))
+            else:
+                self.lines[-1] += ' else {'
+            if depth > 1:
+                self.chain(indent + 1, depth - 1, targets, reads)
+            else:
+                for target in targets:
+                    self.emit(indent + 1, '{} = {};'.format(target, self.value(reads)))
+            self.emit(indent, '}')
+        if self.shape.chainLength < 2:
+            # A lone then-branch would leave the targets unbound when it isn't taken
+            self.lines[-1] += ' else {'
+            for target in targets:
+                self.emit(indent + 1, '{} = {};'.format(target, self.value(reads)))
+            self.emit(indent, '}')
+
+    def function(self, index):
+        self.emit(1, 'function f{}(a, b) {{'.format(index))
+        self.emit(2, 'var t = {};'.format(self.value(['a', 'b'])))
+        if self.shape.functionDepth > 0:
+            self.chain(2, self.shape.functionDepth, ['t'], ['a', 'b'])
+        self.emit(2, 'return (t + {}) & {};'.format(index, MASK))
+        self.emit(1, '}')
+
+    def pick(self, names, count):
+        return self.rng.sample(names, min(count, len(names)))
+
+    def program(self):
+        names = self.globalNames()
+        for name in names:
+            self.emit(0, 'var {} = {};'.format(name, self.rng.randrange(8)))
+        self.emit(0, '(function() {')
+        for index in range(self.shape.functions):
+            self.function(index)
+
+        # Every global is updated once, the other statements interleave with the updates
+        statements = [('update', name) for name in names]
+        statements += [('chain', None)] * self.shape.chains
+        statements += [('call', index) for index in range(self.shape.functions) for _ in range(self.shape.callSites)]
+        statements += [('loop', index) for index in range(self.shape.loops)]
+        self.rng.shuffle(statements)
+
+        for kind, item in statements:
+            if kind == 'update':
+                self.emit(1, '{} = {};'.format(item, self.value(names)))
+            elif kind == 'chain':
+                targets = self.pick(names, 2)
+                reads = [name for name in names if name not in targets]
+                self.chain(1, self.shape.nestingDepth, targets, reads)
+            elif kind == 'call':
+                target, a, b = self.rng.choice(names), self.rng.choice(names), self.rng.choice(names)
+                self.emit(1, '{} = f{}({}, {});'.format(target, item, a, b))
+            else:
+                counter = 'i{}'.format(item)
+                target = self.rng.choice(names)
+                reads = [name for name in names if name != target]
+                self.emit(1, 'var {} = 0;'.format(counter))
+                self.emit(1, 'while ({} < {}) {{'.format(counter, self.shape.loopTrips))
+                self.emit(2, '{} = ({} + {}) & {};'.format(target, target, self.rng.choice(reads), MASK))
+                self.emit(2, '{} = {} + 1;'.format(counter, counter))
+                self.emit(1, '}')
+        self.emit(0, '})();')
+        return '\n'.join(self.lines) + '\n'
+
+def nodeValues(program):
+    """
+    name -> final value of every top-level global of program, as node runs it
+    """
+    names = topLevelNames(esprima.parseScript(program))
+    try:
+        output = subprocess.run(['node', '-e', NODE_SCRIPT, '--', json.dumps(names)], input=program.encode(),
+                                stdout=subprocess.PIPE, check=True).stdout
+    except FileNotFoundError:
+        raise RuntimeError('node is needed to compute the expected values of generated programs')
+    values = dict(zip(names, json.loads(output)))
+    for name, value in values.items():
+        if not isinstance(value, int) or isinstance(value, bool):
+            raise RuntimeError('generated program left {} = {!r}, not an integer'.format(name, value))
+    return values
+
+def prepackOutput(values, bump=None):
+    """
+    Straight-line output prepack gives for a program with these final values,
+    one `name = value;` per global, with bump's value off by one
+    """
+    lines = []
+    for name, value in values.items():
+        value = value + (1 if name == bump else 0)
+        lines.append('{} = {};'.format(name, value))
+    return '\n'.join(lines) + '\n'
+
+def generate(shape, seed=0):
+    """
+    (program, prepack output, bumped prepack output, bumped global)
+    """
+    program = Generator(shape, seed).program()
+    bump = random.Random(seed).choice(Generator(shape).globalNames())
+    values = nodeValues(program)
+    return program, prepackOutput(values), prepackOutput(values, bump), bump
+
+def writeCase(outDir, stem, shape, seed=0):
+    """
+    Write stem.js, stem.prepack.js and stem.bumped.prepack.js to outDir,
+    returns their paths
+    """
+    program, output, bumpedOutput, _ = generate(shape, seed)
+    paths = [os.path.join(outDir, stem + suffix) for suffix in ('.js', '.prepack.js', '.bumped.prepack.js')]
+    for path, text in zip(paths, (program, output, bumpedOutput)):
+        with open(path, 'w') as f:
+            f.write(text)
+    return paths
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description="generate synthetic programs and their prepack output; "
+                                                 "writes a batch_verify manifest of the equivalent and bumped pairs")
+    parser.add_argument("outDir", help="directory the programs go to")
+    parser.add_argument("-n", "--count", type=int, default=1, help="programs to generate, seeds 0..n-1 (default 1)")
+    defaults = ProgramShape()
+    for axis in ProgramShape.AXES:
+        parser.add_argument("--" + axis, type=int, default=getattr(defaults, axis),
+                        help="default %(default)s")
+    args = parser.parse_args()
+
+    shape = ProgramShape(**{axis: getattr(args, axis) for axis in ProgramShape.AXES})
+    os.makedirs(args.outDir, exist_ok=True)
+    with open(os.path.join(args.outDir, 'manifest.txt'), 'w') as manifest:
+        manifest.write('# {}\n'.format(' '.join('{}={}'.format(name, value) for name, value in shape.settings().items())))
+        for seed in range(args.count):
+            paths = writeCase(args.outDir, 'synth{}'.format(seed), shape, seed)
+            names = [os.path.basename(path) for path in paths]
+            manifest.write('{} {}\n'.format(names[0], names[1]))
+            manifest.write('{} {}\n'.format(names[0], names[2]))
+    print ('Wrote {} programs to {}'.format(args.count, args.outDir))
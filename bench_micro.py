@@ -0,0 +1,186 @@
+"""
+Micro-benchmarks of the translator's hot paths.
+
+Each benchmark runs one function of verify in isolation on inputs of a
+given size, timed with timeit (best of several repeats, per call):
+
+    fn_lookup            variable lookup from N levels above its declaration
+    fn_lookup_resolved   the same from the level the scope resolver bound it to
+                         (see symbol_table, which replaced the walk for most nodes)
+    fn_lookup_func       the same for a function's local variable
+    funcTable_lookup     function lookup from N levels above its declaration
+    dispatch             printSMT on one node of a type, through the isinstance chain
+    branch_snapshot      an if/else writing one variable, N variables in scope
+                         (the version-log marks that replaced the deepcopy per branch)
+    call_instantiation   a call site of a function of N statements
+                         (summary instantiation, which replaced the template str.replace)
+    variable_discovery   pairing N globals with their prepack versions
+                         (compareGlobals, which replaced the regex scan in main)
+
+Results can be saved as a baseline and later runs compared against it; a
+benchmark slower than the baseline by more than the tolerance fails the run.
+"""
+
+import json
+import sys
+import timeit
+
+import verify
+from smt_terms import TermTable
+from symbol_table import SymbolTable
+
+REPEATS = 5
+DEFAULT_TOLERANCE = 1.25
+
+def parseNode(source):
+    # First statement of source, or its expression for an expression statement
+    verify.loadBackends()
+    stmt = verify.esprima.parseScript(source).body[0]
+    return stmt.expression if stmt.type == 'ExpressionStatement' else stmt
+
+def resetTranslator():
+    verify.TERMS = TermTable()
+    verify.SYMBOLS = SymbolTable(verify.TERMS)
+    verify.SCOPE_LEVELS = {}
+    verify.VERSION_LOG = verify.VersionLog()
+    verify.PROFILE = None
+    del verify.PATH_CONDITIONS[:]
+
+def symbols(level, names, count=0, funcScope=''):
+    # Scope table of names interned at level, every one at version count
+    return dict((name, verify.SYMBOLS.intern(name, level, funcScope, count)) for name in names)
+
+def benchFnLookup(depth):
+    resetTranslator()
+    varTable = {level: {} for level in range(depth + 1)}
+    varTable[0] = symbols(0, ['x'], 3)
+    return lambda: verify.fn_lookup('x', varTable, {}, depth)
+
+def benchFnLookupResolved(depth):
+    resetTranslator()
+    varTable = {level: {} for level in range(depth + 1)}
+    varTable[0] = symbols(0, ['x'], 3)
+    return lambda: verify.fn_lookup('x', varTable, {}, depth, resolved=0)
+
+def benchFnLookupFunc(depth):
+    resetTranslator()
+    funcTable = {0: {'f': {'varTable': symbols(1, ['fx'], funcScope='f')}}}
+    return lambda: verify.fn_lookup('fx', {}, funcTable, depth, funcScope='f')
+
+def benchFuncTableLookup(depth):
+    funcTable = {0: {'f': {}}}
+    return lambda: verify.funcTable_lookup('f', depth, funcTable)
+
+DISPATCH_SOURCES = {'Identifier': 'x;', 'Literal': '1;', 'BinaryExpression': 'x + 1;', 'AssignmentExpression': 'x = 1;'}
+
+def benchDispatch(nodeType):
+    node = parseNode(DISPATCH_SOURCES[nodeType])
+    resetTranslator()
+    varTable = {0: symbols(0, ['x'])}
+    return lambda: verify.printSMT(node, varTable, 0)
+
+def benchBranchSnapshot(variables):
+    node = parseNode('if (c == 0) { x = 1; } else { x = 2; }')
+    resetTranslator()
+    varTable = {0: symbols(0, ['v{}'.format(index) for index in range(variables)] + ['c', 'x'])}
+    return lambda: verify.printSMT(node, varTable, 0)
+
+def benchCallInstantiation(statements):
+    body = ' '.join('t = t + {};'.format(index) for index in range(statements))
+    declaration = parseNode('function f(a) {{ var t = a; {} return t; }}'.format(body))
+    call = parseNode('y = f(x);')
+    resetTranslator()
+    varTable = {0: symbols(0, ['x', 'y'])}
+    funcTable = {}
+    # A fresh summary cache, so the body is translated here and not found from an earlier run
+    verify.SUMMARY_CACHE = verify.FunctionSummaryCache()
+    verify.printSMT(declaration, varTable, 0, funcTable=funcTable)
+    return lambda: verify.printSMT(call, varTable, 0, funcTable=funcTable)
+
+def benchVariableDiscovery(globals):
+    resetTranslator()
+    variableLookup = {0: symbols(0, ['g{}'.format(index) for index in range(globals)], 2)}
+    prepackLookup = {0: symbols(0, ['ppg{}'.format(index) for index in range(globals)], 1)}
+    return lambda: verify.compareGlobals(variableLookup, prepackLookup)
+
+# name -> (setup taking the size and returning the benchmarked call, default sizes)
+BENCHMARKS = {
+    'fn_lookup': (benchFnLookup, [1, 8, 32]),
+    'fn_lookup_resolved': (benchFnLookupResolved, [1, 8, 32]),
+    'fn_lookup_func': (benchFnLookupFunc, [1, 8, 32]),
+    'funcTable_lookup': (benchFuncTableLookup, [1, 8, 32]),
+    'dispatch': (benchDispatch, list(DISPATCH_SOURCES)),
+    'branch_snapshot': (benchBranchSnapshot, [10, 100, 1000]),
+    'call_instantiation': (benchCallInstantiation, [1, 10, 100]),
+    'variable_discovery': (benchVariableDiscovery, [10, 100, 1000]),
+}
+
+def timeCall(func):
+    # Seconds per call, best of REPEATS runs of enough calls to take 0.2s
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(REPEATS, number)) / number
+
+def runBenchmarks(names=None):
+    """
+    'name[size]' -> seconds per call, for the benchmarks in names (default all)
+    """
+    results = {}
+    for name, (setup, sizes) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for size in sizes:
+            results['{}[{}]'.format(name, size)] = timeCall(setup(size))
+    return results
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Report lines and the keys slower than baseline by more than tolerance
+    """
+    lines, regressions = [], []
+    for key, seconds in results.items():
+        if key not in baseline:
+            lines.append('{:32} {:10.3f}us'.format(key, seconds * 1e6))
+            continue
+        ratio = seconds / baseline[key]
+        flag = ''
+        if ratio > tolerance:
+            regressions.append(key)
+            flag = '  slower'
+        lines.append('{:32} {:10.3f}us  {:5.2f}x baseline{}'.format(key, seconds * 1e6, ratio, flag))
+    return lines, regressions
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description="time the translator's hot paths in isolation")
+    parser.add_argument("names", nargs='*', help="benchmarks to run (default all): {}".format(', '.join(BENCHMARKS)))
+    parser.add_argument("--baseline", default=None, metavar="FILE", help="compare against results saved earlier")
+    parser.add_argument("--save", default=None, metavar="FILE", help="save the results as a baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                    help="slowdown over the baseline that fails the run (default %(default)s)")
+    args = parser.parse_args()
+
+    for name in args.names:
+        if name not in BENCHMARKS:
+            print ('Uh-oh. Unknown benchmark {}, choose from {}'.format(name, ', '.join(BENCHMARKS)))
+            exit(-1)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = runBenchmarks(args.names)
+    lines, regressions = compare(results, baseline, args.tolerance)
+    for line in lines:
+        print (line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+    if regressions:
+        print ('{} benchmarks slower than the baseline: {}'.format(len(regressions), ', '.join(regressions)), file=sys.stderr)
+        exit(1)
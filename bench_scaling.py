@@ -0,0 +1,193 @@
+"""
+Scaling benchmark of the checker on synthetic programs.
+
+Sweeps one ProgramShape axis at a time away from a base shape (see
+bench_generate) and checks the equivalent and the bumped prepack output of
+every program, each in a fresh process so its peak RSS is its own.  One JSON
+line is written per check:
+    {"axis": ..., "value": ..., "shape": {...}, "seed": ..., "variant": "equivalent" | "bumped",
+     "expected": ..., "verdict": "unsat" | "sat" | "unroll" | "timeout" | "error", "correct": ...,
+     "seconds": ..., "maxRSSBytes": ..., "programBytes": ..., "termNodes": ..., "termsBuilt": ...,
+     "timings": {...}, "profile": {...}}
+A value at which some check times out ends the sweep of its axis, bigger
+values would only take longer.
+
+Concrete evaluation and random testing decide closed programs without the
+translator or the solver, so they are off unless --concrete is given.
+"""
+
+import contextlib
+import json
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+
+import verify
+from bench_generate import ProgramShape, generate
+from profiler import Profile
+
+DEFAULT_SWEEPS = {
+    'globals': [16, 64, 256, 1024],
+    'functions': [1, 4, 16, 64],
+    'functionDepth': [1, 2, 3, 4],
+    'callSites': [1, 4, 16, 64],
+    'chainLength': [2, 4, 8, 16],
+    'chains': [2, 8, 32, 128],
+    'nestingDepth': [1, 2, 3, 4],
+    'loops': [1, 4, 16],
+    'loopTrips': [4, 16, 64, 256],
+}
+DEFAULT_TIMEOUT = 300
+
+def checkInChild(conn, program, prepackOutput, options):
+    # Runs in its own process, sends the record of one check back over conn
+    if not options['concrete']:
+        verify.CONCRETE_STEPS = 0
+        verify.RANDOM_LANES = 0
+    verify.SIMPLIFY = options['simplify']
+    if options['profile']:
+        verify.PROFILE = Profile()
+
+    record = {}
+    startTime = time.perf_counter()
+    try:
+        with open(os.devnull, 'w') as devNull, contextlib.redirect_stdout(devNull):
+            smtResult = verify.verifyProgram(program, 'synthetic.js', prepackOutput=prepackOutput,
+                                             incremental=options['incremental'])
+        record['verdict'] = smtResult.verdict
+        record['termNodes'] = smtResult.stats.get('termNodes')
+        record['termsBuilt'] = smtResult.stats.get('termsBuilt')
+        record['timings'] = smtResult.timings
+    except (KeyboardInterrupt, GeneratorExit):
+        raise
+    except BaseException as e:
+        # The translator exit()s on unsupported input
+        record['verdict'] = 'error'
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    record['seconds'] = time.perf_counter() - startTime
+    # ru_maxrss is in kilobytes on Linux
+    record['maxRSSBytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    if verify.PROFILE is not None:
+        record['profile'] = verify.PROFILE.record()
+    conn.send(record)
+    conn.close()
+
+def measure(program, prepackOutput, options, timeout=DEFAULT_TIMEOUT):
+    """
+    Record of checking program against prepackOutput in a fresh process
+    """
+    context = multiprocessing.get_context('spawn')
+    parentConn, childConn = context.Pipe(duplex=False)
+    process = context.Process(target=checkInChild, args=(childConn, program, prepackOutput, options))
+    process.start()
+    childConn.close()
+    try:
+        if parentConn.poll(timeout):
+            record = parentConn.recv()
+        else:
+            record = {'verdict': 'timeout', 'seconds': timeout}
+    except EOFError:
+        record = {'verdict': 'error', 'error': 'checker process died with exit code {}'.format(process.exitcode)}
+    finally:
+        if process.is_alive():
+            process.terminate()
+        process.join()
+        parentConn.close()
+    return record
+
+def sweep(axis, values, base, options, seeds=1, timeout=DEFAULT_TIMEOUT, out=None):
+    """
+    Check the programs of every value of axis, base settings for the other
+    axes, and write a JSON line per check to out.  Returns the records.
+    """
+    records = []
+    for value in values:
+        shape = ProgramShape(**dict(base, **{axis: value}))
+        timedOut = False
+        for seed in range(seeds):
+            program, output, bumpedOutput, _ = generate(shape, seed)
+            for variant, prepackOutput, expected in (('equivalent', output, 'unsat'), ('bumped', bumpedOutput, 'sat')):
+                record = {'axis': axis, 'value': value, 'shape': shape.settings(), 'seed': seed, 'variant': variant,
+                          'expected': expected, 'programBytes': len(program)}
+                record.update(measure(program, prepackOutput, options, timeout))
+                record['correct'] = record['verdict'] == expected
+                records.append(record)
+                if out is not None:
+                    out.write(json.dumps(record) + '\n')
+                    out.flush()
+                timedOut = timedOut or record['verdict'] == 'timeout'
+        if timedOut:
+            break
+    return records
+
+def summarize(records):
+    # One line per axis value: median time, worst RSS and formula size, verdicts right
+    lines = []
+    groups = {}
+    for record in records:
+        groups.setdefault((record['axis'], record['value']), []).append(record)
+    for (axis, value), group in groups.items():
+        seconds = statistics.median(record['seconds'] for record in group)
+        rss = max(record.get('maxRSSBytes') or 0 for record in group) / (1024 * 1024)
+        nodes = max(record.get('termNodes') or 0 for record in group)
+        correct = sum(1 for record in group if record['correct'])
+        lines.append('{:>14} {:>6}: {:8.3f}s median, {:7.1f} MB, {:8} nodes, {}/{} correct'.format(
+            axis, value, seconds, rss, nodes, correct, len(group)))
+    return lines
+
+def parseSetting(text):
+    name, _, value = text.partition('=')
+    if name not in ProgramShape.AXES:
+        raise ValueError('unknown axis {}, choose from {}'.format(name, ', '.join(ProgramShape.AXES)))
+    return name, value
+
+if __name__ == '__main__':
+
+    import argparse
+    parser = argparse.ArgumentParser(description="check synthetic programs of growing size and record time, peak RSS, "
+                                                 "formula size and verdict correctness")
+    parser.add_argument("--sweep", action="append", default=None, metavar="AXIS=V1,V2,...",
+                    help="axis and values to sweep, repeatable (default: every axis, {})".format(
+                        '; '.join('{}={}'.format(axis, ','.join(map(str, values))) for axis, values in DEFAULT_SWEEPS.items())))
+    parser.add_argument("--base", action="append", default=[], metavar="AXIS=V",
+                    help="setting of an axis while the others are swept, repeatable")
+    parser.add_argument("--seeds", type=int, default=1, help="programs per value (default 1)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                    help="seconds per check before it is recorded as a timeout (default %(default)s)")
+    parser.add_argument("-o", "--output", default=None, help="write JSON lines here instead of stdout")
+    parser.add_argument("--concrete", help="let concrete evaluation and random testing decide, as verify.py does",
+                    action="store_true")
+    parser.add_argument("--no-simplify", help="hand the formula to the solver without constant and copy propagation",
+                    action="store_true")
+    parser.add_argument("-i", "--incremental", help="deepen loops incrementally", action="store_true")
+    parser.add_argument("--profile", help="include the per-phase profile of every check (see profiler)",
+                    action="store_true")
+    args = parser.parse_args()
+
+    try:
+        base = dict((name, int(value)) for name, value in map(parseSetting, args.base))
+        sweeps = DEFAULT_SWEEPS
+        if args.sweep:
+            sweeps = dict((name, [int(item) for item in values.split(',')]) for name, values in map(parseSetting, args.sweep))
+    except ValueError as e:
+        print ('Uh-oh. {}'.format(e))
+        exit(-1)
+
+    options = {'concrete': args.concrete, 'simplify': not args.no_simplify, 'incremental': args.incremental,
+               'profile': args.profile}
+    out = open(args.output, 'w') if args.output else sys.stdout
+    records = []
+    try:
+        for axis, values in sweeps.items():
+            records += sweep(axis, values, base, options, args.seeds, args.timeout, out)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    for line in summarize(records):
+        print (line, file=sys.stderr)
+    # Timeouts are measurements too, only wrong verdicts and errors fail the run
+    exit(1 if any(record['verdict'] != 'timeout' and not record['correct'] for record in records) else 0)
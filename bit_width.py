@@ -0,0 +1,247 @@
+"""
+Range-based bit-width inference.
+
+Most SSA variables are loop counters, flags and small constants, yet every
+one of them is a 32-bit bitvector the solver bit-blasts in full.  The
+clauses define variables: an unconditional `v == e`, or the pair
+`c -> v == e1`, `!c -> v == e2` an unrolled iteration or an if with else
+leaves behind, where v is e1 or e2.  Interval arithmetic over the defining
+expressions (None when a value may leave 32 bits and wrap) gives a range
+every model of the clauses keeps v in, since every model satisfies the
+definition.  Variables are visited in creation order, which is definition
+order for SSA, and the pass repeats while a range still tightens.
+
+A variable whose range fits in fewer bits is declared at that width and
+sign-extended (zero-extended for ranges without negative values) wherever
+it is used, so the formula keeps its 32-bit arithmetic and means the same:
+narrowing only adds the range the clauses already imply.
+
+The same ranges tell which arithmetic can't overflow, which is what the
+integer encoding needs: over Int, + - * wrap only where no range is known.
+"""
+
+from smt_terms import LEAF_OPS, postorder
+from loop_bounds import interval, join, INT_MIN, INT_MAX
+
+MAX_PASSES = 4
+# Ops the integer encoding handles exactly, '*' only by a constant
+INTEGER_OPS = ('var', 'boolvar', 'const', 'true', 'neg', 'ite', 'not', 'and', 'or', 'implies',
+               '+', '-', '*', '==', '!=', '<', '<=', '>', '>=')
+
+def meet(a, b):
+    # Both ranges hold, so their intersection does
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return (max(a[0], b[0]), min(a[1], b[1]))
+
+def constOf(value):
+    return value[0] if value is not None and value[0] == value[1] else None
+
+def truncDiv(a, b):
+    quotient = abs(a) // abs(b)
+    return quotient if (a < 0) == (b < 0) else -quotient
+
+def opRange(op, args):
+    # Range of a bv node from the ranges of its operands
+    a = args[0] if args else None
+    b = args[1] if len(args) > 1 else None
+    if op == 'ite':
+        return join(args[1], args[2])
+    if op == 'neg':
+        return None if a is None else interval(-a[1], -a[0])
+    if op == 'bnot':
+        return None if a is None else interval(-a[1] - 1, -a[0] - 1)
+    if op in ('+', '-', '*'):
+        if a is None or b is None:
+            return None
+        if op == '+':
+            return interval(a[0] + b[0], a[1] + b[1])
+        if op == '-':
+            return interval(a[0] - b[1], a[1] - b[0])
+        products = [x * y for x in a for y in b]
+        return interval(min(products), max(products))
+    if op == '&':
+        bounds = [value[1] for value in (a, b) if value is not None and value[0] >= 0]
+        return (0, min(bounds)) if bounds else None
+    if op in ('|', '^'):
+        if a is None or b is None or a[0] < 0 or b[0] < 0:
+            return None
+        return (0, (1 << max(a[1], b[1]).bit_length()) - 1)
+    shift = constOf(b)
+    full = a if a is not None else (INT_MIN, INT_MAX)
+    if op == '>>' and shift is not None:
+        return (full[0] >> (shift & 31), full[1] >> (shift & 31))
+    if op == '>>>' and shift is not None:
+        if shift & 31 == 0:
+            return a
+        if full[0] >= 0:
+            return (full[0] >> (shift & 31), full[1] >> (shift & 31))
+        return (0, 0xffffffff >> (shift & 31))
+    if op == '<<' and shift is not None and a is not None:
+        return interval(a[0] << (shift & 31), a[1] << (shift & 31))
+    divisor = constOf(b)
+    if op == '/' and divisor not in (None, 0, -1):
+        quotients = [truncDiv(full[0], divisor), truncDiv(full[1], divisor)]
+        return (min(quotients), max(quotients))
+    if op == '%' and divisor not in (None, 0):
+        # The remainder takes the sign of the dividend and stays below the divisor
+        largest = abs(divisor) - 1
+        return (max(-largest, min(full[0], 0)), min(largest, max(full[1], 0)))
+    return None
+
+def flattenAnd(term):
+    conjuncts = []
+    stack = [term]
+    while stack:
+        term = stack.pop()
+        if term.op == 'and':
+            stack += [term.args[1], term.args[0]]
+        elif term.op != 'true':
+            conjuncts.append(term)
+    return conjuncts
+
+def definitions(conjuncts, defs):
+    """
+    Add the definitions the conjuncts force to defs
+        defs: name -> list of alternatives, lists of terms the variable equals one of
+    """
+    # Guarded conjuncts by id of the condition, (then bodies, else bodies)
+    guarded = {}
+    for conjunct in conjuncts:
+        if conjunct.op != 'implies':
+            continue
+        guard, body = conjunct.args
+        if guard.op == 'not':
+            guarded.setdefault(guard.args[0].id, ([], []))[1].append(body)
+        else:
+            guarded.setdefault(guard.id, ([], []))[0].append(body)
+    for conjunct in conjuncts:
+        if conjunct.op != '==':
+            continue
+        left, right = conjunct.args
+        for side, other in ((left, right), (right, left)):
+            if side.op == 'var':
+                defs.setdefault(side.args[0], []).append([other])
+    # Complementary guards, the variables both branches define
+    for thenBodies, elseBodies in guarded.values():
+        if thenBodies and elseBodies:
+            thenDefs, elseDefs = {}, {}
+            definitions([conjunct for body in thenBodies for conjunct in flattenAnd(body)], thenDefs)
+            definitions([conjunct for body in elseBodies for conjunct in flattenAnd(body)], elseDefs)
+            for name in thenDefs.keys() & elseDefs.keys():
+                alternatives = defs.setdefault(name, [])
+                for thenTerms in thenDefs[name]:
+                    for elseTerms in elseDefs[name]:
+                        alternatives.append(thenTerms + elseTerms)
+    return defs
+
+class RangeAnalysis:
+    """
+    RangeAnalysis
+        ranges: variable name -> (lo, hi) every model of the clauses keeps it in
+        termRanges: id of a bv node -> (lo, hi) or None, as of the last pass
+    """
+
+    def __init__(self, clauses, symbols):
+        self.clauses = clauses
+        self.symbols = symbols
+        self.ranges = {}
+        self.termRanges = {}
+
+    def run(self):
+        conjuncts = []
+        for clause in self.clauses:
+            conjuncts += flattenAnd(clause)
+        defs = definitions(conjuncts, {})
+        order = [name for name in self.symbols if name in defs]
+
+        for _ in range(MAX_PASSES):
+            self.termRanges = {}
+            changed = False
+            for name in order:
+                value = None
+                for alternative in defs[name]:
+                    ranges = [self.rangeOf(term) for term in alternative]
+                    if any(item is None for item in ranges):
+                        continue
+                    joined = ranges[0]
+                    for item in ranges[1:]:
+                        joined = join(joined, item)
+                    value = meet(value, joined)
+                # Nodes that read name before this are looser, still sound, until the next pass
+                value = meet(self.ranges.get(name), value)
+                if value is not None and value != self.ranges.get(name):
+                    self.ranges[name] = value
+                    changed = True
+            if not changed:
+                break
+
+        # Final ranges of every node, for the integer encoding
+        self.termRanges = {}
+        for term in postorder(self.clauses):
+            if term.sort == 'bv':
+                self.rangeOf(term)
+        return self.ranges
+
+    def rangeOf(self, root):
+        # Iterative, children first, stopping at nodes already known
+        memo = self.termRanges
+        stack = [(root, False)]
+        while stack:
+            term, expanded = stack.pop()
+            if term.id in memo:
+                continue
+            if term.op == 'var':
+                memo[term.id] = self.ranges.get(term.args[0])
+            elif term.op == 'const':
+                memo[term.id] = (term.args[0], term.args[0])
+            elif term.op in LEAF_OPS or term.sort == 'bool':
+                # Conditions used as numbers go through ite, holes never get here
+                memo[term.id] = (0, 1) if term.sort == 'bool' else None
+            elif expanded:
+                memo[term.id] = opRange(term.op, [memo.get(arg.id) for arg in term.args])
+            else:
+                stack.append((term, True))
+                stack += [(arg, False) for arg in term.args if arg.id not in memo]
+        return memo[root.id]
+
+def bitsFor(value):
+    """
+    (bits, signed) of the narrowest encoding of a range, extended by sign
+    when it has negative values
+    """
+    lo, hi = value
+    if lo >= 0:
+        return max(1, hi.bit_length()), False
+    return max((-lo - 1).bit_length(), hi.bit_length() if hi > 0 else 0) + 1, True
+
+def narrowWidths(ranges):
+    """
+    name -> (bits, signed) of the variables that fit in fewer than 32 bits
+    """
+    widths = {}
+    for name, value in ranges.items():
+        if value[0] > value[1]:
+            # No model at all, the solver finds out on its own
+            continue
+        bits, signed = bitsFor(value)
+        if bits < 32:
+            widths[name] = (bits, signed)
+    return widths
+
+def savedBits(widths):
+    return sum(32 - bits for bits, _ in widths.values())
+
+def integerBlocker(clauses):
+    """
+    First op the integer encoding can't express exactly, None when every
+    node is linear arithmetic, comparisons and logic
+    """
+    for term in postorder(clauses):
+        if term.op not in INTEGER_OPS:
+            return term.op
+        if term.op == '*' and term.args[0].op != 'const' and term.args[1].op != 'const':
+            return 'non-constant *'
+    return None
@@ -0,0 +1,254 @@
+"""
+Concrete evaluation of closed programs.
+
+A program whose globals all start from literals has exactly one run, so the
+original and the prepack output can simply be executed and their final
+globals compared, no solver needed.  Values are 32-bit integers wrapping the
+way the BitVec encoding does, comparisons give booleans that count as 1/0 in
+arithmetic, and a number used as a condition is true when non-zero.
+
+Anything the evaluator can't decide raises ConcreteUnsupported and the caller
+falls back to the SMT encoding: reading an uninitialized variable (a free
+input of the encoding), constructs outside the supported subset, division by
+zero, or running past the step budget.
+
+A var is local to its function here, as in JavaScript, but the encoding
+gives a block of braces a level of its own: a var declared inside an if or
+while block is a new variable of that level, shadowing one of the same name
+outside the block.  The two only agree when no var is declared inside a
+nested block, so such programs are left to the encoding too.
+"""
+
+from smt_simplify import foldConst, wrap32, COMPARISONS
+from smt_terms import JS_OPERATORS
+
+STEP_BUDGET = 1000000
+MAX_CALL_DEPTH = 200
+
+class ConcreteUnsupported(Exception):
+    pass
+
+class Undefined:
+    def __repr__(self):
+        return 'undefined'
+
+# Value of declared but unassigned variables and of functions without return
+UNDEFINED = Undefined()
+
+def toInt(value):
+    if value is UNDEFINED:
+        raise ConcreteUnsupported('reads an uninitialized variable')
+    if isinstance(value, bool):
+        return 1 if value else 0
+    return value
+
+def truthy(value):
+    if value is UNDEFINED:
+        raise ConcreteUnsupported('reads an uninitialized variable')
+    return value if isinstance(value, bool) else value != 0
+
+class ReturnValue(Exception):
+    def __init__(self, value):
+        self.value = value
+
+class Scope:
+    """
+    Scope
+        parent: enclosing scope, None for the global one
+        vars: name -> value of the variables declared in this function
+        functions: name -> (declaration, scope it closes over)
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.vars = {}
+        self.functions = {}
+
+    def hoist(self, body):
+        # Function declarations are visible in the whole body, like JavaScript does
+        for stmt in body:
+            if stmt.type == 'FunctionDeclaration':
+                self.functions[stmt.id.name] = (stmt, self)
+
+class Evaluator:
+    """
+    Evaluator
+        stepBudget: statements and expressions evaluated before giving up
+        globalScope: Scope of the script
+    """
+
+    def __init__(self, stepBudget=STEP_BUDGET):
+        self.stepBudget = stepBudget
+        self.steps = 0
+        self.depth = 0
+        self.globalScope = Scope()
+
+    def step(self):
+        self.steps += 1
+        if self.steps > self.stepBudget:
+            raise ConcreteUnsupported('step budget of {} exceeded'.format(self.stepBudget))
+
+    def run(self, script):
+        self.globalScope.hoist(script.body)
+        for stmt in script.body:
+            self.execute(stmt, self.globalScope)
+        return self.globalScope.vars
+
+    def scopeOf(self, name, frame):
+        # Variables of the innermost function declaring name
+        scope = frame
+        while scope is not None:
+            if name in scope.vars:
+                return scope.vars
+            scope = scope.parent
+        raise ConcreteUnsupported('undeclared variable {}'.format(name))
+
+    def functionOf(self, name, frame):
+        scope = frame
+        while scope is not None:
+            if name in scope.functions:
+                return scope.functions[name]
+            scope = scope.parent
+        return None
+
+    def execute(self, stmt, frame):
+        self.step()
+        kind = stmt.type
+        if kind == 'VariableDeclaration':
+            scope = frame.vars
+            for decl in stmt.declarations:
+                value = UNDEFINED if decl.init is None else self.evaluate(decl.init, frame)
+                # A redeclaration without initializer keeps the value
+                if decl.init is not None or decl.id.name not in scope:
+                    scope[decl.id.name] = value
+        elif kind == 'ExpressionStatement':
+            self.evaluate(stmt.expression, frame)
+        elif kind == 'BlockStatement':
+            # Function bodies don't get here, this is a nested block
+            if any(inner.type == 'VariableDeclaration' for inner in stmt.body):
+                raise ConcreteUnsupported('var declared in a nested block')
+            for inner in stmt.body:
+                self.execute(inner, frame)
+        elif kind == 'IfStatement':
+            if truthy(self.evaluate(stmt.test, frame)):
+                self.execute(stmt.consequent, frame)
+            elif stmt.alternate is not None:
+                self.execute(stmt.alternate, frame)
+        elif kind == 'WhileStatement':
+            while truthy(self.evaluate(stmt.test, frame)):
+                self.execute(stmt.body, frame)
+        elif kind == 'ReturnStatement':
+            if frame is self.globalScope:
+                raise ConcreteUnsupported('return outside a function')
+            raise ReturnValue(UNDEFINED if stmt.argument is None else self.evaluate(stmt.argument, frame))
+        elif kind == 'FunctionDeclaration':
+            # Already hoisted
+            pass
+        elif kind == 'EmptyStatement':
+            pass
+        else:
+            raise ConcreteUnsupported(kind)
+
+    def evaluate(self, expr, frame):
+        self.step()
+        kind = expr.type
+        if kind == 'Literal':
+            value = expr.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                raise ConcreteUnsupported('literal {}'.format(expr.raw))
+            return wrap32(int(value))
+        elif kind == 'Identifier':
+            return self.scopeOf(expr.name, frame)[expr.name]
+        elif kind == 'AssignmentExpression':
+            if expr.left.type != 'Identifier':
+                raise ConcreteUnsupported('assignment to {}'.format(expr.left.type))
+            scope = self.scopeOf(expr.left.name, frame)
+            if expr.operator == '=':
+                value = self.evaluate(expr.right, frame)
+            else:
+                # x op= e reads x before evaluating e
+                current = scope[expr.left.name]
+                value = self.binary(expr.operator[:-1], current, self.evaluate(expr.right, frame))
+            scope[expr.left.name] = value
+            return value
+        elif kind == 'LogicalExpression':
+            left = truthy(self.evaluate(expr.left, frame))
+            if expr.operator == '&&':
+                return left and truthy(self.evaluate(expr.right, frame))
+            if expr.operator == '||':
+                return left or truthy(self.evaluate(expr.right, frame))
+            raise ConcreteUnsupported('operator {}'.format(expr.operator))
+        elif kind == 'BinaryExpression':
+            return self.binary(expr.operator, self.evaluate(expr.left, frame), self.evaluate(expr.right, frame))
+        elif kind == 'UnaryExpression':
+            value = self.evaluate(expr.argument, frame)
+            if expr.operator == '!':
+                return not truthy(value)
+            if expr.operator == '-':
+                return foldConst('neg', toInt(value))
+            if expr.operator == '~':
+                return foldConst('bnot', toInt(value))
+            if expr.operator == '+':
+                return toInt(value)
+            raise ConcreteUnsupported('operator {}'.format(expr.operator))
+        elif kind == 'CallExpression':
+            return self.call(expr, frame)
+        raise ConcreteUnsupported(kind)
+
+    def binary(self, operator, left, right):
+        op = JS_OPERATORS.get(operator, operator)
+        if op in COMPARISONS:
+            if op in ('==', '!=') and isinstance(left, bool) and isinstance(right, bool):
+                return COMPARISONS[op](left, right)
+            return COMPARISONS[op](toInt(left), toInt(right))
+        value = foldConst(op, toInt(left), toInt(right))
+        if value is None:
+            raise ConcreteUnsupported('operator {} on {} and {}'.format(operator, left, right))
+        return value
+
+    def call(self, expr, frame):
+        callee = expr.callee
+        if callee.type == 'Identifier':
+            found = self.functionOf(callee.name, frame)
+            if found is None:
+                raise ConcreteUnsupported('call of {}'.format(callee.name))
+            func, closure = found
+        elif callee.type == 'FunctionExpression':
+            # (function() { ... })() wrapping the whole program
+            func, closure = callee, frame
+        else:
+            raise ConcreteUnsupported('call of {}'.format(callee.type))
+        if len(func.params) != len(expr.arguments):
+            raise ConcreteUnsupported('call with {} arguments for {} parameters'.format(len(expr.arguments), len(func.params)))
+        if self.depth >= MAX_CALL_DEPTH:
+            raise ConcreteUnsupported('calls nested deeper than {}'.format(MAX_CALL_DEPTH))
+
+        args = [self.evaluate(arg, frame) for arg in expr.arguments]
+        callFrame = Scope(closure)
+        callFrame.vars = {param.name: arg for param, arg in zip(func.params, args)}
+        callFrame.hoist(func.body.body)
+        self.depth += 1
+        try:
+            for stmt in func.body.body:
+                self.execute(stmt, callFrame)
+        except ReturnValue as ret:
+            return ret.value
+        finally:
+            self.depth -= 1
+        return UNDEFINED
+
+def topLevelNames(script):
+    # Globals declared at the top level, the ones the equivalence check compares
+    names = []
+    for stmt in script.body:
+        if stmt.type == 'VariableDeclaration':
+            names += [decl.id.name for decl in stmt.declarations if decl.id.name not in names]
+    return names
+
+def evaluateScript(script, stepBudget=STEP_BUDGET):
+    """
+    Run script to completion
+    returns the final value of every top-level global, raises ConcreteUnsupported
+    """
+    values = Evaluator(stepBudget).run(script)
+    return {name: values[name] for name in topLevelNames(script)}
@@ -0,0 +1,98 @@
+"""
+Cone-of-influence slicing of the equivalence query.
+
+The clauses of both programs define SSA versions in terms of earlier ones,
+so a compared global only depends on the clauses reachable from its final
+versions through shared variables.  Globals whose cones share a variable are
+grouped, and every group becomes a query of its own: the clauses of its cone
+and the negated comparison of just its globals.  Clauses in no cone (code
+that affects no compared global) are dropped.
+
+The whole query is sat exactly when one slice is, given that the dropped
+clauses can be satisfied on their own, which definitions always can.
+"""
+
+from smt_terms import postorder
+
+class Slice:
+    """
+    Slice
+        connectingVars: (var, ppVar) pairs of the globals compared in this slice
+        clauses: clauses of their cone, without the goal
+        whileChecks: under-unroll checks of the loops in the cone
+    """
+
+    def __init__(self):
+        self.connectingVars = []
+        self.clauses = []
+        self.whileChecks = []
+
+def clauseNames(clause):
+    return set(term.args[0] for term in postorder([clause]) if term.op in ('var', 'boolvar'))
+
+class NameClasses:
+    # Union-find over variable names
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, name):
+        root = name
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while name != root:
+            self.parent[name], name = root, self.parent[name]
+        return root
+
+    def union(self, names):
+        names = iter(names)
+        first = next(names, None)
+        if first is None:
+            return
+        root = self.find(first)
+        for name in names:
+            other = self.find(name)
+            if other != root:
+                self.parent[other] = root
+
+def sliceQuery(clauses, connectingVars, whileChecks, namesOf):
+    """
+    Split the query by cone of influence
+    returns (slices, dropped): one Slice per group of globals with connected
+    cones, in the order of connectingVars, and the number of clauses in no cone
+        namesOf: check -> variable names the under-unroll check reads
+    """
+    classes = NameClasses()
+    clauseVars = []
+    for clause in clauses:
+        names = clauseNames(clause)
+        classes.union(names)
+        clauseVars.append(names)
+    for var, ppVar in connectingVars:
+        classes.union([var, ppVar])
+
+    slices = {}
+    for var, ppVar in connectingVars:
+        root = classes.find(var)
+        if root not in slices:
+            slices[root] = Slice()
+        slices[root].connectingVars.append((var, ppVar))
+
+    dropped = 0
+    for clause, names in zip(clauses, clauseVars):
+        if not names:
+            # Ground clauses (a conflict the simplifier found) hold in every slice
+            for slice in slices.values():
+                slice.clauses.append(clause)
+            continue
+        root = classes.find(next(iter(names)))
+        if root in slices:
+            slices[root].clauses.append(clause)
+        else:
+            dropped += 1
+
+    for check in whileChecks:
+        for root in dict.fromkeys(classes.find(name) for name in namesOf(check)):
+            if root in slices:
+                slices[root].whileChecks.append(check)
+
+    return list(slices.values()), dropped
@@ -0,0 +1,169 @@
+"""
+Function summaries.
+
+A translated function body is kept as a summary: its term DAG flattened once,
+with holes for the parameters, the local SSA variables and the return value.
+Every call site rebuilds the body with the holes substituted by terms in a
+single pass over the summary.
+
+Summaries are cached under a hash of the alpha-normalized function (the
+function name dropped, parameters and locals numbered by first appearance),
+in memory and optionally on disk, so a helper that was already translated --
+earlier in this bundle or in another one -- is not translated again.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+from smt_terms import LEAF_OPS, postorder
+
+# Bump when the translation of function bodies changes, old summaries are ignored
+SUMMARY_FORMAT = 2
+
+# Bodies with these nodes write outside their own template while being
+# translated (calls instantiate other functions, loops add clauses and
+# checks), so their summary can't be reused on its own
+UNCACHEABLE_TYPES = ('CallExpression', 'WhileStatement', 'FunctionDeclaration', 'FunctionExpression')
+
+def normalizeFunction(ast):
+    """
+    Alpha-normalize a FunctionDeclaration
+    returns (key, names, cacheable)
+        key: hex digest identifying the function up to renaming
+        names: parameter and local names by canonical id, parameters first
+        cacheable: False if the translation has effects outside the summary
+    """
+    # Loaded here, importing the module must not pull in esprima
+    import esprima.nodes as nodes
+
+    names = [param.name for param in ast.params]
+    index = {name: i for i, name in enumerate(names)}
+    state = {'cacheable': True}
+
+    def canon(node):
+        if isinstance(node, list):
+            return [canon(item) for item in node]
+        if not isinstance(node, nodes.Node):
+            return node
+
+        if node.type in UNCACHEABLE_TYPES:
+            state['cacheable'] = False
+        if node.type == 'Identifier':
+            if node.name not in index:
+                index[node.name] = len(names)
+                names.append(node.name)
+            return ['Identifier', index[node.name]]
+
+        out = [node.type]
+        for field in sorted(node.keys()):
+            if field in ('type', 'range', 'loc'):
+                continue
+            out.append([field, canon(getattr(node, field))])
+        return out
+
+    body = [SUMMARY_FORMAT, len(ast.params), canon(ast.body)]
+    key = hashlib.sha256(json.dumps(body, default=str).encode()).hexdigest()
+    return key, names, state['cacheable']
+
+def compileTemplate(root, lookupNames, level):
+    """
+    Flatten a translated function body into a summary: its distinct nodes in
+    postorder, [op, payload] for leaves and [op, childIndex, ...] otherwise.
+    Holes refer to canonical ids, so the summary doesn't depend on the names used
+        root holes: ('ret',), ('arg', lookupName), ('var', lookupName, level, count)
+        lookupNames: funcScope-prefixed names by canonical id
+        level: declaration level of the function
+    """
+    index = {name: i for i, name in enumerate(lookupNames)}
+    position = {}
+    summary = []
+    for term in postorder([root]):
+        if term.op == 'hole':
+            hole = term.args
+            if hole[0] == 'ret':
+                entry = ['hole', ['ret']]
+            elif hole[0] == 'arg':
+                entry = ['hole', ['arg', index[hole[1]]]]
+            else:
+                entry = ['hole', ['var', index[hole[1]], hole[2] - level, hole[3]]]
+        elif term.op in LEAF_OPS:
+            entry = [term.op, list(term.args)]
+        else:
+            entry = [term.op] + [position[arg.id] for arg in term.args]
+        position[term.id] = len(summary)
+        summary.append(entry)
+    return summary
+
+def instantiateSummary(summary, lookupNames, funcName, level, nInvoke, args, terms):
+    # Rebuild the body in the current TermTable, each hole replaced by its term directly
+    built = []
+    for entry in summary:
+        op = entry[0]
+        if op == 'hole':
+            hole = entry[1]
+            if hole[0] == 'var':
+                term = terms.var('{}{}_{}_{}'.format(lookupNames[hole[1]], level + hole[2], hole[3], nInvoke))
+            elif hole[0] == 'arg':
+                term = args[hole[1]]
+            else:
+                term = terms.var('ret{}_{}'.format(funcName, nInvoke))
+        elif op in LEAF_OPS:
+            term = terms.mk(op, *entry[1])
+        else:
+            term = terms.mk(op, *[built[i] for i in entry[1:]])
+        built.append(term)
+    return built[-1]
+
+class FunctionSummaryCache:
+    """
+    FunctionSummaryCache
+        cacheDir: directory for summaries shared between runs, None for memory only
+    """
+
+    def __init__(self, cacheDir=None):
+        self.cacheDir = cacheDir
+        self.memory = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cacheDir, key[:2], key + '.json')
+
+    def get(self, key):
+        if key in self.memory:
+            self.hits += 1
+            return self.memory[key]
+
+        if self.cacheDir is not None:
+            try:
+                with open(self._path(key)) as f:
+                    summary = json.load(f)
+                self.memory[key] = summary
+                self.hits += 1
+                return summary
+            except (OSError, ValueError):
+                pass
+
+        self.misses += 1
+        return None
+
+    def put(self, key, summary):
+        self.memory[key] = summary
+        if self.cacheDir is None:
+            return
+
+        # Write and rename, so other processes never read half a summary
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(summary, f)
+            os.replace(tempPath, path)
+        except OSError:
+            try:
+                os.unlink(tempPath)
+            except OSError:
+                pass
@@ -0,0 +1,357 @@
+"""
+Static iteration bounds of while loops.
+
+An interval analysis runs the program over value ranges instead of values:
+every variable holds [lo, hi] or None when nothing is known, arithmetic on
+singletons folds exactly the way the encoding does, and both branches of an
+undecided if are joined.  A loop is run abstractly one iteration after the
+other from its entry ranges; the first iteration count at which its guard
+is false for every value in range bounds every concrete run, and the loop
+is unrolled that far from the start instead of doubling its way there.
+The ranges after the loop join the states in which the guard could fail.
+
+Loops whose guard stays undecided for MAX_ITERATIONS iterations get no
+bound and keep the doubling.  Constructs the analysis doesn't model (break,
+for loops, returns at the top level) make it give up on the whole program.
+"""
+
+from smt_simplify import foldConst, COMPARISONS
+from smt_terms import JS_OPERATORS
+
+MAX_ITERATIONS = 4096
+# Abstract statements executed before the whole analysis gives up
+STEP_BUDGET = 1000000
+
+INT_MIN, INT_MAX = -(1 << 31), (1 << 31) - 1
+
+class AnalysisGaveUp(Exception):
+    pass
+
+def interval(lo, hi):
+    # None when the range leaves 32 bits, the encoding would wrap
+    if lo < INT_MIN or hi > INT_MAX:
+        return None
+    return (lo, hi)
+
+def join(a, b):
+    if a is None or b is None:
+        return None
+    return (min(a[0], b[0]), max(a[1], b[1]))
+
+def truth(value):
+    # (may be true, may be false)
+    if value is None:
+        return True, True
+    lo, hi = value
+    return not (lo == hi == 0), lo <= 0 <= hi
+
+def fromTruth(mayHold, mayFail):
+    return (0 if mayFail else 1, 1 if mayHold else 0)
+
+def binaryInterval(op, a, b):
+    if a is None or b is None:
+        return (0, 1) if op in COMPARISONS else None
+    if a[0] == a[1] and b[0] == b[1]:
+        if op in COMPARISONS:
+            value = 1 if COMPARISONS[op](a[0], b[0]) else 0
+        else:
+            value = foldConst(op, a[0], b[0])
+        return None if value is None else (value, value)
+    if op == '+':
+        return interval(a[0] + b[0], a[1] + b[1])
+    if op == '-':
+        return interval(a[0] - b[1], a[1] - b[0])
+    if op == '*':
+        products = [x * y for x in a for y in b]
+        return interval(min(products), max(products))
+    if op == '<':
+        return fromTruth(a[0] < b[1], a[1] >= b[0])
+    if op == '<=':
+        return fromTruth(a[0] <= b[1], a[1] > b[0])
+    if op == '>':
+        return fromTruth(a[1] > b[0], a[0] <= b[1])
+    if op == '>=':
+        return fromTruth(a[1] >= b[0], a[0] < b[1])
+    if op == '==':
+        return fromTruth(a[0] <= b[1] and b[0] <= a[1], True)
+    if op == '!=':
+        return fromTruth(True, a[0] <= b[1] and b[0] <= a[1])
+    return None
+
+class State:
+    """
+    State
+        scopes: scope chain, innermost last, each name -> interval or None
+        dead: no execution reaches this point
+    """
+
+    def __init__(self, scopes, dead=False):
+        self.scopes = scopes
+        self.dead = dead
+
+    def copy(self):
+        return State([dict(scope) for scope in self.scopes], self.dead)
+
+    def scopeOf(self, name):
+        for scope in reversed(self.scopes):
+            if name in scope:
+                return scope
+        # Undeclared names are globals the translator looks up, nothing is known
+        return self.scopes[0]
+
+    def get(self, name):
+        return self.scopeOf(name).get(name)
+
+    def set(self, name, value):
+        self.scopeOf(name)[name] = value
+
+def joinStates(a, b):
+    if a is None or a.dead:
+        return b
+    if b is None or b.dead:
+        return a
+    scopes = []
+    for scopeA, scopeB in zip(a.scopes, b.scopes):
+        scopes.append({name: join(scopeA.get(name), scopeB.get(name)) for name in set(scopeA) | set(scopeB)})
+    return State(scopes)
+
+def hoistedNames(body):
+    # Names declared with var in a function body, not inside nested functions
+    names = []
+    stack = list(body)
+    while stack:
+        stmt = stack.pop()
+        if stmt.type == 'VariableDeclaration':
+            names += [decl.id.name for decl in stmt.declarations]
+        elif stmt.type == 'BlockStatement':
+            stack += stmt.body
+        elif stmt.type == 'IfStatement':
+            stack += [stmt.consequent] + ([stmt.alternate] if stmt.alternate is not None else [])
+        elif stmt.type == 'WhileStatement':
+            stack.append(stmt.body)
+    return names
+
+def assignedNames(node):
+    # Identifiers assigned anywhere below node
+    names = set()
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack += item
+            continue
+        if not hasattr(item, 'type'):
+            continue
+        if item.type == 'AssignmentExpression' and item.left.type == 'Identifier':
+            names.add(item.left.name)
+        for value in vars(item).values():
+            if isinstance(value, list) or hasattr(value, 'type'):
+                stack.append(value)
+    return names
+
+class BoundAnalysis:
+    """
+    BoundAnalysis
+        bounds: id of a WhileStatement -> most iterations any run takes,
+                None when unknown
+        functions: name -> FunctionDeclaration, for what calls may overwrite
+    """
+
+    def __init__(self):
+        self.bounds = {}
+        self.functions = {}
+        self.steps = 0
+
+    def step(self):
+        self.steps += 1
+        if self.steps > STEP_BUDGET:
+            raise AnalysisGaveUp('step budget of {} exceeded'.format(STEP_BUDGET))
+
+    def run(self, script):
+        state = State([dict.fromkeys(hoistedNames(script.body))])
+        self.hoistFunctions(script.body)
+        self.execute(script.body, state)
+        return self.bounds
+
+    def hoistFunctions(self, body):
+        # Calls may come before the declaration
+        for stmt in body:
+            if stmt.type == 'FunctionDeclaration':
+                self.functions[stmt.id.name] = stmt
+
+    def execute(self, stmts, state):
+        for stmt in stmts:
+            if state.dead:
+                return state
+            state = self.statement(stmt, state)
+        return state
+
+    def statement(self, stmt, state):
+        self.step()
+        kind = stmt.type
+        if kind == 'VariableDeclaration':
+            for decl in stmt.declarations:
+                if decl.init is not None:
+                    state.set(decl.id.name, self.evaluate(decl.init, state))
+        elif kind == 'ExpressionStatement':
+            self.evaluate(stmt.expression, state)
+        elif kind == 'BlockStatement':
+            state = self.execute(stmt.body, state)
+        elif kind == 'IfStatement':
+            mayHold, mayFail = truth(self.evaluate(stmt.test, state))
+            thenState = self.statement(stmt.consequent, state.copy()) if mayHold else None
+            elseState = state.copy() if mayFail else None
+            if mayFail and stmt.alternate is not None:
+                elseState = self.statement(stmt.alternate, elseState)
+            state = joinStates(thenState, elseState)
+        elif kind == 'WhileStatement':
+            state = self.loop(stmt, state)
+        elif kind in ('FunctionDeclaration', 'EmptyStatement'):
+            # Functions are hoisted
+            pass
+        else:
+            raise AnalysisGaveUp(kind)
+        return state
+
+    def loop(self, stmt, state):
+        # Iteration k starts from state, runs where the guard holds are continued
+        exitState = None
+        bound = None
+        for iterations in range(MAX_ITERATIONS + 1):
+            mayHold, mayFail = truth(self.evaluate(stmt.test, state))
+            if mayFail:
+                exitState = joinStates(exitState, state.copy())
+            if not mayHold:
+                bound = iterations
+                break
+            state = self.statement(stmt.body, state)
+            if state.dead:
+                bound = iterations + 1
+                break
+
+        key = id(stmt)
+        if bound is None:
+            # Unknown after the loop: whatever it writes
+            self.bounds[key] = None
+            exitState = joinStates(exitState, state)
+            for name in assignedNames(stmt.body):
+                exitState.set(name, None)
+            return exitState
+        # Nested loops are visited once per outer iteration, keep the worst
+        if key not in self.bounds or self.bounds[key] is not None:
+            self.bounds[key] = max(bound, self.bounds.get(key) or 0)
+        return exitState if exitState is not None else State(state.scopes, dead=True)
+
+    def evaluate(self, expr, state):
+        self.step()
+        kind = expr.type
+        if kind == 'Literal':
+            value = expr.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                return None
+            return interval(int(value), int(value))
+        if kind == 'Identifier':
+            return state.get(expr.name)
+        if kind == 'AssignmentExpression':
+            if expr.left.type != 'Identifier':
+                raise AnalysisGaveUp('assignment to {}'.format(expr.left.type))
+            value = self.evaluate(expr.right, state)
+            if expr.operator != '=':
+                op = expr.operator[:-1]
+                value = binaryInterval(JS_OPERATORS.get(op, op), state.get(expr.left.name), value)
+            state.set(expr.left.name, value)
+            return value
+        if kind == 'LogicalExpression':
+            leftHold, leftFail = truth(self.evaluate(expr.left, state))
+            rightHold, rightFail = truth(self.evaluate(expr.right, state))
+            if expr.operator == '&&':
+                return fromTruth(leftHold and rightHold, leftFail or rightFail)
+            if expr.operator == '||':
+                return fromTruth(leftHold or rightHold, leftFail and rightFail)
+            return None
+        if kind == 'BinaryExpression':
+            left, right = self.evaluate(expr.left, state), self.evaluate(expr.right, state)
+            return binaryInterval(JS_OPERATORS.get(expr.operator, expr.operator), left, right)
+        if kind == 'UnaryExpression':
+            value = self.evaluate(expr.argument, state)
+            if expr.operator == '!':
+                mayHold, mayFail = truth(value)
+                return fromTruth(mayFail, mayHold)
+            if expr.operator == '-' and value is not None:
+                return interval(-value[1], -value[0])
+            if expr.operator == '+':
+                return value
+            return None
+        if kind == 'CallExpression':
+            return self.call(expr, state)
+        raise AnalysisGaveUp(kind)
+
+    def call(self, expr, state):
+        for arg in expr.arguments:
+            self.evaluate(arg, state)
+        callee = expr.callee
+        if callee.type == 'FunctionExpression' and not callee.params:
+            # The (function() { ... })() wrapper runs in place, with its own vars
+            state.scopes.append(dict.fromkeys(hoistedNames(callee.body.body)))
+            self.hoistFunctions(callee.body.body)
+            state = self.execute(callee.body.body, state)
+            state.scopes.pop()
+            return None
+        if callee.type != 'Identifier':
+            raise AnalysisGaveUp('call of {}'.format(callee.type))
+        for name in self.clobbered(callee.name, set()):
+            state.set(name, None)
+        return None
+
+    def clobbered(self, funcName, visited):
+        # Names outside funcName that a call may overwrite, through the functions it calls too
+        func = self.functions.get(funcName)
+        if func is None or funcName in visited:
+            return set()
+        visited.add(funcName)
+        local = set(param.name for param in func.params) | set(hoistedNames(func.body.body))
+        names = assignedNames(func.body) - local
+        stack = [func.body]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, list):
+                stack += item
+                continue
+            if not hasattr(item, 'type'):
+                continue
+            if item.type == 'CallExpression' and item.callee.type == 'Identifier':
+                names |= self.clobbered(item.callee.name, visited)
+            for value in vars(item).values():
+                if isinstance(value, list) or hasattr(value, 'type'):
+                    stack.append(value)
+        return names
+
+def loopBounds(script):
+    """
+    id of every WhileStatement reached at the top level -> iteration bound
+    or None; empty when the analysis gave up
+    """
+    try:
+        return BoundAnalysis().run(script)
+    except AnalysisGaveUp:
+        return {}
+
+def loopNumbers(script):
+    """
+    id of every WhileStatement in script, inside functions too -> its
+    number in source order, the same for every parse of the program
+    """
+    numbers = {}
+    stack = [script]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack += reversed(item)
+            continue
+        if not hasattr(item, 'type'):
+            continue
+        if item.type == 'WhileStatement':
+            numbers[id(item)] = len(numbers)
+        children = [value for value in vars(item).values() if isinstance(value, list) or hasattr(value, 'type')]
+        stack += reversed(children)
+    return numbers
@@ -0,0 +1,249 @@
+"""
+Closed forms of affine induction loops.
+
+A while loop whose body only steps variables by constants (i = i + 1),
+accumulates such counters (v = v + i) or overwrites a variable the body never
+reads with a linear expression of them (v = i) needs no unrolling: after k
+iterations every variable is a polynomial in k,
+    x0 + b*k + d*k*(k+1)/2
+with d a constant.  The loop is then encoded with a symbolic iteration count
+n: the condition fails after n iterations, held after n-1 and, unless n is
+0, on entry.  That it held after every iteration in between as well follows
+from the shape of the condition, a conjunction of <, <=, >, >= whose sides
+are convex for < and concave for >, so it holds on a single run of
+iterations as long as nothing overflows.  To keep it that
+way the count and the entry values of the loop's variables are bounded so
+no value along the way can leave 32 bits; like the unroll depth, the bound
+limits which runs the formula covers, only a lot less tightly.  Loops that
+don't fit are unrolled as before.
+
+Polynomials are dicts (power, name) -> int coefficient, power 0 for 1, 1 for
+k and 2 for k*(k+1)/2, name the variable whose value at loop entry the term
+is scaled by, None for a constant.
+"""
+
+COMPARISON_DIRECTIONS = {'<': 1, '<=': 1, '>': -1, '>=': -1}
+# Iteration and entry value bounds tried in order, the first pair that can't overflow is used
+ITERATION_BOUNDS = [1 << 16, 1 << 12, 1 << 8]
+ENTRY_BOUNDS = [1 << 24, 1 << 20, 1 << 16, 1 << 12]
+
+class LoopShape:
+    """
+    LoopShape
+        assigned: variables the body writes, in order
+        forms: name -> polynomial of its value after k iterations, for set
+               variables the value for k >= 1
+        setVars: variables overwritten by each iteration, their value after
+                 0 iterations is the one at loop entry
+        names: every variable the loop reads or writes
+        sides: polynomials of the condition's comparison sides
+        iterationBound, entryBound: limits on the count and on |entry value|
+    """
+
+    def __init__(self):
+        self.assigned = []
+        self.forms = {}
+        self.setVars = set()
+        self.names = set()
+        self.sides = []
+        self.iterationBound = None
+        self.entryBound = None
+
+def addPoly(poly, other, scale=1):
+    for key, coef in other.items():
+        poly[key] = poly.get(key, 0) + scale * coef
+        if poly[key] == 0:
+            del poly[key]
+    return poly
+
+def linear(expr):
+    # name -> coefficient (None for the constant) of a linear expression, None if it isn't one
+    if expr.type == 'Literal':
+        value = expr.value
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+            return None
+        return {None: int(value)} if value else {}
+    if expr.type == 'Identifier':
+        return {expr.name: 1}
+    if expr.type == 'UnaryExpression' and expr.operator in ('-', '+'):
+        inner = linear(expr.argument)
+        return None if inner is None else addPoly({}, inner, -1 if expr.operator == '-' else 1)
+    if expr.type != 'BinaryExpression':
+        return None
+    left, right = linear(expr.left), linear(expr.right)
+    if left is None or right is None:
+        return None
+    if expr.operator == '+':
+        return addPoly(dict(left), right)
+    if expr.operator == '-':
+        return addPoly(dict(left), right, -1)
+    if expr.operator == '*':
+        # Only scaling by a constant keeps it linear
+        if set(left) <= {None}:
+            return addPoly({}, right, left.get(None, 0))
+        if set(right) <= {None}:
+            return addPoly({}, left, right.get(None, 0))
+    return None
+
+def bodyAssignments(body):
+    # [(name, operator, right side)] of a body made only of assignments to identifiers
+    stmts = body.body if body.type == 'BlockStatement' else [body]
+    assignments = []
+    for stmt in stmts:
+        if stmt.type != 'ExpressionStatement' or stmt.expression.type != 'AssignmentExpression':
+            return None
+        expr = stmt.expression
+        if expr.left.type != 'Identifier' or expr.operator not in ('=', '+=', '-='):
+            return None
+        assignments.append((expr.left.name, expr.operator, expr.right))
+    return assignments
+
+def stepOf(name, operator, right):
+    # Linear increment of name = name +/- e (or name += e), None when it isn't a step of name
+    if operator != '=':
+        increment = linear(right)
+        scale = 1 if operator == '+=' else -1
+    elif right.type == 'BinaryExpression' and right.operator in ('+', '-'):
+        left, other = right.left, right.right
+        scale = 1 if right.operator == '+' else -1
+        if right.operator == '+' and not (left.type == 'Identifier' and left.name == name):
+            left, other = other, left
+        if not (left.type == 'Identifier' and left.name == name):
+            return None
+        increment = linear(other)
+    else:
+        return None
+    if increment is None or name in increment:
+        return None
+    return addPoly({}, increment, scale)
+
+def analyzeLoop(ast):
+    """
+    LoopShape of a WhileStatement, None when it has to be unrolled
+    """
+    assignments = bodyAssignments(ast.body)
+    if not assignments:
+        return None
+    assigned = [name for name, _, _ in assignments]
+    if len(set(assigned)) != len(assigned):
+        return None
+
+    steps = {}
+    for name, operator, right in assignments:
+        step = stepOf(name, operator, right)
+        if step is not None:
+            steps[name] = step
+    # Basic induction variables step by a constant
+    basic = {name: step.get(None, 0) for name, step in steps.items() if set(step) <= {None}}
+
+    shape = LoopShape()
+    shape.assigned = assigned
+    read = set()
+    updated = set()
+    for name, operator, right in assignments:
+        if name in basic:
+            shape.forms[name] = {(0, name): 1, (1, None): basic[name]}
+        elif name in steps:
+            # The accumulator gains sum_{j=1..k} of the increment in iteration j
+            form = {(0, name): 1}
+            for term, coef in steps[name].items():
+                if not addTerm(form, term, coef, basic, assigned, updated, summed=True):
+                    return None
+            shape.forms[name] = form
+            read.update(term for term in steps[name] if term is not None)
+        else:
+            value = linear(right)
+            if value is None:
+                return None
+            form = {}
+            for term, coef in value.items():
+                if not addTerm(form, term, coef, basic, assigned, updated, summed=False):
+                    return None
+            shape.forms[name] = form
+            shape.setVars.add(name)
+            read.update(term for term in value if term is not None)
+        updated.add(name)
+
+    if shape.setVars & read:
+        return None
+
+    conjuncts = flattenAnd(ast.test)
+    for conjunct in conjuncts:
+        if not monotoneConjunct(conjunct, shape, assigned):
+            return None
+
+    shape.names = set(assigned) | read
+    for conjunct in conjuncts:
+        for side in (conjunct.left, conjunct.right):
+            shape.names.update(name for name in linear(side) if name is not None)
+            shape.sides.append(polyAt(linear(side), shape, assigned))
+
+    for iterationBound in ITERATION_BOUNDS:
+        for entryBound in ENTRY_BOUNDS:
+            polys = list(shape.forms.values()) + shape.sides
+            if all(magnitude(poly, iterationBound, entryBound) < 1 << 31 for poly in polys):
+                shape.iterationBound, shape.entryBound = iterationBound, entryBound
+                return shape
+    return None
+
+def magnitude(poly, iterationBound, entryBound):
+    # Bound on |poly| for 0 <= k <= iterationBound and entry values within entryBound,
+    # the partial sums of its terms stay under it too
+    scales = {0: 1, 1: iterationBound, 2: iterationBound * (iterationBound + 1) // 2}
+    return sum(abs(coef) * scales[power] * (1 if name is None else entryBound) for (power, name), coef in poly.items())
+
+def polyAt(value, shape, assigned):
+    # Polynomial of a linear expression over the state after k iterations
+    poly = {}
+    for name, coef in value.items():
+        if name is None or name not in assigned:
+            addPoly(poly, {(0, name): coef})
+        else:
+            addPoly(poly, shape.forms[name], coef)
+    return poly
+
+def addTerm(form, term, coef, basic, assigned, updated, summed):
+    # Add coef * term as seen in iteration j (summed over j=1..k for accumulators)
+    if term is None or term not in assigned:
+        power = 1 if summed else 0
+        form[(power, term)] = form.get((power, term), 0) + coef
+        return True
+    if term not in basic:
+        return False
+    step = basic[term]
+    # Variables updated earlier in the body are read after their own step
+    lag = 0 if term in updated else 1
+    if summed:
+        # sum_{j=1..k} (term0 + step*(j-lag)) = term0*k + step*(k(k+1)/2 - lag*k)
+        addPoly(form, {(1, term): coef, (2, None): coef * step, (1, None): -lag * coef * step})
+    else:
+        addPoly(form, {(0, term): coef, (1, None): coef * step, (0, None): -lag * coef * step})
+    return True
+
+def flattenAnd(test):
+    if test.type == 'LogicalExpression' and test.operator == '&&':
+        return flattenAnd(test.left) + flattenAnd(test.right)
+    return [test]
+
+def monotoneConjunct(conjunct, shape, assigned):
+    # The states where the conjunct holds must be one run of iterations,
+    # summarizeLoop asserts that it starts on entry
+    if conjunct.type != 'BinaryExpression' or conjunct.operator not in COMPARISON_DIRECTIONS:
+        return False
+    left, right = linear(conjunct.left), linear(conjunct.right)
+    if left is None or right is None:
+        return False
+    difference = addPoly(dict(left), right, -1)
+
+    poly = polyAt(difference, shape, assigned)
+    direction = COMPARISON_DIRECTIONS[conjunct.operator]
+    curvature = poly.get((2, None), 0)
+    if direction * curvature < 0:
+        return False
+    if not any(name in shape.setVars for name in difference):
+        return True
+    # Set variables jump from their entry value, from k = 1 on the side has
+    # to move away from holding, with a known slope
+    if any(power == 1 and name is not None for power, name in poly):
+        return False
+    return direction * (poly.get((1, None), 0) + 2 * curvature) >= 0
@@ -0,0 +1,218 @@
+"""
+Content-addressed on-disk cache for prepack output.
+
+Entries are keyed by a hash of the input source, the prepack version and the
+flags prepack was run with, so re-verifying an unchanged file (or retrying it
+at a deeper unroll) never spawns prepack again.  The version is the one of
+whatever produces the output: the prepack executable, or the module resident
+workers loaded.  The cache is bounded in size and evicts least recently used
+entries; several verifier processes can share one cache directory.
+"""
+
+import contextlib
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import tempfile
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'prepack-eq')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Eviction goes down to this fraction of maxBytes, so the next one is many puts away
+EVICT_TO = 0.75
+
+class PrepackCache:
+    """
+    PrepackCache
+        cacheDir: directory holding the entries, created on demand
+        maxBytes: total size of entries kept before LRU eviction
+        prepackCmd: prepack executable
+    """
+
+    def __init__(self, cacheDir=DEFAULT_CACHE_DIR, maxBytes=DEFAULT_MAX_BYTES, prepackCmd='prepack'):
+        self.cacheDir = cacheDir
+        self.maxBytes = maxBytes
+        self.prepackCmd = prepackCmd
+        self.hits = 0
+        self.misses = 0
+        self._version = None
+
+    def prepackVersion(self):
+        # `prepack --version` is itself a Node start, so remember it on disk
+        # next to the executable's identity and only ask again when it changes
+        if self._version is not None:
+            return self._version
+
+        exePath = shutil.which(self.prepackCmd) or self.prepackCmd
+        try:
+            exeStat = os.stat(os.path.realpath(exePath))
+            exeId = '{}:{}:{}'.format(os.path.realpath(exePath), exeStat.st_mtime_ns, exeStat.st_size)
+        except OSError:
+            exeId = exePath
+
+        versionFile = os.path.join(self.cacheDir, 'versions', hashlib.sha256(exeId.encode()).hexdigest())
+        try:
+            with open(versionFile) as f:
+                self._version = f.read()
+            return self._version
+        except OSError:
+            pass
+
+        try:
+            version = subprocess.check_output([self.prepackCmd, '--version'], stderr=subprocess.DEVNULL).decode().strip()
+        except (OSError, subprocess.CalledProcessError):
+            # Older prepack builds have no --version, fall back to the executable identity
+            version = exeId
+
+        self._writeAtomic(versionFile, version.encode())
+        self._version = version
+        return version
+
+    def key(self, source, flags=(), version=None):
+        # version of what produces the output, the prepack executable's by default
+        h = hashlib.sha256()
+        h.update((self.prepackVersion() if version is None else version).encode())
+        h.update(b'\0')
+        h.update('\0'.join(flags).encode())
+        h.update(b'\0')
+        h.update(source if isinstance(source, bytes) else source.encode())
+        return h.hexdigest()
+
+    def _entryPath(self, key):
+        return os.path.join(self.cacheDir, 'entries', key[:2], key)
+
+    def _writeAtomic(self, path, data):
+        # Write to a temp file in the same directory and rename over the
+        # target, so concurrent readers never see a partial entry
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tempPath = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tempPath, path)
+        except BaseException:
+            try:
+                os.unlink(tempPath)
+            except OSError:
+                pass
+            raise
+
+    def get(self, key):
+        path = self._entryPath(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        # mtime doubles as the LRU clock
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def put(self, key, data):
+        path = self._entryPath(key)
+        try:
+            oldSize = os.stat(path).st_size
+        except OSError:
+            oldSize = 0
+        self._writeAtomic(path, data)
+
+        # The total size of the entries is kept in a file next to them, so a
+        # put only walks the cache directory when it has to evict
+        with self._locked():
+            totalBytes = self._readTotal()
+            if totalBytes is None:
+                totalBytes = self._walk()[1]
+            else:
+                totalBytes += len(data) - oldSize
+            if totalBytes > self.maxBytes:
+                totalBytes = self._evict(int(self.maxBytes * EVICT_TO))
+            self._writeAtomic(self._totalPath(), str(totalBytes).encode())
+
+    def _totalPath(self):
+        return os.path.join(self.cacheDir, 'size')
+
+    def _readTotal(self):
+        try:
+            with open(self._totalPath()) as f:
+                return int(f.read())
+        except (OSError, ValueError):
+            return None
+
+    @contextlib.contextmanager
+    def _locked(self):
+        # One writer of the total and evictor at a time, readers don't need the lock
+        os.makedirs(self.cacheDir, exist_ok=True)
+        with open(os.path.join(self.cacheDir, 'lock'), 'w') as lockFile:
+            fcntl.flock(lockFile, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lockFile, fcntl.LOCK_UN)
+
+    def _walk(self):
+        # (mtime, size, path) of every entry, and their total size
+        entries = []
+        totalBytes = 0
+        for dirPath, _, fileNames in os.walk(os.path.join(self.cacheDir, 'entries')):
+            for fileName in fileNames:
+                if fileName.startswith('.tmp-'):
+                    continue
+                path = os.path.join(dirPath, fileName)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+                totalBytes += st.st_size
+        return entries, totalBytes
+
+    def _evict(self, targetBytes):
+        # Delete least recently used entries down to targetBytes, returns the size left
+        entries, totalBytes = self._walk()
+        entries.sort()
+        for _, size, path in entries:
+            if totalBytes <= targetBytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            totalBytes -= size
+        return totalBytes
+
+    def evict(self):
+        # Bring the cache within maxBytes, recounting the entries other processes may have changed
+        with self._locked():
+            totalBytes = self._walk()[1]
+            if totalBytes > self.maxBytes:
+                totalBytes = self._evict(self.maxBytes)
+            self._writeAtomic(self._totalPath(), str(totalBytes).encode())
+
+    def run(self, programFile, flags=(), runner=None, version=None):
+        """
+        Return prepack's output (bytes) for programFile, from the cache when
+        the same source was already prepacked with the same version and flags
+            runner: callable(programFile) used on a miss instead of spawning prepack
+            version: prepack version runner produces output with, when it isn't the executable's
+        """
+        with open(programFile, 'rb') as f:
+            source = f.read()
+
+        key = self.key(source, flags, version)
+        data = self.get(key)
+        if data is not None:
+            self.hits += 1
+            return data
+
+        self.misses += 1
+        if runner is not None:
+            data = runner(programFile)
+        else:
+            data = subprocess.check_output([self.prepackCmd] + list(flags) + [programFile])
+        self.put(key, data)
+        return data
@@ -0,0 +1,60 @@
+// Resident prepack worker, driven by prepack_worker.py
+//
+// Protocol: one JSON object per line in both directions.
+//   startup  -> {"ready": true, "version": "..."} or {"ready": false, "error": "..."}
+//   request  <- {"id": 1, "filePath": "script.js", "source": "..."}
+//   response -> {"id": 1, "code": "..."} or {"id": 1, "error": "..."}
+//
+// The prepack module is taken from $PREPACK_MODULE when set, so a globally
+// installed prepack can be used without adding it to a local node_modules.
+
+const readline = require('readline');
+
+function send(obj) {
+  process.stdout.write(JSON.stringify(obj) + '\n');
+}
+
+let prepack;
+try {
+  prepack = require(process.env.PREPACK_MODULE || 'prepack');
+} catch (e) {
+  send({ ready: false, error: String(e && e.message ? e.message : e) });
+  process.exit(1);
+}
+
+function runPrepack(filePath, source) {
+  if (typeof prepack.prepackSources === 'function') {
+    return prepack.prepackSources([{ filePath: filePath, fileContents: source, sourceMapContents: '' }], {}).code;
+  }
+  // Older releases only export prepack(code, options)
+  return prepack.prepack(source, { filename: filePath }).code;
+}
+
+// Part of the prepack output cache's keys, the module's path when it has no package.json
+let version = '';
+try {
+  version = require((process.env.PREPACK_MODULE || 'prepack') + '/package.json').version;
+} catch (e) {
+  version = 'unknown ' + require.resolve(process.env.PREPACK_MODULE || 'prepack');
+}
+send({ ready: true, version: version });
+
+const rl = readline.createInterface({ input: process.stdin, terminal: false });
+rl.on('line', (line) => {
+  if (line.trim() === '') {
+    return;
+  }
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    send({ id: null, error: 'bad request: ' + e.message });
+    return;
+  }
+  try {
+    send({ id: request.id, code: runPrepack(request.filePath || 'input.js', request.source) });
+  } catch (e) {
+    send({ id: request.id, error: String(e && e.stack ? e.stack : e) });
+  }
+});
+rl.on('close', () => process.exit(0));
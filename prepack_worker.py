@@ -0,0 +1,182 @@
+"""
+Pool of resident prepack workers.
+
+Each worker is a long-lived Node process running prepack_worker.js, so Node
+and Prepack start once per worker instead of once per file.  Requests are
+sent over stdin as JSON lines (see prepack_worker.js for the protocol), with a
+per-request timeout; a worker that crashes or times out is killed and
+restarted.  Any script that speaks the same protocol can stand in for the
+real worker through workerCmd.
+"""
+
+import json
+import os
+import queue
+import subprocess
+import threading
+
+DEFAULT_WORKER_CMD = ['node', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prepack_worker.js')]
+DEFAULT_TIMEOUT = 120
+START_TIMEOUT = 60
+
+class PrepackWorkerError(RuntimeError):
+    pass
+
+class PrepackTimeout(PrepackWorkerError):
+    pass
+
+class PrepackWorker:
+    """
+    PrepackWorker
+        workerCmd: command line of the resident process
+        version: prepack version reported at startup
+    """
+
+    def __init__(self, workerCmd=None):
+        self.workerCmd = workerCmd if workerCmd is not None else DEFAULT_WORKER_CMD
+        self.proc = None
+        self.version = ''
+        self.nextId = 0
+        self.start()
+
+    def start(self):
+        self.proc = subprocess.Popen(self.workerCmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                     stderr=subprocess.DEVNULL)
+        self.responses = queue.Queue()
+        # A reader thread turns the blocking pipe into a queue we can wait on with a timeout
+        reader = threading.Thread(target=self._readLoop, args=(self.proc, self.responses), daemon=True)
+        reader.start()
+
+        ready = self._receive(START_TIMEOUT)
+        if not ready.get('ready'):
+            self.stop()
+            raise PrepackWorkerError('prepack worker failed to start: {}'.format(ready.get('error', '')))
+        self.version = ready.get('version', '')
+
+    @staticmethod
+    def _readLoop(proc, responses):
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                responses.put(json.loads(line.decode()))
+            except ValueError:
+                continue
+        # EOF, the process exited
+        responses.put(None)
+
+    def _receive(self, timeout):
+        try:
+            response = self.responses.get(timeout=timeout)
+        except queue.Empty:
+            self.stop()
+            raise PrepackTimeout('prepack worker did not answer within {}s'.format(timeout))
+        if response is None:
+            self.stop()
+            raise PrepackWorkerError('prepack worker exited with code {}'.format(self.proc.poll()))
+        return response
+
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def request(self, source, filePath='input.js', timeout=DEFAULT_TIMEOUT):
+        if not self.alive():
+            self.start()
+
+        self.nextId += 1
+        requestId = self.nextId
+        message = json.dumps({'id': requestId, 'filePath': filePath, 'source': source}) + '\n'
+        try:
+            self.proc.stdin.write(message.encode())
+            self.proc.stdin.flush()
+        except (BrokenPipeError, OSError):
+            self.stop()
+            raise PrepackWorkerError('prepack worker exited with code {}'.format(self.proc.poll()))
+
+        while True:
+            response = self._receive(timeout)
+            # Skip answers to requests that timed out earlier
+            if response.get('id') == requestId:
+                break
+
+        if 'error' in response:
+            raise PrepackWorkerError(response['error'])
+        return response['code']
+
+    def stop(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        for pipe in (self.proc.stdin, self.proc.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+class PrepackWorkerPool:
+    """
+    PrepackWorkerPool
+        size: number of resident workers, started lazily
+        workerCmd: command line of each worker (default node prepack_worker.js)
+        timeout: seconds allowed per request before the worker is restarted
+        retries: extra attempts on a fresh worker after a crash
+    """
+
+    def __init__(self, size=1, workerCmd=None, timeout=DEFAULT_TIMEOUT, retries=1):
+        self.size = size
+        self.workerCmd = workerCmd
+        self.timeout = timeout
+        self.retries = retries
+        self.idle = queue.Queue()
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def _acquire(self):
+        with self.lock:
+            if self.idle.empty() and len(self.workers) < self.size:
+                worker = PrepackWorker(self.workerCmd)
+                self.workers.append(worker)
+                return worker
+        return self.idle.get()
+
+    def prepack(self, source, filePath='input.js'):
+        worker = self._acquire()
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    return worker.request(source, filePath, self.timeout)
+                except PrepackTimeout:
+                    raise
+                except PrepackWorkerError:
+                    # prepack rejecting the input is not a crash, don't retry it
+                    if worker.alive() or attempt == self.retries:
+                        raise
+                    worker.start()
+        finally:
+            self.idle.put(worker)
+
+    def version(self):
+        # Prepack version the workers loaded, starting one if none runs yet
+        worker = self._acquire()
+        try:
+            if not worker.alive():
+                worker.start()
+            return worker.version
+        finally:
+            self.idle.put(worker)
+
+    def run(self, programFile):
+        # Same contract as subprocess.check_output(['prepack', programFile])
+        with open(programFile) as f:
+            source = f.read()
+        return self.prepack(source, os.path.basename(programFile)).encode()
+
+    def close(self):
+        with self.lock:
+            for worker in self.workers:
+                worker.stop()
+            self.workers = []
+            self.idle = queue.Queue()
@@ -0,0 +1,115 @@
+"""
+Per-phase profile of a check, written as JSON by --profile.
+
+Phases (parse, prepack, translate, assert, check, ...) are timed with
+perf_counter, and their peak memory is the most Python memory tracemalloc
+saw allocated while they ran beyond what was live when they started; z3's
+own allocations only show in its statistics and in the process's maximum
+RSS.  A phase nested in another counts toward both.  Translation is also
+split by AST node type, each type charged its own time without the nodes
+below it.
+
+Every main() run at some unroll depth is a round, with the formula sizes,
+counts and z3 statistics of that run; counts are totalled over the rounds
+as well.
+"""
+
+import contextlib
+import json
+import resource
+import time
+import tracemalloc
+
+class Profile:
+    """
+    Profile
+        phases: name -> {'seconds', 'calls', 'peakBytes'}, peakBytes over the
+                memory live at the start of the phase
+        nodeTypes: AST node type -> {'seconds', 'calls'}, exclusive of nested nodes
+        counts: name -> total over the rounds (inlined calls, version marks, ...)
+        rounds: one dict per round, its settings, sizes, counts and solver statistics
+    """
+
+    def __init__(self):
+        self.phases = {}
+        self.nodeTypes = {}
+        self.counts = {}
+        self.rounds = []
+        # [memory live at the start, highest peak seen before a nested phase reset it]
+        self.phaseStack = []
+        # [node type, start, seconds of nested nodes]
+        self.nodeStack = []
+        self.startTime = time.perf_counter()
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        if self.phaseStack:
+            outer = self.phaseStack[-1]
+            outer[1] = max(outer[1], tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        entry = [tracemalloc.get_traced_memory()[0], 0]
+        self.phaseStack.append(entry)
+        startTime = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - startTime
+            peak = max(entry[1], tracemalloc.get_traced_memory()[1])
+            self.phaseStack.pop()
+            if self.phaseStack:
+                outer = self.phaseStack[-1]
+                outer[1] = max(outer[1], peak)
+            stats = self.phases.setdefault(name, {'seconds': 0.0, 'calls': 0, 'peakBytes': 0})
+            stats['seconds'] += seconds
+            stats['calls'] += 1
+            stats['peakBytes'] = max(stats['peakBytes'], peak - entry[0])
+
+    def enterNode(self, nodeType):
+        self.nodeStack.append([nodeType, time.perf_counter(), 0.0])
+
+    def exitNode(self):
+        nodeType, startTime, nested = self.nodeStack.pop()
+        seconds = time.perf_counter() - startTime
+        if self.nodeStack:
+            self.nodeStack[-1][2] += seconds
+        stats = self.nodeTypes.setdefault(nodeType, {'seconds': 0.0, 'calls': 0})
+        stats['seconds'] += seconds - nested
+        stats['calls'] += 1
+
+    def beginRound(self, **settings):
+        self.rounds.append(dict(settings, counts={}))
+
+    def currentRound(self):
+        # Counts before the first round still need somewhere to go
+        if not self.rounds:
+            self.beginRound()
+        return self.rounds[-1]
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+        counts = self.currentRound()['counts']
+        counts[name] = counts.get(name, 0) + n
+
+    def note(self, **values):
+        # Sizes and results of the current round
+        self.currentRound().update(values)
+
+    def solverStatistics(self, statistics):
+        # z3's counters are cumulative per solver, the last check of a round has them all
+        self.note(solver={key: statistics.get_key_value(key) for key in statistics.keys()})
+
+    def record(self):
+        return {'seconds': time.perf_counter() - self.startTime,
+                # ru_maxrss is in kilobytes on Linux
+                'maxRSSBytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                'phases': self.phases,
+                'nodeTypes': self.nodeTypes,
+                'counts': self.counts,
+                'rounds': self.rounds}
+
+    def write(self, fileName, **extra):
+        with open(fileName, 'w') as f:
+            json.dump(dict(self.record(), **extra), f, indent=2, sort_keys=True)
+            f.write('\n')
@@ -0,0 +1,363 @@
+"""
+Random differential testing over many inputs at once.
+
+Programs with free inputs (globals declared without a value) are run on
+thousands of random int32 input vectors together, one lane per vector, with
+NumPy arrays as values.  Branches run under lane masks and assignments only
+touch the active lanes; a while loop keeps going until its mask is empty.
+The original and the prepack output see the same inputs (ppx is fed what x
+is), and a lane where a compared global differs is a counterexample found
+without the solver.  When every lane agrees the SMT path still has to decide.
+
+NumPy is optional: without it available() is False and the stage is skipped.
+"""
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from concrete_eval import ConcreteUnsupported, UNDEFINED, topLevelNames
+from smt_simplify import wrap32
+from smt_terms import JS_OPERATORS
+
+DEFAULT_LANES = 4096
+STEP_BUDGET = 100000
+MAX_CALL_DEPTH = 50
+# Fraction of lanes drawn from small values, which hit constants in branch conditions far more often
+SMALL_FRACTION = 0.5
+SMALL_RANGE = 16
+
+def available():
+    return np is not None
+
+class InputPool:
+    """
+    InputPool
+        lanes: number of input vectors
+        values: input name -> int32 array, shared by the original and the prepack run
+    """
+
+    def __init__(self, lanes, seed=0):
+        self.lanes = lanes
+        self.rng = np.random.default_rng(seed)
+        self.values = {}
+
+    def get(self, name):
+        if name not in self.values:
+            small = self.rng.integers(-SMALL_RANGE, SMALL_RANGE + 1, self.lanes)
+            full = self.rng.integers(-2 ** 31, 2 ** 31, self.lanes)
+            pick = self.rng.random(self.lanes) < SMALL_FRACTION
+            self.values[name] = np.where(pick, small, full).astype(np.int32)
+        return self.values[name]
+
+def defined(value):
+    if value is UNDEFINED:
+        raise ConcreteUnsupported('uses a call without return value')
+    return value
+
+def asInt(value):
+    return value.astype(np.int32) if defined(value).dtype == np.bool_ else value
+
+def asBool(value):
+    return value if defined(value).dtype == np.bool_ else value != 0
+
+def binary(op, a, b):
+    # Lane-wise op with the semantics of the BitVec encoding
+    if op in ('==', '!=') and a.dtype == np.bool_ and b.dtype == np.bool_:
+        return (a == b) if op == '==' else (a != b)
+    if op in ('and', 'or'):
+        return np.logical_and(asBool(a), asBool(b)) if op == 'and' else np.logical_or(asBool(a), asBool(b))
+    a, b = asInt(a), asInt(b)
+    if op == '+':
+        return a + b
+    if op == '-':
+        return a - b
+    if op == '*':
+        return a * b
+    if op == '/' or op == '%':
+        wideA, wideB = a.astype(np.int64), b.astype(np.int64)
+        safeB = np.where(wideB == 0, 1, wideB)
+        quotient = np.abs(wideA) // np.abs(safeB) * np.where((wideA < 0) == (safeB < 0), 1, -1)
+        if op == '/':
+            # bvsdiv by zero is -1 for non-negative dividends and 1 otherwise
+            return np.where(wideB == 0, np.where(wideA >= 0, -1, 1), quotient).astype(np.int32)
+        return np.where(wideB == 0, wideA, wideA - wideB * quotient).astype(np.int32)
+    if op == '&':
+        return a & b
+    if op == '|':
+        return a | b
+    if op == '^':
+        return a ^ b
+    if op == '<<':
+        return (a.astype(np.int64) << (b & 31)).astype(np.int32)
+    if op == '>>':
+        return a >> (b & 31)
+    if op == '>>>':
+        return (a.view(np.uint32) >> (b & 31).astype(np.uint32)).view(np.int32)
+    if op == '==':
+        return a == b
+    if op == '!=':
+        return a != b
+    if op == '<':
+        return a < b
+    if op == '<=':
+        return a <= b
+    if op == '>':
+        return a > b
+    if op == '>=':
+        return a >= b
+    raise ConcreteUnsupported('operator {}'.format(op))
+
+class Frame:
+    """
+    Frame
+        parent: enclosing frame, None for the global one
+        vars: name -> lane values of the variables declared in this function
+        functions: name -> (declaration, frame it closes over)
+        returned: lanes that already returned from this call, None at the top level
+        result: return value per lane
+    """
+
+    def __init__(self, parent=None, lanes=0):
+        self.parent = parent
+        self.vars = {}
+        self.functions = {}
+        self.returned = None if parent is None else np.zeros(lanes, dtype=np.bool_)
+        self.result = None
+
+    def hoist(self, body):
+        for stmt in body:
+            if stmt.type == 'FunctionDeclaration':
+                self.functions[stmt.id.name] = (stmt, self)
+
+class VectorEvaluator:
+    """
+    VectorEvaluator
+        pool: InputPool the free inputs are drawn from
+        inputPrefix: prefix stripped from names before they are looked up in the pool
+        valid: lanes that ran to completion, the others are ignored
+        inputs: pool names this program declared without a value
+    """
+
+    def __init__(self, pool, inputPrefix='', stepBudget=STEP_BUDGET):
+        self.pool = pool
+        self.lanes = pool.lanes
+        self.inputPrefix = inputPrefix
+        self.stepBudget = stepBudget
+        self.steps = 0
+        self.depth = 0
+        self.valid = np.ones(self.lanes, dtype=np.bool_)
+        self.inputs = set()
+        self.globalFrame = Frame()
+
+    def step(self):
+        self.steps += 1
+        if self.steps > self.stepBudget:
+            raise ConcreteUnsupported('step budget of {} exceeded'.format(self.stepBudget))
+
+    def run(self, script):
+        self.globalFrame.hoist(script.body)
+        mask = np.ones(self.lanes, dtype=np.bool_)
+        for stmt in script.body:
+            self.execute(stmt, self.globalFrame, mask)
+        return self.globalFrame.vars
+
+    def const(self, value):
+        return np.full(self.lanes, value, dtype=np.int32)
+
+    def varsOf(self, name, frame):
+        while frame is not None:
+            if name in frame.vars:
+                return frame.vars
+            frame = frame.parent
+        raise ConcreteUnsupported('undeclared variable {}'.format(name))
+
+    def functionOf(self, name, frame):
+        while frame is not None:
+            if name in frame.functions:
+                return frame.functions[name]
+            frame = frame.parent
+        return None
+
+    def execute(self, stmt, frame, mask):
+        self.step()
+        if frame.returned is not None:
+            mask = mask & ~frame.returned
+        if not mask.any():
+            return
+
+        kind = stmt.type
+        if kind == 'VariableDeclaration':
+            for decl in stmt.declarations:
+                name = decl.id.name
+                if decl.init is not None:
+                    value = defined(self.evaluate(decl.init, frame, mask))
+                    if name in frame.vars:
+                        self.assign(name, value, frame, mask)
+                    else:
+                        frame.vars[name] = value
+                elif name not in frame.vars:
+                    # Declared without a value: a free input of the encoding
+                    inputName = name[len(self.inputPrefix):] if name.startswith(self.inputPrefix) else name
+                    self.inputs.add(inputName)
+                    frame.vars[name] = self.pool.get(inputName)
+        elif kind == 'ExpressionStatement':
+            self.evaluate(stmt.expression, frame, mask)
+        elif kind == 'BlockStatement':
+            # The encoding scopes these to the block, see concrete_eval
+            if any(inner.type == 'VariableDeclaration' for inner in stmt.body):
+                raise ConcreteUnsupported('var declared in a nested block')
+            for inner in stmt.body:
+                self.execute(inner, frame, mask)
+        elif kind == 'IfStatement':
+            cond = asBool(self.evaluate(stmt.test, frame, mask))
+            self.execute(stmt.consequent, frame, mask & cond)
+            if stmt.alternate is not None:
+                self.execute(stmt.alternate, frame, mask & ~cond)
+        elif kind == 'WhileStatement':
+            active = mask.copy()
+            while True:
+                self.step()
+                if frame.returned is not None:
+                    active &= ~frame.returned
+                active &= asBool(self.evaluate(stmt.test, frame, active))
+                if not active.any():
+                    break
+                if self.steps > self.stepBudget // 2:
+                    # Lanes still looping don't get a verdict, the rest do
+                    self.valid &= ~active
+                    break
+                self.execute(stmt.body, frame, active)
+        elif kind == 'ReturnStatement':
+            if frame.returned is None:
+                raise ConcreteUnsupported('return outside a function')
+            if stmt.argument is None:
+                raise ConcreteUnsupported('return without a value')
+            value = asInt(self.evaluate(stmt.argument, frame, mask))
+            frame.result = value if frame.result is None else np.where(mask, value, frame.result)
+            frame.returned |= mask
+        elif kind in ('FunctionDeclaration', 'EmptyStatement'):
+            pass
+        else:
+            raise ConcreteUnsupported(kind)
+
+    def assign(self, name, value, frame, mask):
+        defined(value)
+        scope = self.varsOf(name, frame)
+        old = scope[name]
+        if value.dtype != old.dtype:
+            value, old = asInt(value), asInt(old)
+        scope[name] = np.where(mask, value, old)
+        return value
+
+    def evaluate(self, expr, frame, mask):
+        self.step()
+        kind = expr.type
+        if kind == 'Literal':
+            value = expr.value
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value != int(value):
+                raise ConcreteUnsupported('literal {}'.format(expr.raw))
+            return self.const(wrap32(int(value)))
+        elif kind == 'Identifier':
+            return self.varsOf(expr.name, frame)[expr.name]
+        elif kind == 'AssignmentExpression':
+            if expr.left.type != 'Identifier':
+                raise ConcreteUnsupported('assignment to {}'.format(expr.left.type))
+            if expr.operator == '=':
+                value = self.evaluate(expr.right, frame, mask)
+            else:
+                current = self.varsOf(expr.left.name, frame)[expr.left.name]
+                value = binary(JS_OPERATORS.get(expr.operator[:-1], expr.operator[:-1]), current,
+                               self.evaluate(expr.right, frame, mask))
+            return self.assign(expr.left.name, value, frame, mask)
+        elif kind == 'LogicalExpression':
+            left = asBool(self.evaluate(expr.left, frame, mask))
+            # The right side only runs on the lanes the left side doesn't decide
+            if expr.operator == '&&':
+                return left & asBool(self.evaluate(expr.right, frame, mask & left))
+            if expr.operator == '||':
+                return left | asBool(self.evaluate(expr.right, frame, mask & ~left))
+            raise ConcreteUnsupported('operator {}'.format(expr.operator))
+        elif kind == 'BinaryExpression':
+            return binary(JS_OPERATORS.get(expr.operator, expr.operator),
+                          self.evaluate(expr.left, frame, mask), self.evaluate(expr.right, frame, mask))
+        elif kind == 'UnaryExpression':
+            value = self.evaluate(expr.argument, frame, mask)
+            if expr.operator == '!':
+                return ~asBool(value)
+            if expr.operator == '-':
+                return -asInt(value)
+            if expr.operator == '~':
+                return ~asInt(value)
+            if expr.operator == '+':
+                return asInt(value)
+            raise ConcreteUnsupported('operator {}'.format(expr.operator))
+        elif kind == 'CallExpression':
+            return self.call(expr, frame, mask)
+        raise ConcreteUnsupported(kind)
+
+    def call(self, expr, frame, mask):
+        callee = expr.callee
+        if callee.type == 'Identifier':
+            found = self.functionOf(callee.name, frame)
+            if found is None:
+                raise ConcreteUnsupported('call of {}'.format(callee.name))
+            func, closure = found
+        elif callee.type == 'FunctionExpression':
+            func, closure = callee, frame
+        else:
+            raise ConcreteUnsupported('call of {}'.format(callee.type))
+        if len(func.params) != len(expr.arguments):
+            raise ConcreteUnsupported('call with {} arguments for {} parameters'.format(len(expr.arguments), len(func.params)))
+        if self.depth >= MAX_CALL_DEPTH:
+            raise ConcreteUnsupported('calls nested deeper than {}'.format(MAX_CALL_DEPTH))
+
+        callFrame = Frame(closure, self.lanes)
+        callFrame.vars = {param.name: self.evaluate(arg, frame, mask) for param, arg in zip(func.params, expr.arguments)}
+        callFrame.hoist(func.body.body)
+        self.depth += 1
+        try:
+            for stmt in func.body.body:
+                self.execute(stmt, callFrame, mask)
+        finally:
+            self.depth -= 1
+
+        if callFrame.result is None or not callFrame.returned[mask].all():
+            # Fine as a statement, using it fails: it would be unconstrained in the encoding
+            return UNDEFINED
+        return callFrame.result
+
+def randomDiff(parsedTree, prepackTree, lanes=DEFAULT_LANES, seed=0):
+    """
+    Run both programs on the same random inputs
+    returns (mismatches, inputs) for the first lane where a compared global
+    differs, None when all lanes agree; raises ConcreteUnsupported
+        mismatches: [(var, value, ppVar, ppValue)]
+        inputs: input name -> value in that lane
+    """
+    pool = InputPool(lanes, seed)
+    original = VectorEvaluator(pool)
+    values = original.run(parsedTree)
+    prepacked = VectorEvaluator(pool, inputPrefix='pp')
+    ppValues = prepacked.run(prepackTree)
+    valid = original.valid & prepacked.valid
+
+    names = topLevelNames(parsedTree)
+    differs = np.zeros(lanes, dtype=np.bool_)
+    for name in names:
+        if 'pp' + name not in ppValues:
+            raise ConcreteUnsupported('prepack output has no {}'.format(name))
+        differs |= asInt(values[name]) != asInt(ppValues['pp' + name])
+    differs &= valid
+
+    if not differs.any():
+        return None
+    lane = int(np.argmax(differs))
+    mismatches = []
+    for name in names:
+        varVal, ppVarVal = int(asInt(values[name])[lane]), int(asInt(ppValues['pp' + name])[lane])
+        if varVal != ppVarVal:
+            mismatches.append((name, varVal, 'pp' + name, ppVarVal))
+    inputs = {name: int(pool.get(name)[lane]) for name in original.inputs}
+    return mismatches, inputs
@@ -0,0 +1,263 @@
+"""
+Constant and copy propagation over the clause terms, before the solver.
+
+Most clauses are SSA equalities: `x0_2 == x0_1` connecting versions, `ppy0_1 == 100`
+from prepack output, `x0_1 == x0_1` for a bare `var x`.  Unconditional
+equalities between variables and constants are absorbed into a union-find,
+every other clause is rewritten with each variable replaced by its class'
+constant or representative, constants are folded with 32-bit semantics, and
+tautologies disappear.  This repeats until nothing new is learnt.  Finally
+definitions `v == e` of variables read nowhere else are dropped.
+
+Variables in keep (the globals compared at the end, the variables of the
+loop checks) stay in the formula, bound to their class, so their model values
+remain available.
+"""
+
+from smt_terms import LEAF_OPS, postorder
+
+MAX_ROUNDS = 8
+
+def wrap32(value):
+    value &= 0xffffffff
+    return value - (1 << 32) if value & 0x80000000 else value
+
+def foldConst(op, a, b=None):
+    # Value of op on constants as z3 computes it on 32-bit bitvectors, None to leave it to the solver
+    if op == 'neg':
+        return wrap32(-a)
+    if op == 'bnot':
+        return wrap32(~a)
+    if op == '+':
+        return wrap32(a + b)
+    if op == '-':
+        return wrap32(a - b)
+    if op == '*':
+        return wrap32(a * b)
+    if op == '/' or op == '%':
+        if b == 0:
+            return None
+        quotient = abs(a) // abs(b) * (1 if (a < 0) == (b < 0) else -1)
+        return wrap32(quotient) if op == '/' else wrap32(a - b * quotient)
+    if op == '&':
+        return wrap32(a & b)
+    if op == '|':
+        return wrap32(a | b)
+    if op == '^':
+        return wrap32(a ^ b)
+    if op == '<<':
+        return wrap32(a << (b & 31))
+    if op == '>>':
+        return wrap32(a >> (b & 31))
+    if op == '>>>':
+        return wrap32((a & 0xffffffff) >> (b & 31))
+    return None
+
+COMPARISONS = {'==': lambda a, b: a == b, '!=': lambda a, b: a != b, '<': lambda a, b: a < b,
+               '<=': lambda a, b: a <= b, '>': lambda a, b: a > b, '>=': lambda a, b: a >= b}
+
+class Simplifier:
+    """
+    Simplifier
+        terms: TermTable the clauses live in, rewritten clauses are built there too
+        keep: variable names that must stay in the formula
+        dropDead: drop definitions of unread variables, only safe when no
+                  clauses are added later (incremental deepening reads them)
+    """
+
+    def __init__(self, terms, keep, dropDead=True):
+        self.terms = terms
+        self.keep = set(keep)
+        self.dropDead = dropDead
+        self.parent = {}
+        self.value = {}
+        self.memo = {}
+        self.conflict = False
+        self.removedVars = 0
+        self.removedClauses = 0
+
+    def isFalse(self, term):
+        return term.op == 'not' and term.args[0].op == 'true'
+
+    def false(self):
+        return self.terms.mk('not', self.terms.true())
+
+    def find(self, name):
+        root = name
+        while self.parent.get(root, root) != root:
+            root = self.parent[root]
+        while name != root:
+            self.parent[name], name = root, self.parent[name]
+        return root
+
+    def bindValue(self, root, value):
+        if root in self.value and self.value[root] != value:
+            self.conflict = True
+        self.value[root] = value
+
+    def absorb(self, clause):
+        # Learn an unconditional var == var / var == const, True if the clause is now redundant
+        if clause.op != '==':
+            return False
+        left, right = clause.args
+        if left.op == 'const':
+            left, right = right, left
+        if left.op != 'var' or right.op not in ('var', 'const'):
+            return False
+
+        leftRoot = self.find(left.args[0])
+        self.parent.setdefault(leftRoot, leftRoot)
+        if right.op == 'const':
+            self.bindValue(leftRoot, wrap32(right.args[0]))
+            return True
+
+        rightRoot = self.find(right.args[0])
+        self.parent.setdefault(rightRoot, rightRoot)
+        if leftRoot == rightRoot:
+            return True
+        # A kept variable represents its class, so it is never rewritten away
+        if rightRoot in self.keep and leftRoot not in self.keep:
+            leftRoot, rightRoot = rightRoot, leftRoot
+        self.parent[rightRoot] = leftRoot
+        if rightRoot in self.value:
+            self.bindValue(leftRoot, self.value.pop(rightRoot))
+        return True
+
+    def rewrite(self, root):
+        terms = self.terms
+        memo = self.memo
+        for term in postorder([root]):
+            if term.id in memo:
+                continue
+            op = term.op
+            if op == 'var':
+                name = self.find(term.args[0])
+                if name in self.value:
+                    newTerm = terms.const(self.value[name])
+                else:
+                    newTerm = terms.var(name) if name != term.args[0] else term
+            elif op in LEAF_OPS:
+                newTerm = term
+            else:
+                newTerm = self.fold(op, [memo[arg.id] for arg in term.args])
+            memo[term.id] = newTerm
+        return memo[root.id]
+
+    def fold(self, op, args):
+        terms = self.terms
+        true = terms.true()
+        if op == 'and':
+            if self.isFalse(args[0]) or self.isFalse(args[1]):
+                return self.false()
+            if args[0] is true:
+                return args[1]
+            if args[1] is true or args[0] is args[1]:
+                return args[0]
+        elif op == 'or':
+            if args[0] is true or args[1] is true:
+                return true
+            if self.isFalse(args[0]):
+                return args[1]
+            if self.isFalse(args[1]) or args[0] is args[1]:
+                return args[0]
+        elif op == 'implies':
+            if self.isFalse(args[0]) or args[1] is true or args[0] is args[1]:
+                return true
+            if args[0] is true:
+                return args[1]
+        elif op == 'not':
+            if args[0].op == 'not':
+                return args[0].args[0]
+        elif op == 'ite':
+            if args[0] is true:
+                return args[1]
+            if self.isFalse(args[0]):
+                return args[2]
+        elif op in COMPARISONS:
+            if args[0] is args[1]:
+                return true if op in ('==', '<=', '>=') else self.false()
+            if args[0].op == 'const' and args[1].op == 'const':
+                # Literals of 2^31 and up are negative as bitvectors
+                return true if COMPARISONS[op](wrap32(args[0].args[0]), wrap32(args[1].args[0])) else self.false()
+        elif all(arg.op == 'const' for arg in args):
+            value = foldConst(op, *[wrap32(arg.args[0]) for arg in args])
+            if value is not None:
+                return terms.const(value)
+        return terms.mk(op, *args)
+
+    def flatten(self, clauses):
+        # Top-level conjunctions become separate clauses, true clauses go away
+        flat = []
+        stack = list(reversed(clauses))
+        while stack:
+            clause = stack.pop()
+            if clause.op == 'and':
+                stack += [clause.args[1], clause.args[0]]
+            elif clause.op != 'true':
+                flat.append(clause)
+        return flat
+
+    def run(self, clauses):
+        pending = self.flatten(clauses)
+        clauseCount = len(pending)
+        for _ in range(MAX_ROUNDS):
+            rest = [clause for clause in pending if not self.absorb(clause)]
+            learnt = len(rest) != len(pending)
+            # Substitutions changed, so rewrites of the last round are stale
+            self.memo = {}
+            pending = self.flatten([self.rewrite(clause) for clause in rest])
+            if not learnt:
+                break
+
+        if self.conflict:
+            pending.append(self.false())
+        if self.dropDead:
+            pending = self.dropDefinitions(pending)
+        pending += self.keepBindings()
+
+        self.removedVars += sum(1 for name in self.parent
+                                if name not in self.keep and (self.find(name) != name or name in self.value))
+        self.removedClauses += clauseCount - len(pending)
+        return pending
+
+    def keepBindings(self):
+        # Kept variables that were absorbed are bound to what replaced them
+        bindings = []
+        for name in sorted(self.keep):
+            if name not in self.parent:
+                continue
+            root = self.find(name)
+            if root in self.value:
+                bindings.append(self.terms.mk('==', self.terms.var(name), self.terms.const(self.value[root])))
+            elif root != name:
+                bindings.append(self.terms.mk('==', self.terms.var(name), self.terms.var(root)))
+        return bindings
+
+    def dropDefinitions(self, clauses):
+        # v == e where no other clause reads v is satisfied by choosing v,
+        # dropping one can leave the variables of e unread in turn
+        clauseVars = [set(term.args[0] for term in postorder([clause]) if term.op == 'var') for clause in clauses]
+        readers = {}
+        for names in clauseVars:
+            for name in names:
+                readers[name] = readers.get(name, 0) + 1
+
+        alive = [True] * len(clauses)
+        changed = True
+        while changed:
+            changed = False
+            for i, clause in enumerate(clauses):
+                if not alive[i] or clause.op != '==':
+                    continue
+                for side, other in ((clause.args[0], clause.args[1]), (clause.args[1], clause.args[0])):
+                    if side.op != 'var' or side.args[0] in self.keep or readers[side.args[0]] != 1:
+                        continue
+                    if side.args[0] in [term.args[0] for term in postorder([other]) if term.op == 'var']:
+                        continue
+                    alive[i] = False
+                    changed = True
+                    self.removedVars += 1
+                    for name in clauseVars[i]:
+                        readers[name] -= 1
+                    break
+        return [clause for i, clause in enumerate(clauses) if alive[i]]
@@ -0,0 +1,338 @@
+"""
+Hash-consed constraint terms.
+
+The translator builds formulas as Terms from a TermTable instead of nested
+strings.  The table returns the existing node for a structurally equal
+(op, args), so repeated subexpressions -- constants, loop conditions, shared
+globals of the original and prepack encodings -- are stored once and
+converted to z3 once.
+
+Every term has a sort, 'bv' (32-bit) or 'bool'.  Operands are coerced the way
+JavaScript would: a number used as a condition is compared against 0, a
+boolean used as a number is 1 or 0.  Variables are registered in the table's
+symbol registry when they are created, so declaring them never needs a scan
+over the formula.
+
+    op          args                        sort
+    'var'       (name,)                     bv, SSA variable
+    'boolvar'   (name,)                     bool, unroll or unwinding literal
+    'const'     (value,)                    bv
+    'true'      ()                          bool
+    'hole'      (kind, ...)                 bv, placeholder in a function summary
+    'neg', 'bnot'                           (a,)        bv
+    'not'                                   (a,)        bool
+    'ite'                                   (c, a, b)   bv
+    '+', '-', '*', '/', '%', '&', '|', '^', '<<', '>>', '>>>'   (a, b)   bv
+    '==', '!=', '<', '<=', '>', '>=', 'and', 'or', 'implies'   (a, b)   bool
+"""
+
+# Ops whose args are payload values rather than Terms
+LEAF_OPS = ('var', 'boolvar', 'const', 'true', 'hole')
+
+# Binary operators the translator may emit, after JS_OPERATORS renaming
+BINARY_OPS = ('+', '-', '*', '/', '%', '&', '|', '^', '<<', '>>', '>>>',
+              '==', '!=', '<', '<=', '>', '>=', 'and', 'or', 'implies')
+JS_OPERATORS = {'===': '==', '!==': '!=', '&&': 'and', '||': 'or'}
+
+BOOL_OPS = ('==', '!=', '<', '<=', '>', '>=', 'and', 'or', 'not', 'implies', 'true', 'boolvar')
+# Ops whose operands are conditions
+LOGIC_OPS = ('and', 'or', 'not', 'implies')
+
+class Term:
+    __slots__ = ('op', 'args', 'id', 'sort')
+
+    def __init__(self, op, args, id, sort):
+        self.op = op
+        self.args = args
+        self.id = id
+        self.sort = sort
+
+    def __repr__(self):
+        return 'Term({}, {})'.format(self.op, self.id)
+
+class TermTable:
+    """
+    TermTable
+        nodes: (op, args) -> Term, one entry per distinct node
+        leaves: the same for LEAF_OPS, kept by release()
+        built: number of construction requests, so built / len(self) is the sharing factor
+        symbols: variable name -> sort, in creation order
+    """
+
+    def __init__(self):
+        self.nodes = {}
+        self.leaves = {}
+        self.nextId = 0
+        self.built = 0
+        self.symbols = {}
+
+    def __len__(self):
+        # Distinct nodes created, including released ones
+        return self.nextId
+
+    def release(self):
+        # Forget every inner node, once they are written out and no longer
+        # referenced.  An equal node built later is a new node with a new id
+        self.nodes = {}
+
+    def mk(self, op, *args):
+        # Terms are unique per table, so identity hashing of the args is structural
+        self.built += 1
+        if op in LEAF_OPS:
+            table = self.leaves
+        else:
+            table = self.nodes
+            args = self._coerce(op, args)
+        key = (op, args)
+        term = table.get(key)
+        if term is None:
+            term = Term(op, args, self.nextId, 'bool' if op in BOOL_OPS else 'bv')
+            self.nextId += 1
+            table[key] = term
+        return term
+
+    def _coerce(self, op, args):
+        if op in LOGIC_OPS:
+            return tuple(self.asBool(arg) for arg in args)
+        if op == 'ite':
+            return (self.asBool(args[0]), self.asBV(args[1]), self.asBV(args[2]))
+        if op in ('==', '!=') and args[0].sort == args[1].sort:
+            return args
+        return tuple(self.asBV(arg) for arg in args)
+
+    def asBool(self, term):
+        return term if term.sort == 'bool' else self.mk('!=', term, self.const(0))
+
+    def asBV(self, term):
+        return term if term.sort == 'bv' else self.mk('ite', term, self.const(1), self.const(0))
+
+    def var(self, name):
+        self.symbols.setdefault(name, 'bv')
+        return self.mk('var', name)
+
+    def boolVar(self, name):
+        self.symbols.setdefault(name, 'bool')
+        return self.mk('boolvar', name)
+
+    def const(self, value):
+        return self.mk('const', value)
+
+    def true(self):
+        return self.mk('true')
+
+    def conj(self, terms):
+        # Left-nested And of terms, true for none
+        result = None
+        for term in terms:
+            result = term if result is None else self.mk('and', result, term)
+        return result if result is not None else self.true()
+
+def postorder(roots):
+    # Every node reachable from roots once, children before parents,
+    # without recursion so long And chains don't hit the stack limit
+    seen = set()
+    order = []
+    for root in roots:
+        if root.id in seen:
+            continue
+        stack = [(root, False)]
+        while stack:
+            term, expanded = stack.pop()
+            if expanded:
+                order.append(term)
+                continue
+            if term.id in seen:
+                continue
+            seen.add(term.id)
+            stack.append((term, True))
+            if term.op not in LEAF_OPS:
+                for arg in reversed(term.args):
+                    if arg.id not in seen:
+                        stack.append((arg, False))
+    return order
+
+def countNodes(roots):
+    return len(postorder(roots))
+
+INT32_MIN, INT32_MAX = -(1 << 31), (1 << 31) - 1
+
+class Z3Builder:
+    """
+    Converts Terms to z3 expressions, each distinct node once
+        env: SSA name -> z3 expression of the variable, filled from a symbol
+             registry by declareSymbols
+        widths: name -> (bits, signed) of variables declared narrower than 32
+                bits, extended where they are used (see bit_width)
+        integer: encode numbers as Int instead of 32-bit bitvectors, wrapping
+                 + - * explicitly unless ranges proves they can't overflow
+        ranges: id of a bv node -> (lo, hi) it is known to stay in, or None
+        guards: range constraints of the Int variables, to be asserted with the clauses
+        ctx: z3 context the expressions are built in, None for z3's main one
+    """
+
+    def __init__(self, widths=None, integer=False, ranges=None, ctx=None):
+        import z3
+        self.z3 = z3
+        self.ctx = ctx
+        self.env = {}
+        self.memo = {}
+        self.widths = widths if widths is not None else {}
+        self.integer = integer
+        self.ranges = ranges if ranges is not None else {}
+        self.guards = []
+
+    def declare(self, name, boolean=False):
+        if name not in self.env:
+            z3 = self.z3
+            if boolean:
+                self.env[name] = z3.Bool(name, self.ctx)
+            elif self.integer:
+                # Inputs are 32-bit values, the range the clauses imply comes with them
+                var = self.env[name] = z3.Int(name, self.ctx)
+                self.guards += [var >= INT32_MIN, var <= INT32_MAX]
+            elif name in self.widths:
+                bits, signed = self.widths[name]
+                extend = z3.SignExt if signed else z3.ZeroExt
+                self.env[name] = extend(32 - bits, z3.BitVec(name, bits, self.ctx))
+            else:
+                self.env[name] = z3.BitVec(name, 32, self.ctx)
+        return self.env[name]
+
+    def modelValues(self, model):
+        # Signed value of every numeric variable, unconstrained ones as 0
+        values = {}
+        for name, expr in self.env.items():
+            if self.integer and self.z3.is_int(expr):
+                values[name] = model.eval(expr, model_completion=True).as_long()
+            elif self.z3.is_bv(expr):
+                values[name] = model.eval(expr, model_completion=True).as_signed_long()
+        return values
+
+    def wrap(self, term, expr):
+        # Integer result of + - * back into 32 bits, unless it is known to fit
+        if self.ranges.get(term.id) is not None:
+            return expr
+        if term.op == '*':
+            return (expr + (1 << 31)) % (1 << 32) - (1 << 31)
+        z3 = self.z3
+        return z3.If(expr > INT32_MAX, expr - (1 << 32), z3.If(expr < INT32_MIN, expr + (1 << 32), expr))
+
+    def declareSymbols(self, symbols):
+        for name, sort in symbols.items():
+            self.declare(name, sort == 'bool')
+
+    def convert(self, root):
+        z3 = self.z3
+        memo = self.memo
+        for term in postorder([root]):
+            if term.id in memo:
+                continue
+            op, args = term.op, term.args
+            if op == 'var':
+                expr = self.env[args[0]]
+            elif op == 'boolvar':
+                expr = self.env[args[0]]
+            elif op == 'const':
+                expr = z3.IntVal(args[0], self.ctx) if self.integer else z3.BitVecVal(args[0], 32, self.ctx)
+            elif op == 'true':
+                expr = z3.BoolVal(True, self.ctx)
+            elif op == 'hole':
+                raise ValueError('uninstantiated function summary hole {}'.format(args))
+            else:
+                vals = [memo[arg.id] for arg in args]
+                if self.integer and op == 'neg':
+                    expr = self.wrap(term, -vals[0])
+                elif self.integer and op == '+':
+                    expr = self.wrap(term, vals[0] + vals[1])
+                elif self.integer and op == '-':
+                    expr = self.wrap(term, vals[0] - vals[1])
+                elif self.integer and op == '*':
+                    expr = self.wrap(term, vals[0] * vals[1])
+                elif self.integer and op not in ('ite', 'not', 'and', 'or', 'implies', '==', '!=', '<', '<=', '>', '>='):
+                    raise ValueError('op {} has no integer encoding'.format(op))
+                elif op == 'neg':
+                    expr = -vals[0]
+                elif op == 'bnot':
+                    expr = ~vals[0]
+                elif op == 'ite':
+                    expr = z3.If(vals[0], vals[1], vals[2])
+                elif op == 'not':
+                    expr = z3.Not(vals[0])
+                elif op == 'and':
+                    expr = z3.And(vals[0], vals[1])
+                elif op == 'or':
+                    expr = z3.Or(vals[0], vals[1])
+                elif op == 'implies':
+                    expr = z3.Implies(vals[0], vals[1])
+                elif op == '+':
+                    expr = vals[0] + vals[1]
+                elif op == '-':
+                    expr = vals[0] - vals[1]
+                elif op == '*':
+                    expr = vals[0] * vals[1]
+                elif op == '/':
+                    expr = vals[0] / vals[1]
+                elif op == '%':
+                    # JavaScript's remainder takes the sign of the dividend
+                    expr = z3.SRem(vals[0], vals[1])
+                elif op == '&':
+                    expr = vals[0] & vals[1]
+                elif op == '|':
+                    expr = vals[0] | vals[1]
+                elif op == '^':
+                    expr = vals[0] ^ vals[1]
+                elif op == '<<':
+                    # Shift counts are taken mod 32
+                    expr = vals[0] << (vals[1] & 31)
+                elif op == '>>':
+                    expr = vals[0] >> (vals[1] & 31)
+                elif op == '>>>':
+                    expr = z3.LShR(vals[0], vals[1] & 31)
+                elif op == '==':
+                    expr = vals[0] == vals[1]
+                elif op == '!=':
+                    expr = vals[0] != vals[1]
+                elif op == '<':
+                    expr = vals[0] < vals[1]
+                elif op == '<=':
+                    expr = vals[0] <= vals[1]
+                elif op == '>':
+                    expr = vals[0] > vals[1]
+                elif op == '>=':
+                    expr = vals[0] >= vals[1]
+                else:
+                    raise ValueError('unknown term op {}'.format(op))
+            memo[term.id] = expr
+        return memo[root.id]
+
+PYTHON_OPS = {'and': 'And({}, {})', 'or': 'Or({}, {})', 'implies': 'Implies({}, {})', 'not': 'Not({})', 'neg': '-{}',
+              'bnot': '~{}', 'ite': 'If({}, {}, {})', '%': 'SRem({}, {})', '<<': '({} << ({} & 31))',
+              '>>': '({} >> ({} & 31))', '>>>': 'LShR({}, {} & 31)'}
+
+def toPython(roots):
+    """
+    z3py source for roots, one assignment per distinct node
+    returns (lines, names) where names[i] is the variable holding roots[i]
+    """
+    lines = []
+    for term in postorder(roots):
+        op, args = term.op, term.args
+        if op in ('var', 'boolvar'):
+            continue
+        if op == 'const':
+            expr = 'BitVecVal({}, 32)'.format(args[0])
+        elif op == 'true':
+            expr = 'BoolVal(True)'
+        elif op == 'hole':
+            raise ValueError('uninstantiated function summary hole {}'.format(args))
+        elif op in PYTHON_OPS:
+            expr = PYTHON_OPS[op].format(*[termName(arg) for arg in args])
+        else:
+            expr = '({} {} {})'.format(termName(args[0]), op, termName(args[1]))
+        lines.append('{} = {}'.format(termName(term), expr))
+    return lines, [termName(root) for root in roots]
+
+def termName(term):
+    if term.op in ('var', 'boolvar'):
+        return term.args[0]
+    return 't{}'.format(term.id)
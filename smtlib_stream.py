@@ -0,0 +1,197 @@
+"""
+Streaming SMT-LIB2 output and file-based solving.
+
+With a stream attached, the translator hands each top-level statement's
+clauses to SMTLibStream as soon as the statement is translated and then
+drops the statement's terms, so memory is bounded by the statement being
+translated instead of the whole formula.  Every distinct node is written once
+as a define-fun and variables are declared on first use.  Files ending in .gz
+or .xz are compressed on the fly.
+
+The solve then runs from the file: it is piped into a z3 process, falling
+back to z3's python bindings when there is no z3 executable.
+"""
+
+import gzip
+import lzma
+import shutil
+import subprocess
+
+from smt_terms import LEAF_OPS, postorder
+
+DEFAULT_SOLVER_CMD = ['z3', '-smt2', '-in']
+
+SMTLIB_OPS = {'neg': 'bvneg', 'bnot': 'bvnot', 'not': 'not', 'ite': 'ite',
+              '+': 'bvadd', '-': 'bvsub', '*': 'bvmul', '/': 'bvsdiv', '%': 'bvsrem',
+              '&': 'bvand', '|': 'bvor', '^': 'bvxor', '<<': 'bvshl', '>>': 'bvashr', '>>>': 'bvlshr',
+              '==': '=', '!=': 'distinct', '<': 'bvslt', '<=': 'bvsle', '>': 'bvsgt', '>=': 'bvsge',
+              'and': 'and', 'or': 'or', 'implies': '=>'}
+SHIFT_OPS = ('<<', '>>', '>>>')
+
+def openCompressed(fileName, mode):
+    # Compression follows the extension, mode is 'rt'/'wt'/'rb'/'wb'
+    if fileName.endswith('.gz'):
+        return gzip.open(fileName, mode)
+    if fileName.endswith(('.xz', '.lzma')):
+        return lzma.open(fileName, mode)
+    return open(fileName, mode)
+
+def bvLiteral(value):
+    return '#x{:08x}'.format(value & 0xffffffff)
+
+def parseBV(text):
+    # '#x...' or '#b...' as a signed 32-bit value
+    value = int(text[2:], 16 if text.startswith('#x') else 2)
+    return value - (1 << 32) if value & 0x80000000 else value
+
+class SMTLibStream:
+    """
+    SMTLibStream
+        fileName: output file, compressed by extension (.gz, .xz)
+        declared: names declared so far
+        defined: ids of nodes written since the last release
+        widths: name -> (bits, signed) of variables to declare narrower (see bit_width)
+    """
+
+    def __init__(self, fileName, widths=None):
+        self.fileName = fileName
+        self.widths = widths if widths is not None else {}
+        self.f = openCompressed(fileName, 'wt')
+        self.declared = set()
+        self.defined = set()
+        self.assertions = 0
+        self.f.write('(set-option :produce-models true)\n')
+        self.f.write('(set-logic QF_BV)\n')
+
+    def declare(self, name, boolean=False):
+        if name not in self.declared:
+            self.declared.add(name)
+            self.f.write('(declare-const {} {})\n'.format(name, 'Bool' if boolean else '(_ BitVec 32)'))
+            if not boolean and name in self.widths:
+                # The 32-bit name stays, for get-value, bound to the extended narrow one
+                bits, signed = self.widths[name]
+                self.f.write('(declare-const {}__{} (_ BitVec {}))\n'.format(name, bits, bits))
+                self.f.write('(assert (= {} ((_ {} {}) {}__{})))\n'.format(
+                    name, 'sign_extend' if signed else 'zero_extend', 32 - bits, name, bits))
+
+    def operand(self, term):
+        if term.op in ('var', 'boolvar'):
+            return term.args[0]
+        if term.op == 'const':
+            return bvLiteral(term.args[0])
+        if term.op == 'true':
+            return 'true'
+        if term.op == 'hole':
+            raise ValueError('uninstantiated function summary hole {}'.format(term.args))
+        return 't{}'.format(term.id)
+
+    def assertTerm(self, root):
+        write = self.f.write
+        for term in postorder([root]):
+            op = term.op
+            if op in LEAF_OPS:
+                if op == 'var' or op == 'boolvar':
+                    self.declare(term.args[0], op == 'boolvar')
+                continue
+            if term.id in self.defined:
+                continue
+            self.defined.add(term.id)
+
+            args = [self.operand(arg) for arg in term.args]
+            if op in SHIFT_OPS:
+                # Shift counts are taken mod 32
+                args[1] = '(bvand {} #x0000001f)'.format(args[1])
+            sort = 'Bool' if term.sort == 'bool' else '(_ BitVec 32)'
+            write('(define-fun t{} () {} ({} {}))\n'.format(term.id, sort, SMTLIB_OPS[op], ' '.join(args)))
+
+        write('(assert {})\n'.format(self.operand(root)))
+        self.assertions += 1
+
+    def release(self):
+        # The TermTable dropped its nodes, new terms get new ids and are written again
+        self.defined.clear()
+
+    def close(self):
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+def solveFile(fileName, names, solverCmd=None):
+    """
+    Check the assertions in fileName
+    returns (verdict, values) with verdict 'sat', 'unsat' or 'unknown' and
+    values the signed model value of every name in names when sat
+    """
+    solverCmd = solverCmd if solverCmd is not None else DEFAULT_SOLVER_CMD
+    if shutil.which(solverCmd[0]) is None:
+        return solveFileInProcess(fileName, names)
+
+    proc = subprocess.Popen(solverCmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        feedSolver(proc, fileName, solverQuery(names))
+        output = proc.stdout.read().decode()
+    finally:
+        proc.wait()
+    return parseSolverOutput(output, solverCmd[0])
+
+def solverQuery(names, checkCommand='(check-sat)'):
+    query = checkCommand + '\n'
+    if names:
+        query += '(get-value ({}))\n'.format(' '.join(names))
+    return query
+
+def feedSolver(proc, fileName, query):
+    # Decompress straight into the solver, the formula is never held in memory
+    try:
+        with openCompressed(fileName, 'rb') as f:
+            shutil.copyfileobj(f, proc.stdin)
+        proc.stdin.write(query.encode())
+        proc.stdin.close()
+    except (BrokenPipeError, OSError):
+        # The solver was killed or died, its output tells what happened
+        pass
+
+def parseSolverOutput(output, solverName):
+    """
+    returns (verdict, values) from the answers to solverQuery
+    """
+    # Errors in the formula are reported before the verdict, get-value
+    # complains after it when there is no model
+    lines = output.strip().split('\n')
+    if lines and lines[0].strip() not in ('sat', 'unsat', 'unknown'):
+        raise RuntimeError('{}: {}'.format(solverName, lines[0]))
+
+    verdict = lines[0].strip() if lines else 'unknown'
+    if verdict != 'sat':
+        return verdict, {}
+
+    values = {}
+    tokens = ' '.join(lines[1:]).replace('(', ' ').replace(')', ' ').split()
+    i = 0
+    while i < len(tokens):
+        name, value = tokens[i], tokens[i + 1]
+        if value == '_':
+            # (_ bvN 32)
+            value = int(tokens[i + 2][2:])
+            values[name] = value - (1 << 32) if value & 0x80000000 else value
+            i += 4
+        else:
+            values[name] = parseBV(value)
+            i += 2
+    return verdict, values
+
+def solveFileInProcess(fileName, names):
+    import z3
+    s = z3.Solver()
+    with openCompressed(fileName, 'rt') as f:
+        s.from_string(f.read())
+
+    verdict = str(s.check())
+    if verdict != 'sat':
+        return verdict, {}
+
+    smtModel = s.model()
+    values = {}
+    for name in names:
+        values[name] = smtModel.eval(z3.BitVec(name, 32), model_completion=True).as_signed_long()
+    return verdict, values
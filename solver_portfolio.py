@@ -0,0 +1,83 @@
+"""
+Solver portfolio.
+
+The same SMT-LIB2 query is handed to several solver configurations at once,
+each in its own process; the first one to answer sat or unsat wins and the
+others are killed.  Configurations differ in the solver binary, its options
+or the tactic used to check, and the winner is reported so the default can be
+tuned per workload.
+"""
+
+import queue
+import shutil
+import subprocess
+import threading
+
+from smtlib_stream import feedSolver, parseSolverOutput, solverQuery
+
+# name -> {'cmd': solver command line reading SMT-LIB2 on stdin, 'check': check command}
+PORTFOLIO_CONFIGS = {
+    'z3': {'cmd': ['z3', '-smt2', '-in'], 'check': '(check-sat)'},
+    'z3-qfbv': {'cmd': ['z3', '-smt2', '-in'], 'check': '(check-sat-using qfbv)'},
+    'z3-bitblast': {'cmd': ['z3', '-smt2', '-in'], 'check': '(check-sat-using (then simplify solve-eqs bit-blast sat))'},
+    'z3-seed': {'cmd': ['z3', '-smt2', '-in', 'sat.random_seed=7', 'smt.random_seed=7'], 'check': '(check-sat)'},
+    'cvc5': {'cmd': ['cvc5', '--lang=smt2', '--produce-models'], 'check': '(check-sat)'},
+}
+DEFAULT_PORTFOLIO = ['z3', 'z3-qfbv', 'z3-bitblast', 'cvc5']
+
+def availableConfigs(configNames=None):
+    # Configurations whose solver is installed here
+    configNames = configNames if configNames else DEFAULT_PORTFOLIO
+    for name in configNames:
+        if name not in PORTFOLIO_CONFIGS:
+            raise ValueError('unknown solver configuration {}, choose from {}'.format(name, ', '.join(PORTFOLIO_CONFIGS)))
+    return [name for name in configNames if shutil.which(PORTFOLIO_CONFIGS[name]['cmd'][0]) is not None]
+
+def _runConfig(name, proc, fileName, query, results):
+    feeder = threading.Thread(target=feedSolver, args=(proc, fileName, query), daemon=True)
+    feeder.start()
+    output = proc.stdout.read().decode()
+    proc.wait()
+    results.put((name, output))
+
+def solvePortfolio(fileName, names, configNames=None):
+    """
+    Race the configurations on the query in fileName
+    returns (verdict, values, winner) like solveFile, winner is the name of
+    the configuration that answered, None when none could decide
+    """
+    configNames = availableConfigs(configNames)
+    if not configNames:
+        raise RuntimeError('no solver of the portfolio is installed')
+
+    results = queue.Queue()
+    procs = {}
+    for name in configNames:
+        config = PORTFOLIO_CONFIGS[name]
+        procs[name] = subprocess.Popen(config['cmd'], stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                       stderr=subprocess.DEVNULL)
+        runner = threading.Thread(target=_runConfig, args=(name, procs[name], fileName,
+                                  solverQuery(names, config['check']), results), daemon=True)
+        runner.start()
+
+    verdict, values, winner = 'unknown', {}, None
+    try:
+        for _ in configNames:
+            name, output = results.get()
+            try:
+                answer = parseSolverOutput(output, name)
+            except RuntimeError:
+                # A solver that rejects the query or crashes just drops out of the race
+                continue
+            if answer[0] in ('sat', 'unsat'):
+                verdict, values = answer
+                winner = name
+                break
+    finally:
+        for proc in procs.values():
+            if proc.poll() is None:
+                proc.kill()
+        for proc in procs.values():
+            proc.wait()
+
+    return verdict, values, winner
@@ -0,0 +1,189 @@
+"""
+Interned variables of the translation and their pre-resolved scopes.
+
+Every variable slot of the translator's scope tables -- a name declared at
+some level of the program, a function's local, a loop's resumed copy -- is
+interned to a small integer id when it is created.  The tables map names to
+ids, the SSA version of every id lives in one array, and the term of every
+(id, version) is built once and reused, so reading a variable neither walks
+the levels nor formats its SSA name again.
+
+ScopeResolver runs over a program before it is translated and binds every
+Identifier to the level of the table the translator's lookup will find it
+in, keeping the tables the way the translator does: declarations take effect
+in program order, a block opens the next level (sibling blocks share it),
+functions look only in their own tables.  Loop bodies are visited twice, as
+later iterations see declarations the first one didn't make; an identifier
+found at different levels on different visits, or nowhere, isn't bound and
+its lookup walks the levels as before.  The resolver may see declarations
+the translator skips (a cached function body, a summarized loop), never
+fewer, so a bound level at which the table lacks the name also falls back.
+"""
+
+from array import array
+
+def ssaName(varName, level, count):
+    return '{}{}_{}'.format(varName, level, count)
+
+class SymbolTable:
+    """
+    SymbolTable
+        names: id -> name the scope tables know the variable by (function locals carry the function's name)
+        levels: id -> level its SSA names carry
+        scopes: id -> function the variable is local to, '' for the program's
+        counts: id -> current SSA version
+        versions: id -> {version: its term}
+    """
+
+    def __init__(self, terms):
+        self.terms = terms
+        self.names = []
+        self.levels = []
+        self.scopes = []
+        self.counts = array('l')
+        self.versions = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name, level, scope, count=0):
+        symbol = len(self.names)
+        self.names.append(name)
+        self.levels.append(level)
+        self.scopes.append(scope)
+        self.counts.append(count)
+        self.versions.append({})
+        return symbol
+
+    def ssaName(self, symbol, count=None):
+        return ssaName(self.names[symbol], self.levels[symbol], self.counts[symbol] if count is None else count)
+
+    def term(self, symbol, count=None):
+        """
+        Term of symbol at version count, the current one by default.  Inside
+        a function the variable is a hole of the function's summary, filled
+        in with the invocation number at each call site.
+        """
+        if count is None:
+            count = self.counts[symbol]
+        versions = self.versions[symbol]
+        term = versions.get(count)
+        if term is None:
+            if self.scopes[symbol] == '':
+                term = self.terms.var(ssaName(self.names[symbol], self.levels[symbol], count))
+            else:
+                term = self.terms.mk('hole', 'var', self.names[symbol], self.levels[symbol], count)
+            versions[count] = term
+        return term
+
+class ScopeResolver:
+    """
+    ScopeResolver
+        levels: id of an Identifier node -> level its lookup finds it at
+        unbound: ids of the Identifier nodes found at different levels or nowhere
+        varLevels: name -> levels of the program it is declared at so far
+        funcTable: (level, function name) -> names in the function's table so far
+    """
+
+    def __init__(self):
+        self.levels = {}
+        self.unbound = set()
+        self.varLevels = {}
+        self.funcTable = {}
+
+    def resolve(self, tree, level=0):
+        """
+        id of every Identifier node of tree -> level its lookup finds it at,
+        for the ones found at the same level on every visit
+        """
+        self.visit(tree, level, '')
+        for key in self.unbound:
+            self.levels.pop(key, None)
+        return self.levels
+
+    def lookup(self, name, level, funcScope):
+        # Where fn_lookup finds name, the nearest level at or below level that has it
+        if funcScope == '':
+            found = None
+            for declared in self.varLevels.get(name, ()):
+                if declared <= level and (found is None or declared > found):
+                    found = declared
+            return found
+        while level >= 0:
+            if name in self.funcTable.get((level - 1, funcScope), ()):
+                return level
+            level -= 1
+        return None
+
+    def bind(self, node, level, funcScope):
+        key = id(node)
+        found = self.lookup(funcScope + node.name, level, funcScope)
+        if found is None or self.levels.setdefault(key, found) != found:
+            self.unbound.add(key)
+
+    def declare(self, name, level, funcScope):
+        if funcScope == '':
+            levels = self.varLevels.setdefault(name, [])
+            if level not in levels:
+                levels.append(level)
+        else:
+            self.funcTable.setdefault((level - 1, funcScope), set()).add(name)
+
+    def visit(self, node, level, funcScope):
+        # The children translateNode translates, in the same order, the
+        # commonest node types tested first
+        nodeType = node.type
+        if nodeType == 'Identifier':
+            self.bind(node, level, funcScope)
+        elif nodeType == 'Literal':
+            return
+        elif nodeType in ('BinaryExpression', 'LogicalExpression'):
+            self.visit(node.left, level, funcScope)
+            self.visit(node.right, level, funcScope)
+        elif nodeType == 'AssignmentExpression':
+            self.visit(node.right, level, funcScope)
+            self.visit(node.left, level, funcScope)
+        elif nodeType == 'ExpressionStatement':
+            self.visit(node.expression, level, funcScope)
+        elif nodeType == 'BlockStatement':
+            for stmt in node.body:
+                self.visit(stmt, level + 1, funcScope)
+        elif nodeType == 'IfStatement':
+            self.visit(node.test, level, funcScope)
+            self.visit(node.consequent, level, funcScope)
+            if node.alternate is not None:
+                self.visit(node.alternate, level, funcScope)
+        elif nodeType == 'UnaryExpression':
+            self.visit(node.argument, level, funcScope)
+        elif nodeType == 'VariableDeclaration':
+            for decl in node.declarations:
+                # Declared before the init is translated
+                self.declare(funcScope + decl.id.name, level, funcScope)
+                if decl.init:
+                    self.visit(decl.init, level, funcScope)
+                self.bind(decl.id, level, funcScope)
+        elif nodeType == 'CallExpression':
+            if node.callee.type == 'Identifier':
+                for arg in node.arguments:
+                    self.visit(arg, level, funcScope)
+            else:
+                self.visit(node.callee, level, funcScope)
+        elif nodeType == 'WhileStatement':
+            # From the second iteration on the body's own declarations are in scope
+            for _ in range(2):
+                self.visit(node.test, level, funcScope)
+                self.visit(node.body, level, funcScope)
+            # The condition once more, for the loop's exit check
+            self.visit(node.test, level, funcScope)
+        elif nodeType == 'ReturnStatement':
+            if node.argument is not None:
+                self.visit(node.argument, level, funcScope)
+        elif nodeType == 'FunctionDeclaration':
+            funcName = node.id.name
+            self.funcTable[(level, funcName)] = set(funcName + param.name for param in node.params)
+            self.visit(node.body, level, funcName)
+        elif nodeType == 'FunctionExpression':
+            self.visit(node.body, level, funcScope)
+        elif nodeType == 'Program':
+            for element in node.body:
+                self.visit(element, level, funcScope)
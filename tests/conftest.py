@@ -0,0 +1,20 @@
+import os
+import sys
+
+# The checker's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import verify
+
+@pytest.fixture
+def verifyWith(monkeypatch):
+    # verifyProgram against a given prepack output, with some of verify's
+    # option globals (SUMMARIZE_LOOPS, CONCRETE_STEPS, ...) set for this test only
+    def run(program, prepackOutput, incremental=False, unrollDepth=2, smtFile=None, **options):
+        for name, value in options.items():
+            monkeypatch.setattr(verify, name, value)
+        return verify.verifyProgram(program, 'test.js', incremental=incremental, prepackOutput=prepackOutput,
+                                    unrollDepth=unrollDepth, smtFile=smtFile)
+    return run
@@ -0,0 +1,45 @@
+"""
+Stand-in for prepack_worker.js speaking the same protocol, for the worker
+pool tests.  The source of a request picks what it does:
+
+    sleep N     answer after N seconds
+    crash       exit without answering
+    fail        answer with an error, like prepack rejecting the input
+    pid         answer with the worker's process id
+    anything    answer with the source itself
+
+The reported version is taken from $FAKE_PREPACK_VERSION.  When
+$FAKE_PREPACK_CRASH_ONCE names a file that doesn't exist, the worker creates
+it and exits on its first request.
+"""
+
+import json
+import os
+import sys
+import time
+
+def send(message):
+    sys.stdout.write(json.dumps(message) + '\n')
+    sys.stdout.flush()
+
+send({'ready': True, 'version': os.environ.get('FAKE_PREPACK_VERSION', '0.0.0-fake')})
+for line in sys.stdin:
+    if not line.strip():
+        continue
+    request = json.loads(line)
+    crashOnce = os.environ.get('FAKE_PREPACK_CRASH_ONCE')
+    if crashOnce and not os.path.exists(crashOnce):
+        open(crashOnce, 'w').close()
+        sys.exit(3)
+    source = request['source']
+    if source.startswith('sleep '):
+        time.sleep(float(source.split()[1]))
+        send({'id': request['id'], 'code': source})
+    elif source == 'crash':
+        sys.exit(3)
+    elif source == 'fail':
+        send({'id': request['id'], 'error': 'rejected input'})
+    elif source == 'pid':
+        send({'id': request['id'], 'code': str(os.getpid())})
+    else:
+        send({'id': request['id'], 'code': source})
@@ -0,0 +1,69 @@
+import io
+import json
+import os
+
+import batch_verify
+
+# Options of a worker that runs no prepack and keeps no caches
+WORKER_OPTIONS = {'cacheDir': None, 'portfolio': None, 'verdictCacheDir': None, 'summaryCacheDir': None,
+                  'prepackWorkers': 0}
+
+def write(path, text=''):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+def test_directory_pairs_prepack_outputs_with_their_originals(tmp_path):
+    a = write(str(tmp_path / 'a.js'))
+    aOutput = write(str(tmp_path / 'a.prepack.js'))
+    b = write(str(tmp_path / 'sub' / 'b.js'))
+    write(str(tmp_path / 'notes.txt'))
+    assert batch_verify.collectInputs([str(tmp_path)]) == [(a, aOutput), (b, None)]
+
+def test_glob_pairs_prepack_outputs_with_their_originals(tmp_path):
+    a = write(str(tmp_path / 'a.js'))
+    aOutput = write(str(tmp_path / 'a.prepack.js'))
+    write(str(tmp_path / 'a.txt'))
+    assert batch_verify.collectInputs([str(tmp_path / 'a*')]) == [(a, aOutput)]
+
+def test_manifest_outputs_are_not_checked_as_originals(tmp_path):
+    a = write(str(tmp_path / 'a.js'))
+    aOutput = write(str(tmp_path / 'out' / 'a-output.js'))
+    b = write(str(tmp_path / 'b.js'))
+    manifest = write(str(tmp_path / 'checks.txt'), '# original prepack\na.js out/a-output.js\n{"original": "b.js"}\n')
+    assert batch_verify.collectInputs([manifest]) == [(a, aOutput), (b, None)]
+    # The directory walk finds the manifest's output as well
+    assert aOutput not in [original for original, _ in batch_verify.collectInputs([manifest, str(tmp_path)])]
+
+def test_jobs_share_the_cores_with_the_slices(monkeypatch):
+    monkeypatch.setattr(batch_verify.os, 'cpu_count', lambda: 8)
+    assert [batch_verify.sliceWorkers(jobs) for jobs in (1, 3, 8, 16)] == [8, 2, 1, 1]
+
+    for name in ('SLICE_WORKERS', 'DEBUG_MODE'):
+        monkeypatch.setattr(batch_verify.verify, name, getattr(batch_verify.verify, name))
+    monkeypatch.setattr(batch_verify, '_workerOptions', {})
+    batch_verify._initWorker(dict(WORKER_OPTIONS, sliceWorkers=2))
+    assert batch_verify.verify.SLICE_WORKERS == 2
+
+def test_batch_writes_one_record_per_file(tmp_path):
+    write(str(tmp_path / 'same.js'), 'var x = 1;\nx = x + 1;\n')
+    write(str(tmp_path / 'same.prepack.js'), 'x = 2;\n')
+    write(str(tmp_path / 'differs.js'), 'var x = 1;\nx = x + 1;\n')
+    write(str(tmp_path / 'differs.prepack.js'), 'x = 3;\n')
+    write(str(tmp_path / 'broken.js'), 'var x = ;\n')
+    write(str(tmp_path / 'broken.prepack.js'), 'x = 0;\n')
+    out = io.StringIO()
+    summary = batch_verify.runBatch([str(tmp_path)], jobs=2, out=out, cacheDir=None, prepackWorkers=0,
+                                    verdictCacheDir=None)
+    records = {os.path.basename(record['file']): record for record in map(json.loads, out.getvalue().splitlines())}
+    assert summary == {'unsat': 1, 'sat': 1, 'error': 1}
+    assert sorted(records) == ['broken.js', 'differs.js', 'same.js']
+    assert records['same.js']['verdict'] == 'unsat'
+    assert records['same.js']['counterexample'] == []
+    assert records['same.js']['prepack'] == str(tmp_path / 'same.prepack.js')
+    assert records['differs.js']['verdict'] == 'sat'
+    assert [(item['original'], item['prepack']) for item in records['differs.js']['counterexample']] == [(2, 3)]
+    assert records['broken.js']['verdict'] == 'error'
+    assert 'error' in records['broken.js']
+    assert all('total' in record['timings'] for record in records.values())
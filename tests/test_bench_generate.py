@@ -0,0 +1,22 @@
+import shutil
+
+import esprima
+import pytest
+
+from bench_generate import ProgramShape, generate, nodeValues
+from concrete_eval import evaluateScript
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='expected values come from node')
+
+def test_node_values():
+    assert nodeValues('var a = 1;\nvar b;\n(function () { b = a + 2; })();\n') == {'a': 1, 'b': 3}
+    with pytest.raises(RuntimeError):
+        nodeValues('var a;\n')
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('axes', [{}, {'loops': 3, 'functions': 0}, {'chains': 4, 'nestingDepth': 2}])
+def test_generated_output_matches_concrete_evaluation(axes, seed):
+    program, output, bumpedOutput, bump = generate(ProgramShape(**axes), seed)
+    values = evaluateScript(esprima.parseScript(program))
+    assert output == ''.join('{} = {};\n'.format(name, value) for name, value in values.items())
+    assert bumpedOutput.replace('{} = {};'.format(bump, values[bump] + 1), '{} = {};'.format(bump, values[bump])) == output
@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import bench_micro
+import verify
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+@pytest.fixture
+def translator(monkeypatch):
+    # The benchmarks replace the translator's globals, put them back afterwards
+    for name in ['TERMS', 'SYMBOLS', 'SCOPE_LEVELS', 'VERSION_LOG', 'PROFILE', 'SUMMARY_CACHE']:
+        monkeypatch.setattr(verify, name, getattr(verify, name))
+    monkeypatch.setattr(verify, 'PATH_CONDITIONS', [])
+
+def test_every_benchmark_runs(translator, monkeypatch):
+    calls = []
+    def timeOnce(func):
+        func()
+        func()
+        calls.append(func)
+        return 1e-6
+    monkeypatch.setattr(bench_micro, 'timeCall', timeOnce)
+    results = bench_micro.runBenchmarks()
+    assert sorted(results) == sorted('{}[{}]'.format(name, size) for name, (_, sizes) in bench_micro.BENCHMARKS.items()
+                                     for size in sizes)
+    assert len(calls) == len(results)
+
+def test_benchmarks_are_selected_by_name(translator, monkeypatch):
+    monkeypatch.setattr(bench_micro, 'timeCall', lambda func: func() or 1e-6)
+    assert sorted(bench_micro.runBenchmarks(['fn_lookup'])) == ['fn_lookup[1]', 'fn_lookup[32]', 'fn_lookup[8]']
+
+def test_timing_is_per_call(translator):
+    seconds = bench_micro.timeCall(bench_micro.benchFnLookup(1))
+    assert 0 < seconds < 0.01
+
+def test_compare_flags_slowdowns_past_the_tolerance():
+    results = {'a[1]': 2.5e-6, 'b[1]': 1.1e-6, 'c[1]': 1e-6}
+    lines, regressions = bench_micro.compare(results, {'a[1]': 1e-6, 'b[1]': 1e-6}, tolerance=1.25)
+    assert regressions == ['a[1]']
+    assert 'slower' in lines[0] and 'slower' not in lines[1]
+    # No baseline to compare against
+    assert 'baseline' not in lines[2]
+
+def test_unknown_benchmark_is_rejected():
+    run = subprocess.run([sys.executable, 'bench_micro.py', 'no_such_benchmark'], cwd=ROOT, capture_output=True, text=True)
+    assert run.returncode != 0
+    assert 'Unknown benchmark no_such_benchmark' in run.stdout
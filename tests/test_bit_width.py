@@ -0,0 +1,86 @@
+import pytest
+
+from bit_width import RangeAnalysis, bitsFor, integerBlocker, narrowWidths
+from smt_terms import TermTable
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+# Narrowing and the integer encoding against plain 32-bit bitvectors
+WIDE = dict(SYMBOLIC, NARROW_WIDTHS=False, INTEGER_ARITHMETIC=False)
+ENCODINGS = {'narrow': dict(SYMBOLIC, NARROW_WIDTHS=True), 'int': dict(SYMBOLIC, NARROW_WIDTHS=False, INTEGER_ARITHMETIC=True),
+             'narrow-int': dict(SYMBOLIC, NARROW_WIDTHS=True, INTEGER_ARITHMETIC=True)}
+
+# Programs with a free input a, their prepack output and the values of the globals that differ
+CHECKS = [
+    # Small counters narrow to a few bits
+    ('var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 4) { s = s + i; i = i + 1; }\na = 0;\n', 'a = 0;\ns = 6;\ni = 4;\n', []),
+    ('var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 4) { s = s + i; i = i + 1; }\na = 0;\n', 'a = 0;\ns = 7;\ni = 4;\n', [(6, 7)]),
+    # Wraparound past the top and the bottom of 32 bits
+    ('var a;\nvar b = 2147483647;\nb = b + 1;\na = 0;\n', 'a = 0;\nb = -2147483648;\n', []),
+    ('var a;\nvar b = 2147483647;\nb = b + 1;\na = 0;\n', 'a = 0;\nb = 2147483647;\n', [(-2147483648, 2147483647)]),
+    ('var a;\nvar b = -2147483648;\nb = b - 2;\na = 0;\n', 'a = 0;\nb = 2147483646;\n', []),
+    ('var a;\nvar b = 65536;\nb = b * 65536 + 3;\na = 0;\n', 'a = 0;\nb = 3;\n', []),
+    ('var a;\nvar b = -1;\nif (a > 0) { b = 2147483647 * 2; } else { b = -2; }\na = 0;\n', 'a = 0;\nb = -2;\n', []),
+    # Negative values sign-extend
+    ('var a;\nvar b = 0;\nif (a > 0) { b = -5; } else { b = 3; }\na = 0;\n', 'a = 0;\nb = 3;\n', None),
+    ('var a;\nvar b = 0;\nif (a > 0) { b = -5; } else { b = -5; }\na = 0;\n', 'a = 0;\nb = -4;\n', [(-5, -4)]),
+]
+
+def mismatchValues(smtResult):
+    return sorted((varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches)
+
+def test_bits_for_a_range():
+    assert bitsFor((0, 0)) == (1, False)
+    assert bitsFor((0, 255)) == (8, False)
+    assert bitsFor((-1, 0)) == (1, True)
+    assert bitsFor((-128, 127)) == (8, True)
+    assert bitsFor((-129, 0)) == (9, True)
+    assert narrowWidths({'x': (0, 15), 'y': (-(1 << 31), 0), 'z': (3, 2)}) == {'x': (4, False)}
+
+def test_ranges_follow_definitions_and_branches():
+    terms = TermTable()
+    x, y, z, c = terms.var('x'), terms.var('y'), terms.var('z'), terms.var('c')
+    cond = terms.mk('>', c, terms.const(0))
+    clauses = [terms.mk('==', x, terms.const(3)),
+               terms.mk('implies', cond, terms.mk('==', y, terms.mk('+', x, terms.const(4)))),
+               terms.mk('implies', terms.mk('not', cond), terms.mk('==', y, terms.mk('neg', x))),
+               terms.mk('==', z, terms.mk('*', c, terms.const(2)))]
+    ranges = RangeAnalysis(clauses, terms.symbols).run()
+    assert ranges == {'x': (3, 3), 'y': (-3, 7)}
+
+def test_wrapping_arithmetic_has_no_range():
+    terms = TermTable()
+    x, y = terms.var('x'), terms.var('y')
+    clauses = [terms.mk('==', x, terms.const(2147483647)), terms.mk('==', y, terms.mk('+', x, terms.const(1)))]
+    assert RangeAnalysis(clauses, terms.symbols).run() == {'x': (2147483647, 2147483647)}
+
+def test_integer_blocker():
+    terms = TermTable()
+    x, y = terms.var('x'), terms.var('y')
+    assert integerBlocker([terms.mk('==', x, terms.mk('*', terms.const(3), y))]) is None
+    assert integerBlocker([terms.mk('==', x, terms.mk('*', y, y))]) == 'non-constant *'
+    assert integerBlocker([terms.mk('==', x, terms.mk('&', y, terms.const(7)))]) == '&'
+
+@pytest.mark.parametrize('encoding', sorted(ENCODINGS))
+@pytest.mark.parametrize('program, prepackOutput, mismatches', CHECKS)
+def test_encoding_agrees_with_32_bits(verifyWith, program, prepackOutput, mismatches, encoding):
+    wide = verifyWith(program, prepackOutput, **WIDE)
+    other = verifyWith(program, prepackOutput, **ENCODINGS[encoding])
+    assert other.verdict == wide.verdict
+    if mismatches is not None:
+        assert wide.verdict == ('sat' if mismatches else 'unsat')
+        assert mismatchValues(other) == mismatchValues(wide) == mismatches
+
+# A slice for each of a, b and c, with nothing the integer encoding lacks
+SMALL_VALUES = 'var a;\nvar b = 0;\nif (a > 3) { b = 1; } else { b = 1; }\nvar c = 5;\nc = c + 1;\na = 0;\n'
+
+def test_small_values_are_narrowed_and_solved_over_integers(verifyWith, capsys):
+    smtResult = verifyWith(SMALL_VALUES, 'a = 0;\nb = 1;\nc = 7;\n', SLICE_WORKERS=0, **ENCODINGS['narrow-int'])
+    assert mismatchValues(smtResult) == [(6, 7)]
+    assert smtResult.stats['narrowedVars'] > 0
+    assert 'Solving over integers' in capsys.readouterr().out
+
+def test_slices_are_solved_over_integers(verifyWith, capsys):
+    smtResult = verifyWith(SMALL_VALUES, 'a = 0;\nb = 1;\nc = 7;\n', SLICE_WORKERS=2, **ENCODINGS['int'])
+    assert smtResult.stats['slices'] == 3
+    assert mismatchValues(smtResult) == [(6, 7)]
+    assert 'Solving 3 of 3 slices over integers' in capsys.readouterr().out
@@ -0,0 +1,47 @@
+import pytest
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+CONFIGS = [SYMBOLIC, dict(SYMBOLIC, SIMPLIFY=False, SLICE_WORKERS=0, NARROW_WIDTHS=False)]
+
+# Each branch writes some of the globals, the others keep their state
+ELSE_IF_CHAIN = '''var a;
+var p = 0;
+var q = 0;
+var r = 0;
+if (a == 1) { p = 1; } else if (a == 2) { q = 2; } else if (a == 3) { p = 3; r = 3; } else { r = 4; }
+a = 0;
+'''
+
+def chain(a):
+    # p, q and r after ELSE_IF_CHAIN
+    return {1: (1, 0, 0), 2: (0, 2, 0), 3: (3, 0, 3)}.get(a, (0, 0, 4))
+
+def chainOutput(a):
+    return 'a = 0;\np = {};\nq = {};\nr = {};\n'.format(*chain(a))
+
+@pytest.mark.parametrize('options', CONFIGS)
+@pytest.mark.parametrize('a', [1, 2, 3, 4])
+def test_branch_not_taken_keeps_the_others_variables(verifyWith, options, a):
+    program = ELSE_IF_CHAIN.replace('var a;', 'var a = {};'.format(a))
+    assert verifyWith(program, chainOutput(a), **options).verdict == 'unsat'
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('options', CONFIGS)
+@pytest.mark.parametrize('a', [1, 2, 3, 4])
+def test_else_if_chain_mismatch_is_another_branch(verifyWith, options, a, incremental):
+    smtResult = verifyWith(ELSE_IF_CHAIN, chainOutput(a), incremental, **options)
+    assert smtResult.verdict == 'sat'
+    # The model's input takes a branch the output wasn't written for, and the
+    # mismatching values are what that branch leaves
+    values = dict(zip('pqr', chain(smtResult.model['a0_1'])))
+    assert smtResult.mismatches
+    for var, varVal, _, ppVarVal in smtResult.mismatches:
+        assert varVal == values[var[0]]
+        assert ppVarVal == dict(zip('pqr', chain(a)))[var[0]]
+
+@pytest.mark.parametrize('options', CONFIGS)
+@pytest.mark.parametrize('a, expected', [(-1, 'unsat'), (1, 'sat')])
+def test_if_without_else_keeps_state_when_skipped(verifyWith, options, a, expected):
+    program = 'var a = {};\nvar p = 0;\nif (a > 0) {{ p = 1; }}\n'.format(a)
+    assert verifyWith(program, 'a = {};\np = 0;\n'.format(a), **options).verdict == expected
@@ -0,0 +1,34 @@
+import esprima
+import pytest
+
+from concrete_eval import ConcreteUnsupported, evaluateScript
+
+# The encoding gives the block's y a level of its own, the global y stays 1
+SHADOWED_IN_BLOCK = 'var y = 1;\nvar r = 0;\nif (y == 1) { var y = 2; r = y; }\n'
+
+# Two loops over a redeclared i inside a wrapper function, t ends up 6 + 12
+REDECLARED_COUNTER = '''var t = 0;
+(function () {
+  var i = 0;
+  while (i < 3) { i = i + 1; t = t + i; }
+  var i = 0;
+  while (i < 6) { i = i + 2; t = t + i; }
+})();
+'''
+
+def test_redeclaration_keeps_the_variable():
+    assert evaluateScript(esprima.parseScript(REDECLARED_COUNTER)) == {'t': 18}
+    assert evaluateScript(esprima.parseScript('var x = 1;\nvar x;\n')) == {'x': 1}
+
+def test_var_in_a_nested_block_is_left_to_the_encoding():
+    with pytest.raises(ConcreteUnsupported):
+        evaluateScript(esprima.parseScript(SHADOWED_IN_BLOCK))
+    with pytest.raises(ConcreteUnsupported):
+        evaluateScript(esprima.parseScript('var s = 0;\nwhile (s < 3) { var d = 1; s = s + d; }\n'))
+
+@pytest.mark.parametrize('program, prepackOutput', [(SHADOWED_IN_BLOCK, 'y = 2;\nr = 2;\n'), (SHADOWED_IN_BLOCK, 'y = 1;\nr = 2;\n'),
+                                                   (REDECLARED_COUNTER, 't = 18;\n'), (REDECLARED_COUNTER, 't = 7;\n')])
+def test_concrete_and_symbolic_verdicts_agree(verifyWith, program, prepackOutput):
+    concrete = verifyWith(program, prepackOutput)
+    symbolic = verifyWith(program, prepackOutput, CONCRETE_STEPS=0, RANDOM_LANES=0)
+    assert concrete.verdict == symbolic.verdict
@@ -0,0 +1,40 @@
+import pytest
+
+import verify
+from cone_slice import sliceQuery
+from smt_terms import TermTable
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# a, b and c have cones of their own, b's the only one with a free input
+INDEPENDENT = '''var a = 0;
+var i = 0;
+while (i < 5) { a = a + i; i = i + 1; }
+var b;
+b = b - b;
+var c = 7;
+c = c + 1;
+'''
+
+def test_globals_sharing_a_variable_are_one_slice():
+    terms = TermTable()
+    x, y, z, ppx, ppy, ppz = [terms.var(name) for name in ('x1', 'y1', 'z1', 'ppx1', 'ppy1', 'ppz1')]
+    clauses = [terms.mk('==', x, terms.mk('+', y, terms.const(1))), terms.mk('==', z, terms.const(3)),
+               terms.mk('==', terms.var('dead1'), terms.const(0))]
+    slices, dropped = sliceQuery(clauses, [('x1', 'ppx1'), ('y1', 'ppy1'), ('z1', 'ppz1')], [], lambda check: [])
+    assert [slice.connectingVars for slice in slices] == [[('x1', 'ppx1'), ('y1', 'ppy1')], [('z1', 'ppz1')]]
+    assert [len(slice.clauses) for slice in slices] == [1, 1]
+    assert dropped == 1
+
+@pytest.mark.parametrize('workers', [1, 3])
+@pytest.mark.parametrize('prepackOutput, mismatches', [('a = 10;\ni = 5;\nb = 0;\nc = 8;\n', []),
+                                                       ('a = 11;\ni = 5;\nb = 0;\nc = 8;\n', [(10, 11)]),
+                                                       ('a = 10;\ni = 5;\nb = 0;\nc = 9;\n', [(8, 9)])])
+def test_slices_are_solved_in_process(verifyWith, monkeypatch, workers, prepackOutput, mismatches):
+    def noFiles(*args, **kwargs):
+        raise AssertionError('slice solved from a file')
+    monkeypatch.setattr(verify, 'solveFile', noFiles)
+    smtResult = verifyWith(INDEPENDENT, prepackOutput, SLICE_WORKERS=workers, **SYMBOLIC)
+    assert smtResult.stats['slices'] == 3
+    assert smtResult.verdict == ('sat' if mismatches else 'unsat')
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == mismatches
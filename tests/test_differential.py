@@ -0,0 +1,115 @@
+"""
+Each optimization of the encoding, and the default settings, against the
+plain unrolled one, on generated programs and random affine loops: the
+verdict, and the values of the mismatching globals for closed programs,
+must be the same.
+"""
+
+import random
+import re
+import shutil
+
+import esprima
+import pytest
+
+from bench_generate import ProgramShape, generate, nodeValues, prepackOutput
+from concrete_eval import ConcreteUnsupported, evaluateScript
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='expected values come from node')
+
+# Every optimization off, and the concrete shortcuts that would decide closed programs without a formula
+PLAIN = {'SIMPLIFY': False, 'SLICE_WORKERS': 0, 'SUMMARIZE_LOOPS': False, 'BOUND_LOOPS': False, 'NARROW_WIDTHS': False,
+         'INTEGER_ARITHMETIC': False, 'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+OPTIMIZATIONS = {
+    'simplify': {'SIMPLIFY': True},
+    'slice': {'SLICE_WORKERS': 2},
+    'summaries': {'SUMMARIZE_LOOPS': True},
+    'bounds': {'BOUND_LOOPS': True},
+    'narrow': {'NARROW_WIDTHS': True},
+    'int': {'INTEGER_ARITHMETIC': True},
+    # What a check runs with unless told otherwise
+    'defaults': {'SIMPLIFY': True, 'SLICE_WORKERS': 2, 'SUMMARIZE_LOOPS': True, 'BOUND_LOOPS': True, 'NARROW_WIDTHS': True},
+    'all': {'SIMPLIFY': True, 'SLICE_WORKERS': 2, 'SUMMARIZE_LOOPS': True, 'BOUND_LOOPS': True, 'NARROW_WIDTHS': True,
+            'INTEGER_ARITHMETIC': True},
+}
+SHAPES = [dict(globals=6, functions=1, chains=2, loops=1, loopTrips=3),
+          dict(globals=8, functions=0, chains=3, nestingDepth=2, loops=2, loopTrips=5)]
+# The generated globals share their cones; these fall into three slices
+INDEPENDENT = """var a = 0;
+var i = 0;
+while (i < 5) {
+    a = a + i;
+    i = i + 1;
+}
+var b = 3;
+var j = 0;
+while (j < 4) {
+    b = b * 2 & 4095;
+    j = j + 1;
+}
+var c = 7;
+c = c + 1;
+"""
+
+def unmaskedLoops(program):
+    # Loop bodies without the 12-bit mask are sums the loop summaries apply to
+    return re.sub(r'while \(.*?\n    \}', lambda match: match.group(0).replace(' & 4095', ''), program, flags=re.S)
+
+def openInputs(program, count=2):
+    # The first globals declared without a value are free inputs of the encoding
+    for index in range(count):
+        program = re.sub(r'^var g{} = \d+;'.format(index), 'var g{};'.format(index), program, flags=re.M)
+    return program
+
+def affineLoops(count, seed=0):
+    # Counter-and-accumulator loops the summaries apply to, with v starting
+    # near the bound so that some fail their condition on entry only
+    rng = random.Random(seed)
+    while count:
+        bound = rng.randint(-15, 15)
+        program = 'var i = {};\nvar v = {};\nwhile (v {} {}) {{ i = i + {}; v = v + i; }}\n'.format(
+            rng.randint(-12, 12), bound + rng.randint(-3, 3), rng.choice(['<', '<=', '>', '>=']), bound,
+            rng.choice([-2, -1, 1, 2, 3]))
+        try:
+            # Loops that don't stop soon are of no use
+            evaluateScript(esprima.parseScript(program), 40)
+        except ConcreteUnsupported:
+            continue
+        count -= 1
+        yield program
+
+def cases():
+    for shapeIndex, axes in enumerate(SHAPES):
+        for seed in range(2):
+            program, output, bumpedOutput, bump = generate(ProgramShape(**axes), seed)
+            name = 'shape{}-seed{}'.format(shapeIndex, seed)
+            yield name, program, output, 'unsat'
+            yield name + '-bumped', program, bumpedOutput, 'sat'
+            unmasked = unmaskedLoops(program)
+            values = nodeValues(unmasked)
+            yield name + '-unmasked', unmasked, prepackOutput(values), 'unsat'
+            yield name + '-unmasked-bumped', unmasked, prepackOutput(values, bump), 'sat'
+            yield name + '-open', openInputs(unmasked), prepackOutput(values), None
+    for index, program in enumerate(affineLoops(12)):
+        values = nodeValues(program)
+        yield 'affine{}'.format(index), program, prepackOutput(values), 'unsat'
+        yield 'affine{}-bumped'.format(index), program, prepackOutput(values, 'v'), 'sat'
+    values = nodeValues(INDEPENDENT)
+    yield 'independent', INDEPENDENT, prepackOutput(values), 'unsat'
+    yield 'independent-bumped', INDEPENDENT, prepackOutput(values, 'b'), 'sat'
+    yield 'independent-open', INDEPENDENT.replace('var b = 3;', 'var b;'), prepackOutput(values), None
+
+CASES = list(cases()) if shutil.which('node') is not None else []
+
+def mismatchValues(smtResult):
+    return sorted((varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches)
+
+@pytest.mark.parametrize('optimization', sorted(OPTIMIZATIONS))
+@pytest.mark.parametrize('name, program, output, expected', CASES, ids=[case[0] for case in CASES])
+def test_optimization_agrees_with_plain_unrolling(verifyWith, optimization, name, program, output, expected):
+    plain = verifyWith(program, output, **PLAIN)
+    optimized = verifyWith(program, output, **dict(PLAIN, **OPTIMIZATIONS[optimization]))
+    if expected is not None:
+        assert plain.verdict == expected
+        assert mismatchValues(optimized) == mismatchValues(plain)
+    assert optimized.verdict == plain.verdict
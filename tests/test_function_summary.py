@@ -0,0 +1,94 @@
+import os
+
+import esprima
+import pytest
+
+from function_summary import FunctionSummaryCache, normalizeFunction
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+def declaration(source):
+    return esprima.parseScript(source).body[0]
+
+@pytest.mark.parametrize('first, second, same', [
+    # Renaming the function, its parameters or locals keeps the key
+    ('function f(x, y) { var d = x - y; return d; }', 'function h(p, q) { var e = p - q; return e; }', True),
+    # Parameters are numbered in order, not by name
+    ('function f(x, y) { return x - y; }', 'function f(y, x) { return x - y; }', False),
+    ('function f(x) { return x + 1; }', 'function f(x) { return x + 2; }', False),
+    # A local is not a parameter
+    ('function f(x, y) { return x; }', 'function f(x) { var y; return x; }', False),
+])
+def test_keys_identify_functions_up_to_renaming(first, second, same):
+    firstKey, _, _ = normalizeFunction(declaration(first))
+    secondKey, _, _ = normalizeFunction(declaration(second))
+    assert (firstKey == secondKey) == same
+
+def test_names_are_parameters_then_locals():
+    _, names, cacheable = normalizeFunction(declaration('function f(x, y) { var d = y - x; return d; }'))
+    assert names == ['x', 'y', 'd']
+    assert cacheable
+
+@pytest.mark.parametrize('source', ['function f(x) { return g(x); }',
+                                    'function f(x) { while (x < 3) { x = x + 1; } return x; }'])
+def test_bodies_with_outside_effects_are_not_cacheable(source):
+    assert not normalizeFunction(declaration(source))[2]
+
+def test_memory_cache_counts_hits_and_misses():
+    cache = FunctionSummaryCache()
+    assert cache.get('ab12') is None
+    cache.put('ab12', [['const', [1]]])
+    assert cache.get('ab12') == [['const', [1]]]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_disk_cache_is_shared_between_runs(tmp_path):
+    FunctionSummaryCache(str(tmp_path)).put('ab12', [['const', [1]]])
+    cache = FunctionSummaryCache(str(tmp_path))
+    assert cache.get('ab12') == [['const', [1]]]
+    assert cache.hits == 1
+    # Nothing half-written is left behind
+    assert os.listdir(str(tmp_path / 'ab')) == ['ab12.json']
+
+def test_unreadable_summary_is_a_miss(tmp_path):
+    os.makedirs(str(tmp_path / 'ab'))
+    (tmp_path / 'ab' / 'ab12.json').write_text('[["const", ')
+    cache = FunctionSummaryCache(str(tmp_path))
+    assert cache.get('ab12') is None
+    assert cache.misses == 1
+
+# f and h are the same function renamed, g swaps the parameters and k adds one
+HELPERS = '''var a;
+var r = 0;
+var s = 0;
+var t = 0;
+var u = 0;
+(function () {
+    function f(x, y) { var d = x - y; return d; }
+    function g(y, x) { var e = x - y; return e; }
+    function h(p, q) { var d = p - q; return d; }
+    function k(x, y) { var d = x - y + 1; return d; }
+    r = f(5, 3);
+    s = g(5, 3);
+    t = h(7, 3);
+    u = k(5, 3);
+})();
+a = 0;
+'''
+
+@pytest.mark.parametrize('output, mismatches', [('a = 0;\nr = 2;\ns = -2;\nt = 4;\nu = 3;\n', []),
+                                                ('a = 0;\nr = 2;\ns = 2;\nt = 4;\nu = 3;\n', [(-2, 2)]),
+                                                ('a = 0;\nr = 2;\ns = -2;\nt = 2;\nu = 3;\n', [(4, 2)]),
+                                                ('a = 0;\nr = 2;\ns = -2;\nt = 4;\nu = 2;\n', [(3, 2)])])
+def test_renamed_helper_reuses_the_summary(verifyWith, tmp_path, output, mismatches):
+    cache = FunctionSummaryCache(str(tmp_path))
+    smtResult = verifyWith(HELPERS, output, SUMMARY_CACHE=cache, **SYMBOLIC)
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == mismatches
+    # h is f's summary; g and k only look alike
+    assert (cache.hits, cache.misses) == (1, 3)
+
+    # A later run finds every summary on disk
+    cache = FunctionSummaryCache(str(tmp_path))
+    smtResult = verifyWith(HELPERS, output, SUMMARY_CACHE=cache, **SYMBOLIC)
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == mismatches
+    assert (cache.hits, cache.misses) == (4, 0)
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import pytest
+
+import verify
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# b depends on the input a, c doesn't
+PROGRAM = '''var a;
+var b = a & 0;
+var c = 3;
+a = 0;
+'''
+
+@pytest.fixture
+def noSubprocess(monkeypatch):
+    # Solving must not start another interpreter; prepack output is given
+    def refuse(*args, **kwargs):
+        raise AssertionError('started a process: {}'.format(args[0] if args else kwargs))
+    for name in ['run', 'Popen', 'call', 'check_call', 'check_output']:
+        monkeypatch.setattr(subprocess, name, refuse)
+
+@pytest.mark.parametrize('sliceWorkers', [0, 2])
+def test_unsat_result(verifyWith, noSubprocess, sliceWorkers):
+    smtResult = verifyWith(PROGRAM, 'a = 0;\nb = 0;\nc = 3;\n', SLICE_WORKERS=sliceWorkers, **SYMBOLIC)
+    assert smtResult.verdict == 'unsat'
+    assert smtResult.mismatches == []
+    assert smtResult.model == {}
+    assert smtResult.unrollDepth == 2
+    assert {'parse', 'translate', 'solve'} <= set(smtResult.timings)
+
+@pytest.mark.parametrize('sliceWorkers', [0, 2])
+def test_sat_result_has_the_mismatch_and_model(verifyWith, noSubprocess, sliceWorkers):
+    smtResult = verifyWith(PROGRAM, 'a = 0;\nb = 0;\nc = 4;\n', SLICE_WORKERS=sliceWorkers, **SYMBOLIC)
+    assert smtResult.verdict == 'sat'
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == [(3, 4)]
+    var, _, ppVar, _ = smtResult.mismatches[0]
+    assert var.startswith('c') and ppVar.startswith('ppc')
+    assert smtResult.model[var] == 3 and smtResult.model[ppVar] == 4
+
+@pytest.mark.parametrize('output, returnCode', [('a = 0;\nb = 0;\nc = 3;\n', 0), ('a = 0;\nb = 0;\nc = 4;\n', 1)])
+def test_dumped_script_reaches_the_same_verdict(monkeypatch, tmp_path, output, returnCode):
+    for name, value in SYMBOLIC.items():
+        monkeypatch.setattr(verify, name, value)
+    scriptFile = str(tmp_path / 'pyz3_output.py')
+    smtResult = verify.verifyProgram(PROGRAM, 'test.js', fileName=scriptFile, prepackOutput=output)
+    assert smtResult.verdict == ('unsat', 'sat')[returnCode]
+    assert subprocess.run([sys.executable, scriptFile], capture_output=True).returncode == returnCode
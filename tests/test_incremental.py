@@ -0,0 +1,68 @@
+import pytest
+
+import verify
+
+# Concrete evaluation and random testing would decide these before the formula
+# is built, summaries and bounds before it needs deepening
+UNROLLED = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0, 'SUMMARIZE_LOOPS': False, 'BOUND_LOOPS': False}
+
+# s is 0 + 1 + ... + 4 after 5 iterations, past the first depth
+COUNTED = '''var a;
+var s = 0;
+var i = 0;
+while (i < 5) { s = s + i; i = i + 1; }
+a = 0;
+'''
+
+# The inner loop is unrolled again in every iteration of the outer one
+NESTED = '''var a;
+var t = 0;
+var i = 0;
+var j = 0;
+while (i < 3) { j = 0; while (j < 4) { t = t + 1; j = j + 1; } i = i + 1; }
+a = 0;
+'''
+
+# Only positive inputs run the loop, and then 6 times
+INPUT_GUARDED = '''var a;
+var s = 0;
+var i = 0;
+while (i < 6 && a > 0) { if (i > 2) { s = s + 2; } else { s = s + 1; } i = i + 1; }
+a = 0;
+'''
+
+# Name, program, prepack output, verdict, and whether the mismatching values
+# are determined; a model of an open program is any of its inputs
+CASES = [('counted', COUNTED, 'a = 0;\ns = 10;\ni = 5;\n', 'unsat', True),
+         ('counted-wrong', COUNTED, 'a = 0;\ns = 11;\ni = 5;\n', 'sat', True),
+         ('nested', NESTED, 'a = 0;\nt = 12;\ni = 3;\nj = 4;\n', 'unsat', True),
+         ('nested-wrong', NESTED, 'a = 0;\nt = 9;\ni = 3;\nj = 4;\n', 'sat', True),
+         ('guarded', INPUT_GUARDED, 'a = 0;\ns = 9;\ni = 6;\n', 'sat', False),
+         ('guarded-unrun', INPUT_GUARDED, 'a = 0;\ns = 0;\ni = 0;\n', 'sat', False)]
+
+@pytest.fixture
+def rounds(monkeypatch):
+    # The arguments of every run of main
+    rounds = []
+    main = verify.main
+    monkeypatch.setattr(verify, 'main', lambda **runArgs: rounds.append(runArgs) or main(**runArgs))
+    return rounds
+
+@pytest.mark.parametrize('name, program, output, expected, determined', CASES, ids=[case[0] for case in CASES])
+def test_incremental_agrees_with_restarting(verifyWith, rounds, name, program, output, expected, determined):
+    restarted = verifyWith(program, output, **UNROLLED)
+    restarts = len(rounds)
+    incremental = verifyWith(program, output, incremental=True, **UNROLLED)
+    assert restarted.verdict == incremental.verdict == expected
+    assert restarted.stats['loopDepths'] == incremental.stats['loopDepths']
+    if determined:
+        assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in restarted.mismatches] == \
+               [(varVal, ppVarVal) for _, varVal, _, ppVarVal in incremental.mismatches]
+    # Deepening restarts main, the incremental check deepens in its one run
+    assert len(rounds) - restarts == 1
+
+@pytest.mark.parametrize('output', ['a = 0;\ns = 10;\ni = 5;\n', 'a = 0;\ns = 11;\ni = 5;\n'])
+def test_incremental_deepens_only_as_far_as_needed(verifyWith, rounds, output):
+    smtResult = verifyWith(COUNTED, output, incremental=True, **UNROLLED)
+    assert smtResult.stats['loopDepths'] == {0: 8}
+    assert len(rounds) == 1
@@ -0,0 +1,63 @@
+import esprima
+import pytest
+
+import verify
+from loop_bounds import loopBounds, loopNumbers
+
+# Concrete evaluation and random testing would decide these before the formula
+# is built, summaries before it is unrolled
+UNROLLED = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0, 'SUMMARIZE_LOOPS': False}
+
+def bounds(source):
+    # Bound of every loop of source in source order, or the analysis gave up
+    script = esprima.parseScript(source)
+    loopBound = loopBounds(script)
+    if not loopBound:
+        return 'gave up'
+    numbers = loopNumbers(script)
+    return [loopBound[loopId] for loopId in sorted(numbers, key=numbers.get)]
+
+@pytest.mark.parametrize('source, expected', [
+    ('var i = 0; while (i < 10) { i = i + 1; }', [10]),
+    ('var i = 20; while (i > 0) { i = i - 2; }', [10]),
+    ('var i = 0; while (i <= 10) { i = i + 1; }', [11]),
+    ('var i = 5; while (i < 3) { i = i + 1; }', [0]),
+    # The second loop starts where the first one left i
+    ('var i = 0; while (i < 10) { i = i + 1; } while (i < 20) { i = i + 1; }', [10, 10]),
+    # Nested loops are bounded per iteration of the outer one
+    ('var i = 0; var j = 0; while (i < 3) { j = 0; while (j < 4) { j = j + 1; } i = i + 1; }', [3, 4]),
+    # i enters as 0 or 5, both stop by 10 iterations
+    ('var a; var i = 0; if (a > 0) { i = 5; } while (i < 10) { i = i + 1; }', [10]),
+    ('var a; var i = 0; while (i < 10 && a > 0) { i = i + 1; }', [10]),
+    ('var t = 0; (function () { var i = 0; while (i < 3) { i = i + 1; t = t + i; } })();', [3]),
+])
+def test_counter_loops_are_bounded(source, expected):
+    assert bounds(source) == expected
+
+@pytest.mark.parametrize('source', ['var a; var i = 0; while (i < a) { i = i + 1; }',
+                                    'var i = 0; while (i < 10) { i = i + 0; }'])
+def test_unbounded_loops_keep_doubling(source):
+    assert bounds(source) == [None]
+
+def test_unmodeled_statement_gives_up():
+    assert bounds('var i = 0; while (i < 10) { i = i + 1; if (i == 5) { break; } }') == 'gave up'
+
+# 100 iterations, 6 rounds of doubling from 2
+LONG = '''var a;
+var i = 0;
+var v = 0;
+while (i < 100) { i = i + 1; v = v + i; }
+a = 0;
+'''
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_bounded_loop_is_unrolled_once(verifyWith, monkeypatch, incremental):
+    rounds = []
+    main = verify.main
+    monkeypatch.setattr(verify, 'main', lambda **runArgs: rounds.append(runArgs) or main(**runArgs))
+    assert verifyWith(LONG, 'a = 0;\ni = 100;\nv = 5050;\n', incremental, **UNROLLED).verdict == 'unsat'
+    smtResult = verifyWith(LONG, 'a = 0;\ni = 100;\nv = 5051;\n', incremental, **UNROLLED)
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == [(5050, 5051)]
+    # Neither needed deepening
+    assert len(rounds) == 2
+    assert smtResult.stats['loopDepths'] == {}
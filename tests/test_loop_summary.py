@@ -0,0 +1,73 @@
+import os
+import shutil
+
+import pytest
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+CONFIGS = [{}, SYMBOLIC, dict(SYMBOLIC, SLICE_WORKERS=0), dict(SYMBOLIC, SIMPLIFY=False), dict(SYMBOLIC, BOUND_LOOPS=False)]
+
+# x enters the loop far outside the entry bound of its summary
+LARGE_ENTRY = '''var a;
+var i = 0;
+var x = 20000000;
+var r = 0;
+while (i < 3) { i = i + 1; x = x + a; }
+r = 5;
+'''
+
+# Only an input far outside the entry bound takes the first branch
+LARGE_INPUT = '''var a;
+var i = 0;
+var r = 0;
+while (i < 3) { i = i + 1; a = a + 1; }
+if (a == 20000003) { r = 1; } else { r = 0; }
+a = 0;
+'''
+
+# v < 0 holds again only after 19 iterations, a run of the convex condition
+# that doesn't start on entry; the loop never runs
+LATE_RUN = '''var a;
+var i = -10;
+var v = 0;
+if (a > 100) { i = -10; } else { i = -10; }
+while (v < 0) { i = i + 1; v = v + i; }
+a = 0;
+'''
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('options', CONFIGS + [dict(SYMBOLIC, INTEGER_ARITHMETIC=True), dict(SYMBOLIC, SOLVER_PORTFOLIO=['z3'])])
+def test_loop_whose_condition_fails_on_entry_does_not_run(verifyWith, options, incremental):
+    if 'SOLVER_PORTFOLIO' in options and shutil.which('z3') is None:
+        pytest.skip('the portfolio runs the z3 executable')
+    smtResult = verifyWith(LATE_RUN, 'a = 0;\ni = -10;\nv = 0;\n', incremental, **options)
+    assert smtResult.verdict == 'unsat'
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('options', CONFIGS)
+def test_run_outside_the_bounds_is_not_ruled_out(verifyWith, options, incremental):
+    smtResult = verifyWith(LARGE_ENTRY, 'a = 0;\ni = 3;\nx = 20000000;\nr = 6;\n', incremental, **options)
+    assert smtResult.verdict == 'sat'
+    assert any(var.startswith('r') and (varVal, ppVarVal) == (5, 6) for var, varVal, _, ppVarVal in smtResult.mismatches)
+
+@pytest.mark.parametrize('incremental', [False, True])
+@pytest.mark.parametrize('options', CONFIGS)
+def test_input_outside_the_bounds_is_not_ruled_out(verifyWith, options, incremental):
+    smtResult = verifyWith(LARGE_INPUT, 'a = 0;\ni = 3;\nr = 0;\n', incremental, **options)
+    assert smtResult.verdict == 'sat'
+    assert [(varVal, ppVarVal) for var, varVal, _, ppVarVal in smtResult.mismatches if var.startswith('r')] == [(1, 0)]
+
+@pytest.mark.parametrize('options', CONFIGS[1:])
+def test_summary_within_the_bounds_is_not_unrolled(verifyWith, options):
+    smtResult = verifyWith('var i = 0;\nvar s = 0;\nwhile (i < 10) { i = i + 1; s = s + i; }\n', 'i = 10;\ns = 55;\n', **options)
+    assert smtResult.verdict == 'unsat'
+    assert smtResult.stats['loopDepths'] == {}
+
+def test_summarized_loops_after_unrolled_ones_are_kept(verifyWith):
+    # simple_script's last loop enters with values only known once the ones
+    # before it are unrolled far enough, its summary is no reason to unroll it
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'simple_script.js')) as f:
+        program = f.read()
+    smtResult = verifyWith(program, 'x = 5;\ny = 40400;\nz = 80;\nw = -1;\nv = 306;\n', BOUND_LOOPS=False, **SYMBOLIC)
+    assert smtResult.verdict == 'unsat'
+    assert 2 not in smtResult.stats['loopDepths']
@@ -0,0 +1,50 @@
+import os
+
+from prepack_cache import PrepackCache
+
+def writeProgram(tmp_path, source='var x = 1;\n'):
+    programFile = tmp_path / 'program.js'
+    programFile.write_text(source)
+    return str(programFile)
+
+def test_worker_version_is_part_of_the_key(tmp_path):
+    cacheDir = str(tmp_path / 'cache')
+    # The executable is never asked for its version when the runner's is given
+    cache = PrepackCache(cacheDir, prepackCmd=str(tmp_path / 'no-prepack'))
+    programFile = writeProgram(tmp_path)
+    outputs = iter([b'x = 1;\n', b'x = 2;\n'])
+    runner = lambda programFile: next(outputs)
+
+    assert cache.run(programFile, runner=runner, version='0.2.1') == b'x = 1;\n'
+    assert cache.run(programFile, runner=runner, version='0.2.1') == b'x = 1;\n'
+    assert cache.run(programFile, runner=runner, version='0.2.2') == b'x = 2;\n'
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert not os.path.exists(os.path.join(cacheDir, 'versions'))
+
+def test_put_keeps_a_running_total(tmp_path):
+    cache = PrepackCache(str(tmp_path / 'cache'), maxBytes=1000)
+    walks = []
+    walk = cache._walk
+    cache._walk = lambda: walks.append(1) or walk()
+
+    for i in range(10):
+        cache.put('{:064x}'.format(i), b'x' * 10)
+    # Overwriting an entry only counts the difference
+    cache.put('{:064x}'.format(0), b'x' * 30)
+    assert cache._readTotal() == 120
+    # Only the first put, without a total yet, walked the entries
+    assert len(walks) == 1
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    cache = PrepackCache(str(tmp_path / 'cache'), maxBytes=100)
+    keys = ['{:064x}'.format(i) for i in range(4)]
+    for age, key in enumerate(keys[:3]):
+        cache.put(key, b'x' * 30)
+        os.utime(cache._entryPath(key), ns=((age + 1) * 10 ** 9, (age + 1) * 10 ** 9))
+    # Reading the oldest entry makes it the most recently used
+    assert cache.get(keys[0]) is not None
+
+    # 120 bytes are over the limit, eviction goes down to 75
+    cache.put(keys[3], b'x' * 30)
+    assert [os.path.exists(cache._entryPath(key)) for key in keys] == [True, False, False, True]
+    assert cache._readTotal() == 60
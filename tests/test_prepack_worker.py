@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+
+import pytest
+
+from prepack_worker import PrepackWorkerError, PrepackWorkerPool, PrepackTimeout
+
+FAKE_WORKER = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_prepack_worker.py')]
+
+@pytest.fixture
+def pool():
+    pools = []
+    def make(size=1, timeout=10, retries=1):
+        pools.append(PrepackWorkerPool(size, FAKE_WORKER, timeout, retries))
+        return pools[-1]
+    yield make
+    for made in pools:
+        made.close()
+
+def test_request_and_version(pool, monkeypatch):
+    monkeypatch.setenv('FAKE_PREPACK_VERSION', '0.2.54')
+    workers = pool()
+    assert workers.prepack('x = 1;') == 'x = 1;'
+    assert workers.version() == '0.2.54'
+
+def test_rejected_input_is_not_retried(pool):
+    workers = pool()
+    pid = workers.prepack('pid')
+    with pytest.raises(PrepackWorkerError, match='rejected input'):
+        workers.prepack('fail')
+    assert workers.prepack('pid') == pid
+
+def test_timeout_restarts_the_worker(pool):
+    workers = pool(timeout=0.5)
+    pid = workers.prepack('pid')
+    with pytest.raises(PrepackTimeout):
+        workers.prepack('sleep 5')
+    # The stuck worker was killed, the next request gets a fresh one
+    assert workers.prepack('pid') != pid
+    assert len(workers.workers) == 1
+
+def test_crash_restarts_the_worker(pool):
+    workers = pool(retries=0)
+    pid = workers.prepack('pid')
+    with pytest.raises(PrepackWorkerError):
+        workers.prepack('crash')
+    assert not workers.workers[0].alive()
+    assert workers.prepack('pid') != pid
+
+def test_crash_is_retried_on_a_fresh_worker(pool, tmp_path, monkeypatch):
+    marker = tmp_path / 'crashed'
+    monkeypatch.setenv('FAKE_PREPACK_CRASH_ONCE', str(marker))
+    workers = pool(retries=1)
+    assert workers.prepack('x = 1;') == 'x = 1;'
+    assert marker.exists()
+
+def test_pool_size_bounds_the_workers(pool):
+    workers = pool(size=2)
+    results = []
+    requests = [threading.Thread(target=lambda: results.append(workers.prepack('sleep 0.5'))) for _ in range(4)]
+    for request in requests:
+        request.start()
+    for request in requests:
+        request.join()
+    assert results == ['sleep 0.5'] * 4
+    assert len(workers.workers) == 2
+    assert len(set(workers.prepack('pid') for _ in range(4))) <= 2
+
+def test_cached_output_is_keyed_by_the_worker_version(pool, tmp_path, monkeypatch):
+    import verify
+    from prepack_cache import PrepackCache
+
+    programFile = tmp_path / 'program.js'
+    programFile.write_text('x = 1;')
+    cache = PrepackCache(str(tmp_path / 'cache'), prepackCmd=str(tmp_path / 'no-prepack'))
+    monkeypatch.setattr(verify, 'PREPACK_CACHE', cache)
+    for version, misses in (('0.2.54', 1), ('0.2.54', 1), ('0.2.55', 2)):
+        monkeypatch.setenv('FAKE_PREPACK_VERSION', version)
+        monkeypatch.setattr(verify, 'PREPACK_POOL', pool())
+        assert verify.runPrepack(str(programFile)) == b'x = 1;'
+        assert cache.misses == misses
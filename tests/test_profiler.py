@@ -0,0 +1,56 @@
+import json
+import tracemalloc
+
+import pytest
+
+import verify
+from profiler import Profile
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# The loop needs a second round at a deeper unroll
+PROGRAM = 'var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 6) { s = s + i; i = i + 1; }\na = 0;\n'
+OUTPUT = 'a = 0;\ns = 15;\ni = 6;\n'
+
+@pytest.fixture
+def profiled(verifyWith, tmp_path):
+    # The --profile file of a check, written the way the command line writes it
+    tracing = tracemalloc.is_tracing()
+    # Imported before tracing starts, under tracemalloc the imports take seconds
+    verify.loadBackends()
+    def run(**options):
+        profile = Profile()
+        smtResult = verifyWith(PROGRAM, OUTPUT, PROFILE=profile, **dict(SYMBOLIC, **options))
+        fileName = str(tmp_path / 'profile.json')
+        profile.write(fileName, file='test.js', verdict=smtResult.verdict, timings=smtResult.timings)
+        with open(fileName) as f:
+            return json.load(f)
+    yield run
+    # Tracing slows down every allocation of the tests after this one
+    if not tracing:
+        tracemalloc.stop()
+
+def test_profile_schema(profiled):
+    record = profiled()
+    assert set(record) == {'seconds', 'maxRSSBytes', 'phases', 'nodeTypes', 'counts', 'rounds', 'file', 'verdict', 'timings'}
+    assert record['verdict'] == 'unsat'
+    assert record['maxRSSBytes'] > 0
+    for name in ('parse', 'translate', 'assert', 'check'):
+        assert set(record['phases'][name]) == {'seconds', 'calls', 'peakBytes'}
+        assert record['phases'][name]['calls'] >= 1
+    assert set(record['nodeTypes']['WhileStatement']) == {'seconds', 'calls'}
+    for stats in record['nodeTypes'].values():
+        assert stats['seconds'] >= 0
+
+def test_every_round_has_its_sizes(profiled):
+    rounds = profiled(SUMMARIZE_LOOPS=False, BOUND_LOOPS=False)['rounds']
+    assert [round['loopDepths'] for round in rounds] == [{}, {'0': 4}, {'0': 8}]
+    assert [round['verdict'] for round in rounds] == ['unroll', 'unroll', 'unsat']
+    for round in rounds:
+        assert round['termNodes'] > 0 and round['ssaVariables'] > 0
+        assert round['counts']['checks'] >= 1
+    assert rounds[0]['termNodes'] < rounds[-1]['termNodes']
+
+def test_solver_statistics_of_the_whole_query(profiled):
+    rounds = profiled(SLICE_WORKERS=0)['rounds']
+    assert all('solver' in round for round in rounds)
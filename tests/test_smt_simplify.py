@@ -0,0 +1,28 @@
+from smt_simplify import Simplifier, foldConst, wrap32
+from smt_terms import TermTable
+
+def test_wrap32():
+    assert wrap32(1 << 31) == -(1 << 31)
+    assert wrap32((1 << 32) - 1) == -1
+    assert wrap32(5) == 5
+
+def test_comparison_of_large_literals_folds_as_negative():
+    terms = TermTable()
+    # 2^31 is INT32_MIN as a bitvector, as z3 reads it
+    assert Simplifier(terms, []).run([terms.mk('<', terms.const(1 << 31), terms.const(0))]) == []
+    clauses = Simplifier(terms, []).run([terms.mk('>', terms.const(1 << 31), terms.const(0))])
+    assert len(clauses) == 1 and clauses[0].op == 'not'
+
+def test_arithmetic_on_large_literals_folds_as_negative():
+    terms = TermTable()
+    # -2147483648 / 2 == -1073741824
+    clause = terms.mk('==', terms.var('x'), terms.mk('/', terms.const(1 << 31), terms.const(2)))
+    clauses = Simplifier(terms, ['x']).run([clause])
+    assert [clause.args[1].args[0] for clause in clauses] == [foldConst('/', -(1 << 31), 2)]
+
+def test_equal_bitvector_constants_do_not_conflict():
+    terms = TermTable()
+    clauses = [terms.mk('==', terms.var('x'), terms.const((1 << 32) - 1)), terms.mk('==', terms.var('x'), terms.const(-1))]
+    simplifier = Simplifier(terms, ['x'])
+    simplifier.run(clauses)
+    assert not simplifier.conflict
@@ -0,0 +1,118 @@
+import pytest
+
+from smt_terms import TermTable, Z3Builder, countNodes, postorder, toPython
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+def test_equal_terms_are_one_node():
+    terms = TermTable()
+    first = terms.mk('+', terms.var('x0_1'), terms.const(1))
+    second = terms.mk('+', terms.var('x0_1'), terms.const(1))
+    assert first is second
+    assert terms.mk('+', terms.const(1), terms.var('x0_1')) is not first
+    # x, 1, x + 1 and 1 + x, from nine requests
+    assert len(terms) == 4
+    assert terms.built == 9
+
+def test_shared_subterms_are_counted_once():
+    terms = TermTable()
+    cond = terms.mk('<', terms.var('i0_1'), terms.const(10))
+    clauses = [terms.mk('implies', cond, terms.mk('==', terms.var('i0_2'), terms.const(n))) for n in range(3)]
+    # i0_1, 10, i0_1 < 10, i0_2, and per clause its constant, equation and implication
+    assert countNodes(clauses) == 4 + 3 * 3
+    assert len(postorder(clauses + clauses)) == countNodes(clauses)
+
+def test_postorder_puts_children_first():
+    terms = TermTable()
+    root = terms.mk('and', terms.mk('<', terms.var('a0_1'), terms.const(0)), terms.mk('==', terms.var('a0_1'), terms.const(0)))
+    seen = set()
+    for term in postorder([root]):
+        if term.op not in ('var', 'const'):
+            assert all(arg.id in seen for arg in term.args)
+        seen.add(term.id)
+    assert postorder([root])[-1] is root
+
+def test_long_conjunction_does_not_recurse():
+    terms = TermTable()
+    root = terms.conj(terms.mk('==', terms.var('x0_{}'.format(n)), terms.const(n)) for n in range(20000))
+    assert countNodes([root]) == 4 * 20000 - 1
+
+def test_release_keeps_the_leaves():
+    terms = TermTable()
+    x = terms.var('x0_1')
+    inner = terms.mk('neg', x)
+    terms.release()
+    assert terms.var('x0_1') is x
+    again = terms.mk('neg', x)
+    assert again is not inner and again.id > inner.id
+
+def test_operands_are_coerced_to_their_sort():
+    terms = TermTable()
+    x = terms.var('x0_1')
+    cond = terms.mk('<', x, terms.const(0))
+    assert cond.sort == 'bool' and x.sort == 'bv'
+    # A number used as a condition is compared against 0
+    assert terms.mk('not', x).args[0] is terms.mk('!=', x, terms.const(0))
+    # A boolean used as a number is 1 or 0
+    assert terms.mk('+', cond, x).args[0] is terms.mk('ite', cond, terms.const(1), terms.const(0))
+    # Equality of two booleans stays boolean, of mixed sorts it compares numbers
+    assert terms.mk('==', cond, cond).args == (cond, cond)
+    assert terms.mk('==', cond, x).args[0].op == 'ite'
+
+def test_variables_are_registered_when_created():
+    terms = TermTable()
+    terms.var('b0_1')
+    terms.boolVar('unwind0_2')
+    terms.var('a0_1')
+    terms.var('b0_1')
+    assert list(terms.symbols.items()) == [('b0_1', 'bv'), ('unwind0_2', 'bool'), ('a0_1', 'bv')]
+
+@pytest.mark.parametrize('op, left, right, value', [('%', -7, 2, -1), ('%', 7, -2, 1), ('<<', 1, 33, 2), ('>>', -8, 1, -4),
+                                                    ('>>>', -8, 29, 7), ('&', 6, 3, 2), ('^', 6, 3, 5)])
+def test_operators_have_javascript_semantics(op, left, right, value):
+    import z3
+    terms = TermTable()
+    x, y = terms.var('x0_1'), terms.var('y0_1')
+    builder = Z3Builder()
+    builder.declareSymbols(terms.symbols)
+    expr = z3.substitute(builder.convert(terms.mk(op, x, y)), (builder.env['x0_1'], z3.BitVecVal(left, 32)),
+                         (builder.env['y0_1'], z3.BitVecVal(right, 32)))
+    assert z3.simplify(expr).as_signed_long() == value
+
+def test_python_source_names_each_root():
+    terms = TermTable()
+    x = terms.var('x0_1')
+    roots = [terms.mk('==', x, terms.const(1)), terms.mk('%', x, terms.const(3))]
+    lines, names = toPython(roots)
+    assert len(names) == 2 and len(lines) == countNodes(roots) - 1
+    assert any('SRem' in line for line in lines)
+
+# The same loop condition in every unrolled iteration, and the same globals
+# on the original and prepack sides
+LOOP = '''var a;
+var s = 0;
+var i = 0;
+while (i < 4) { s = s + i; i = i + 1; }
+a = 0;
+'''
+
+@pytest.mark.parametrize('simplify', [False, True])
+def test_formula_reports_distinct_nodes(verifyWith, simplify):
+    smtResult = verifyWith(LOOP, 'a = 0;\ns = 6;\ni = 4;\n', SIMPLIFY=simplify, SUMMARIZE_LOOPS=False, **SYMBOLIC)
+    assert smtResult.verdict == 'unsat'
+    assert 0 < smtResult.stats['termNodes'] < smtResult.stats['termsBuilt']
+
+# Operators the old regex tokenizer didn't know about
+OPERATORS = '''var a = {};
+var r = 0;
+r = (a % 5) & 3;
+if (r % 2 == 1) {{ r = r ^ 8; }}
+'''
+
+@pytest.mark.parametrize('a, r', [(-3, 9), (-1, 11), (4, 0), (7, 2)])
+def test_remainder_and_bitwise_operators_are_declared(verifyWith, a, r):
+    program = OPERATORS.format(a)
+    assert verifyWith(program, 'a = {};\nr = {};\n'.format(a, r), **SYMBOLIC).verdict == 'unsat'
+    smtResult = verifyWith(program, 'a = {};\nr = {};\n'.format(a, r + 1), **SYMBOLIC)
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == [(r, r + 1)]
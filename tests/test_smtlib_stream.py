@@ -0,0 +1,62 @@
+import pytest
+
+from smt_terms import TermTable
+from smtlib_stream import SMTLibStream, parseSolverOutput, solveFile, solveFileInProcess
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# Programs with a free input a, their prepack output and the values of the globals that differ
+CHECKS = [('var a;\nvar b = 0;\nif (a > 3) { b = 1; } else { b = 1; }\na = 0;\n', 'a = 0;\nb = 1;\n', []),
+          ('var a;\nvar b = 0;\nif (a > 3) { b = 1; } else { b = 2; }\na = 0;\n', 'a = 0;\nb = 1;\n', [(2, 1)]),
+          ('var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 4) { s = s + i; i = i + 1; }\na = 0;\n', 'a = 0;\ns = 6;\ni = 4;\n', []),
+          ('var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 4) { s = s + i; i = i + 1; }\na = 0;\n', 'a = 0;\ns = 7;\ni = 4;\n', [(6, 7)]),
+          ('var a;\nvar b = 2147483647;\nb = b + 1;\na = 0;\n', 'a = 0;\nb = -2147483648;\n', [])]
+
+def mismatchValues(smtResult):
+    return sorted((varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches)
+
+def writeQuery(fileName, widths=None):
+    # x + y == 10 and x - y == 4 over 32-bit signed values, or 8-bit x
+    terms = TermTable()
+    x, y = terms.var('x'), terms.var('y')
+    stream = SMTLibStream(fileName, widths)
+    stream.assertTerm(terms.mk('==', terms.mk('+', x, y), terms.const(10)))
+    stream.assertTerm(terms.mk('==', terms.mk('-', x, y), terms.const(4)))
+    stream.assertTerm(terms.mk('<', y, terms.const(100)))
+    stream.assertTerm(terms.mk('>', y, terms.const(-100)))
+    stream.close()
+    return stream
+
+@pytest.mark.parametrize('suffix', ['.smt2', '.smt2.gz', '.smt2.xz'])
+def test_streamed_file_solves_in_and_out_of_process(tmp_path, suffix):
+    fileName = str(tmp_path / ('query' + suffix))
+    stream = writeQuery(fileName)
+    assert stream.declared == {'x', 'y'}
+    assert stream.assertions == 4
+    assert solveFile(fileName, ['x', 'y']) == ('sat', {'x': 7, 'y': 3})
+    assert solveFileInProcess(fileName, ['x', 'y']) == ('sat', {'x': 7, 'y': 3})
+    # Without the executable the file is solved in-process
+    assert solveFile(fileName, ['x'], solverCmd=['no-such-solver']) == ('sat', {'x': 7})
+
+def test_narrow_variable_keeps_its_32_bit_name(tmp_path):
+    fileName = str(tmp_path / 'query.smt2')
+    writeQuery(fileName, {'x': (4, False)})
+    with open(fileName) as f:
+        text = f.read()
+    assert '(declare-const x__4 (_ BitVec 4))' in text
+    assert solveFile(fileName, ['x', 'y']) == ('sat', {'x': 7, 'y': 3})
+
+def test_solver_output_is_parsed_in_both_value_notations():
+    output = 'sat\n((x #xfffffffe)\n (y (_ bv5 32))\n (z #b00000000000000000000000000000001))\n'
+    assert parseSolverOutput(output, 'z3') == ('sat', {'x': -2, 'y': 5, 'z': 1})
+    assert parseSolverOutput('unsat\n(error "no model")\n', 'z3') == ('unsat', {})
+    with pytest.raises(RuntimeError):
+        parseSolverOutput('(error "unknown constant q")\nsat\n', 'z3')
+
+@pytest.mark.parametrize('suffix', ['.smt2', '.smt2.gz'])
+@pytest.mark.parametrize('program, prepackOutput, mismatches', CHECKS)
+def test_streamed_check_agrees_with_in_process(verifyWith, tmp_path, program, prepackOutput, mismatches, suffix):
+    inProcess = verifyWith(program, prepackOutput, **SYMBOLIC)
+    streamed = verifyWith(program, prepackOutput, smtFile=str(tmp_path / ('check' + suffix)), **SYMBOLIC)
+    assert inProcess.verdict == streamed.verdict == ('sat' if mismatches else 'unsat')
+    assert mismatchValues(inProcess) == mismatchValues(streamed) == mismatches
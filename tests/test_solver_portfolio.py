@@ -0,0 +1,65 @@
+import shutil
+
+import pytest
+
+import solver_portfolio
+from smt_terms import TermTable
+from smtlib_stream import SMTLibStream
+from solver_portfolio import availableConfigs, solvePortfolio
+
+pytestmark = pytest.mark.skipif(shutil.which('z3') is None, reason='the portfolio runs the z3 executable')
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# Programs with a free input a, their prepack output and the values of the globals that differ
+CHECKS = [('var a;\nvar b = 0;\nif (a > 3) { b = 1; } else { b = 1; }\na = 0;\n', 'a = 0;\nb = 1;\n', []),
+          ('var a;\nvar b = 0;\nif (a > 3) { b = a; } else { b = 3; }\nb = b & 7;\na = 0;\n', 'a = 0;\nb = 3;\n', None),
+          ('var a;\nvar s = 0;\nvar i = 0;\nwhile (i < 4) { s = s + i; i = i + 1; }\na = 0;\n', 'a = 0;\ns = 7;\ni = 4;\n', [(6, 7)])]
+
+# Answers before even reading the query, with something that is no verdict
+BROKEN = {'cmd': ['sh', '-c', 'echo "(error \\"no such logic\\")"'], 'check': '(check-sat)'}
+
+def writeQuery(fileName):
+    # x + y == 10 and x - y == 4 with y in (-100, 100)
+    terms = TermTable()
+    x, y = terms.var('x'), terms.var('y')
+    stream = SMTLibStream(fileName)
+    stream.assertTerm(terms.mk('==', terms.mk('+', x, y), terms.const(10)))
+    stream.assertTerm(terms.mk('==', terms.mk('-', x, y), terms.const(4)))
+    stream.assertTerm(terms.mk('<', y, terms.const(100)))
+    stream.assertTerm(terms.mk('>', y, terms.const(-100)))
+    stream.close()
+    return fileName
+
+def test_configs_without_their_solver_are_left_out(monkeypatch):
+    monkeypatch.setitem(solver_portfolio.PORTFOLIO_CONFIGS, 'missing', {'cmd': ['no-such-solver'], 'check': '(check-sat)'})
+    assert availableConfigs(['z3', 'missing', 'z3-qfbv']) == ['z3', 'z3-qfbv']
+    with pytest.raises(ValueError):
+        availableConfigs(['z3', 'no-such-config'])
+
+def test_every_config_finds_the_model(tmp_path):
+    fileName = writeQuery(str(tmp_path / 'query.smt2'))
+    for name in availableConfigs(list(solver_portfolio.PORTFOLIO_CONFIGS)):
+        assert solvePortfolio(fileName, ['x', 'y'], [name]) == ('sat', {'x': 7, 'y': 3}, name)
+
+def test_broken_config_drops_out_of_the_race(tmp_path, monkeypatch):
+    monkeypatch.setitem(solver_portfolio.PORTFOLIO_CONFIGS, 'broken', BROKEN)
+    fileName = writeQuery(str(tmp_path / 'query.smt2'))
+    assert solvePortfolio(fileName, ['x'], ['broken', 'z3']) == ('sat', {'x': 7}, 'z3')
+    assert solvePortfolio(fileName, ['x'], ['broken']) == ('unknown', {}, None)
+
+def test_portfolio_needs_an_installed_solver(tmp_path, monkeypatch):
+    monkeypatch.setitem(solver_portfolio.PORTFOLIO_CONFIGS, 'missing', {'cmd': ['no-such-solver'], 'check': '(check-sat)'})
+    with pytest.raises(RuntimeError):
+        solvePortfolio(writeQuery(str(tmp_path / 'query.smt2')), ['x'], ['missing'])
+
+@pytest.mark.parametrize('program, prepackOutput, mismatches', CHECKS)
+def test_portfolio_agrees_with_in_process(verifyWith, program, prepackOutput, mismatches):
+    inProcess = verifyWith(program, prepackOutput, **SYMBOLIC)
+    raced = verifyWith(program, prepackOutput, SOLVER_PORTFOLIO=['z3', 'z3-qfbv', 'z3-bitblast'], **SYMBOLIC)
+    assert raced.verdict == inProcess.verdict
+    assert raced.stats['solver'] in ('z3', 'z3-qfbv', 'z3-bitblast')
+    if mismatches is not None:
+        # Closed-form mismatches have one value only, free ones may differ between models
+        assert raced.verdict == ('sat' if mismatches else 'unsat')
+        assert sorted((varVal, ppVarVal) for _, varVal, _, ppVarVal in raced.mismatches) == mismatches
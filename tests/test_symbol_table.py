@@ -0,0 +1,82 @@
+import esprima
+import pytest
+
+from function_summary import FunctionSummaryCache
+from smt_terms import TermTable
+from symbol_table import ScopeResolver, SymbolTable
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+# The block's x shadows the global one
+SHADOWED_IN_BLOCK = 'var a;\nvar x = 1;\n{ var x = 2; x = x + a; }\nx = x + 5;\na = 0;\n'
+# f's y and x are its own, the global y is a different variable
+SHADOWED_BY_FUNCTION = 'var a;\nvar y = 1;\nfunction f(x) { var y = x + 1; return y; }\ny = f(y) + f(a);\na = 0;\n'
+# d is read before the body declares it, from the second iteration on it is the body's
+DECLARED_LATER_IN_LOOP = 'var s = 0;\nvar i = 0;\nwhile (i < 3) { s = s + d; var d = i; i = i + 1; }\n'
+# g's parameter lives a level below f's
+NESTED_FUNCTION = 'var y = 1;\nfunction f(x) { function g(z) { return z; } return g(x); }\ny = f(2);\n'
+
+def identifiers(node, found):
+    if isinstance(node, list):
+        for item in node:
+            identifiers(item, found)
+    elif hasattr(node, 'type'):
+        if node.type == 'Identifier':
+            found.append(node)
+        for name, value in vars(node).items():
+            if name != 'range':
+                identifiers(value, found)
+    return found
+
+def resolvedLevels(program):
+    # (name, level the resolver bound it to) of every Identifier in source order
+    tree = esprima.parseScript(program, {'range': True})
+    levels = ScopeResolver().resolve(tree)
+    return [(node.name, levels.get(id(node))) for node in sorted(identifiers(tree, []), key=lambda node: node.range[0])]
+
+def test_block_declaration_shadows_until_the_block_ends():
+    assert resolvedLevels(SHADOWED_IN_BLOCK) == [('a', 0), ('x', 0), ('x', 1), ('x', 1), ('x', 1), ('a', 0),
+                                                 ('x', 0), ('x', 0), ('a', 0)]
+
+def test_function_locals_shadow_globals():
+    # Function names and parameter declarations aren't looked up
+    assert resolvedLevels(SHADOWED_BY_FUNCTION) == [('a', 0), ('y', 0), ('f', None), ('x', None), ('y', 1), ('x', 1),
+                                                    ('y', 1), ('y', 0), ('f', None), ('y', 0), ('f', None), ('a', 0),
+                                                    ('a', 0)]
+
+def test_nested_function_resolves_in_its_own_table():
+    assert resolvedLevels(NESTED_FUNCTION) == [('y', 0), ('f', None), ('x', None), ('g', None), ('z', None), ('z', 2),
+                                               ('g', None), ('x', 1), ('y', 0), ('f', None)]
+
+def test_name_found_at_different_levels_is_left_unbound():
+    assert resolvedLevels(DECLARED_LATER_IN_LOOP)[5:7] == [('d', None), ('d', 1)]
+
+def test_symbol_terms_are_built_once():
+    terms = TermTable()
+    symbols = SymbolTable(terms)
+    x = symbols.intern('x', 1, '')
+    fx = symbols.intern('fx', 2, 'f', count=3)
+    assert (symbols.ssaName(x), symbols.ssaName(x, 4), symbols.ssaName(fx)) == ('x1_0', 'x1_4', 'fx2_3')
+    assert symbols.term(x) is symbols.term(x, 0)
+    assert symbols.term(x).args == ('x1_0',)
+    symbols.counts[x] = 2
+    assert symbols.term(x).args == ('x1_2',)
+    # Function locals are holes the call sites fill in
+    assert symbols.term(fx).op == 'hole'
+    assert len(symbols) == 2
+
+@pytest.mark.parametrize('program, prepackOutput, verdict', [
+    (SHADOWED_IN_BLOCK, 'a = 0;\nx = 6;\n', 'unsat'),
+    (SHADOWED_IN_BLOCK, 'a = 0;\nx = 7;\n', 'sat'),
+    # y is 3 + a
+    (SHADOWED_BY_FUNCTION, 'a = 0;\ny = 5;\n', 'sat'),
+    ('var s = 0;\nvar i = 0;\nwhile (i < 3) { var d = i + 1; s = s + d; i = i + 1; }\n', 's = 6;\ni = 3;\nd = 3;\n', 'unsat'),
+])
+def test_resolved_levels_translate_like_the_lookup_walk(verifyWith, monkeypatch, program, prepackOutput, verdict):
+    # Each with a summary cache of its own, so both translate f
+    resolved = verifyWith(program, prepackOutput, SUMMARY_CACHE=FunctionSummaryCache(), **SYMBOLIC)
+    monkeypatch.setattr(ScopeResolver, 'resolve', lambda self, tree, level=0: {})
+    walked = verifyWith(program, prepackOutput, SUMMARY_CACHE=FunctionSummaryCache(), **SYMBOLIC)
+    assert resolved.verdict == walked.verdict == verdict
+    assert resolved.mismatches == walked.mismatches
+    assert resolved.stats['termNodes'] == walked.stats['termNodes']
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import verify
+
+# Concrete evaluation and random testing would decide these before the formula is built
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+UNROLLED = dict(SYMBOLIC, SUMMARIZE_LOOPS=False, BOUND_LOOPS=False)
+
+# The second loop counts with a redeclared i, t ends up 6 + 12
+REDECLARED_COUNTER = '''var t = 0;
+(function () {
+  var i = 0;
+  while (i < 3) { i = i + 1; t = t + i; }
+  var i = 0;
+  while (i < 6) { i = i + 2; t = t + i; }
+})();
+'''
+
+# d is declared again in every iteration
+DECLARED_IN_BODY = '''var s = 0;
+var i = 0;
+while (i < 3) { var d = i + 1; s = s + d; i = i + 1; }
+'''
+
+@pytest.mark.parametrize('unrollDepth', [2, 4, 8])
+@pytest.mark.parametrize('options', [SYMBOLIC, dict(SYMBOLIC, BOUND_LOOPS=False), UNROLLED])
+def test_redeclared_counter(verifyWith, options, unrollDepth):
+    assert verifyWith(REDECLARED_COUNTER, 't = 18;\n', unrollDepth=unrollDepth, **options).verdict == 'unsat'
+    smtResult = verifyWith(REDECLARED_COUNTER, 't = 7;\n', unrollDepth=unrollDepth, **options)
+    assert smtResult.verdict == 'sat'
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in smtResult.mismatches] == [(18, 7)]
+
+@pytest.mark.parametrize('options', [SYMBOLIC, UNROLLED])
+def test_declared_in_loop_body(verifyWith, options):
+    assert verifyWith(DECLARED_IN_BODY, 's = 6;\ni = 3;\n', **options).verdict == 'unsat'
+    assert verifyWith(DECLARED_IN_BODY, 's = 7;\ni = 3;\n', **options).verdict == 'sat'
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_later_loops_deepen_with_the_earlier_ones(verifyWith, monkeypatch, incremental):
+    # The three loops of simple_script need 10, 10 and 6 iterations, each
+    # deepened as soon as the one before it is
+    rounds = []
+    main = verify.main
+    monkeypatch.setattr(verify, 'main', lambda **runArgs: rounds.append(runArgs) or main(**runArgs))
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'simple_script.js')) as f:
+        program = f.read()
+    smtResult = verifyWith(program, 'x = 5;\ny = 40400;\nz = 80;\nw = -1;\nv = 306;\n', incremental, **UNROLLED)
+    assert smtResult.verdict == 'unsat'
+    assert smtResult.stats['loopDepths'] == {0: 16, 1: 16, 2: 16}
+    assert len(rounds) == (1 if incremental else 4)
+
+# A declared function's body is one summary for all its calls
+LOOP_IN_FUNCTION = '''var a;
+var r = 0;
+function f(n) {
+    var s = 0;
+    var i = 0;
+    while (i < n) { s = s + i; i = i + 1; }
+    return s;
+}
+r = f(4);
+a = 0;
+'''
+
+@pytest.mark.parametrize('incremental', [False, True])
+def test_loop_in_function_is_unsupported(verifyWith, capsys, incremental):
+    with pytest.raises(SystemExit):
+        verifyWith(LOOP_IN_FUNCTION, 'a = 0;\nr = 6;\n', incremental, **SYMBOLIC)
+    assert 'Unsupported while loop inside function f' in capsys.readouterr().out
+
+def test_loop_in_function_of_closed_program_runs_concretely(verifyWith):
+    assert verifyWith(LOOP_IN_FUNCTION.replace('var a;', 'var a = 1;'), 'a = 0;\nr = 6;\n').verdict == 'unsat'
@@ -0,0 +1,59 @@
+import pytest
+
+import verdict_cache
+from verdict_cache import VerdictCache
+
+SYMBOLIC = {'CONCRETE_STEPS': 0, 'RANDOM_LANES': 0}
+
+PROGRAM = 'var a;\nvar b = 0;\nif (a > 3) { b = 1; } else { b = 2; }\na = 0;\n'
+OUTPUT = 'a = 0;\nb = 1;\n'
+# Only spacing and comments differ, the AST is the same
+RESPACED = '// b depends on a\nvar a;\nvar b = 0;\nif (a > 3) {\n    b = 1;\n} else {\n    b = 2;\n}\na = 0;\n'
+# Without braces the AST differs, the formula doesn't
+UNBRACED = 'var a;\nvar b = 0;\nif (a > 3) b = 1; else b = 2;\na = 0;\n'
+
+@pytest.fixture
+def cachedWith(verifyWith, tmp_path):
+    cache = VerdictCache(str(tmp_path / 'verdicts'))
+    def run(program, prepackOutput=OUTPUT, **options):
+        return verifyWith(program, prepackOutput, VERDICT_CACHE=cache, **dict(SYMBOLIC, **options))
+    run.cache = cache
+    return run
+
+def test_same_input_hits_the_source_key(cachedWith):
+    first = cachedWith(PROGRAM)
+    assert 'cached' not in first.stats
+    second = cachedWith(PROGRAM)
+    assert second.stats['cached'] == 'source'
+    assert (second.verdict, second.mismatches) == (first.verdict, first.mismatches)
+    assert cachedWith.cache.hits == 1
+
+@pytest.mark.parametrize('program, kind', [(RESPACED, 'ast'), (UNBRACED, 'formula')])
+def test_equivalent_edits_hit_a_later_key(cachedWith, program, kind):
+    first = cachedWith(PROGRAM)
+    edited = cachedWith(program)
+    assert edited.stats['cached'] == kind
+    assert (edited.verdict, edited.mismatches) == (first.verdict, first.mismatches)
+    # Stored under the edit's source key as well
+    assert cachedWith(program).stats['cached'] == 'source'
+
+@pytest.mark.parametrize('change', [dict(prepackOutput='a = 0;\nb = 2;\n'), dict(unrollDepth=4), dict(incremental=True),
+                                    dict(SUMMARIZE_LOOPS=False), dict(BOUND_LOOPS=False)])
+def test_other_output_or_policy_misses(cachedWith, change):
+    cachedWith(PROGRAM)
+    assert 'cached' not in cachedWith(PROGRAM, **change).stats
+
+def test_new_checker_version_misses(cachedWith, monkeypatch):
+    cachedWith(PROGRAM)
+    monkeypatch.setattr(verdict_cache, 'encoderVersion', lambda: 'edited checker')
+    cachedWith.cache._versions = None
+    assert 'cached' not in cachedWith(PROGRAM).stats
+
+def test_unreadable_entry_misses(tmp_path):
+    cache = VerdictCache(str(tmp_path / 'verdicts'))
+    key = cache.sourceKey(PROGRAM, OUTPUT)
+    cache.store.put(key, b'{not json')
+    assert cache.get(key) is None
+    cache.put([key], {'verdict': 'unsat'})
+    assert cache.get(key) == {'verdict': 'unsat'}
+    assert (cache.hits, cache.misses) == (1, 1)
@@ -0,0 +1,58 @@
+import pytest
+
+import verify
+from smt_terms import TermTable
+from symbol_table import SymbolTable
+
+@pytest.fixture
+def symbols(monkeypatch):
+    # A fresh symbol table and journal, x and y global, n local to f
+    monkeypatch.setattr(verify, 'SYMBOLS', SymbolTable(TermTable()))
+    monkeypatch.setattr(verify, 'VERSION_LOG', verify.VersionLog())
+    table = {}
+    for name, funcScope in [('x', ''), ('y', ''), ('n', 'f')]:
+        verify.declareSymbol(table, name, 0, funcScope)
+    return table
+
+def test_changed_since_gives_the_first_old_count(symbols):
+    x, y = symbols['x'], symbols['y']
+    verify.newVersion(x)
+    mark = verify.VERSION_LOG.mark()
+    verify.newVersion(y)
+    verify.newVersion(x)
+    verify.newVersion(y)
+    verify.newVersion(x)
+    # In order of first write, from the count at the mark to the current one
+    assert verify.VERSION_LOG.changedSince(mark, '') == [(y, 0, 2), (x, 1, 3)]
+
+def test_nothing_changed_since_the_last_mark(symbols):
+    verify.newVersion(symbols['x'])
+    assert verify.VERSION_LOG.changedSince(verify.VERSION_LOG.mark(), '') == []
+
+def test_changes_are_per_function(symbols):
+    mark = verify.VERSION_LOG.mark()
+    verify.newVersion(symbols['n'])
+    verify.newVersion(symbols['x'])
+    assert verify.VERSION_LOG.changedSince(mark, '') == [(symbols['x'], 0, 1)]
+    assert verify.VERSION_LOG.changedSince(mark, 'f') == [(symbols['n'], 0, 1)]
+
+def test_variables_declared_after_the_mark_are_left_out(symbols):
+    mark = verify.VERSION_LOG.mark()
+    z = verify.declareSymbol(symbols, 'z', 0, '')
+    verify.newVersion(z)
+    verify.newVersion(symbols['y'])
+    assert verify.VERSION_LOG.changedSince(mark, '') == [(symbols['y'], 0, 1)]
+    # Declaring a var again keeps its symbol and version
+    assert verify.declareSymbol(symbols, 'z', 0, '') == z
+    assert verify.SYMBOLS.counts[z] == 1
+
+def test_marks_stay_unique_across_trims(symbols):
+    verify.newVersion(symbols['x'])
+    before = verify.VERSION_LOG.mark()
+    verify.VERSION_LOG.trim()
+    assert verify.VERSION_LOG.journal == []
+    mark = verify.VERSION_LOG.mark()
+    assert mark == before
+    verify.newVersion(symbols['x'])
+    assert verify.VERSION_LOG.mark() > mark
+    assert verify.VERSION_LOG.changedSince(mark, '') == [(symbols['x'], 1, 2)]
@@ -0,0 +1,71 @@
+import os
+
+import pytest
+
+import verify
+
+PROGRAM = 'var a = 1;\nvar b = 2;\nvar i = 0;\nwhile (i < 3) { i = i + 1; a = a + i; }\nb = b * 3;\n'
+EDITED = PROGRAM.replace('b = b * 3;', 'b = b * 4;')
+
+@pytest.fixture
+def prepackOf(monkeypatch, tmp_path):
+    # runPrepack gives the output set for the file's current contents
+    outputs = {}
+    def runPrepack(programFile):
+        with open(programFile) as f:
+            return outputs[f.read()].encode()
+    monkeypatch.setattr(verify, 'runPrepack', runPrepack)
+    verify.loadBackends()
+    return outputs
+
+def session(tmp_path, program):
+    programFile = str(tmp_path / 'watched.js')
+    with open(programFile, 'w') as f:
+        f.write(program)
+    return programFile, verify.WatchSession(programFile)
+
+def edit(programFile, program):
+    with open(programFile, 'w') as f:
+        f.write(program)
+
+def test_edit_translates_only_the_changed_statement(tmp_path, prepackOf):
+    prepackOf[PROGRAM] = 'a = 7;\nb = 6;\ni = 3;\n'
+    prepackOf[EDITED] = 'a = 7;\nb = 6;\ni = 3;\n'
+    programFile, watch = session(tmp_path, PROGRAM)
+    first = watch.check(PROGRAM)
+    assert first.verdict == 'unsat'
+    assert first.stats['translatedStatements'] == first.stats['statements']
+
+    edit(programFile, EDITED)
+    edited = watch.check(EDITED)
+    assert edited.verdict == 'sat'
+    assert [(varVal, ppVarVal) for _, varVal, _, ppVarVal in edited.mismatches] == [(8, 6)]
+    # Only the edited statement, prepack's output is the same
+    assert (edited.stats['translatedStatements'], edited.stats['statements']) == (1, 11)
+    # a and i are no longer connected to anything that changed
+    assert edited.stats['comparedGlobals'] == 1
+
+    prepackOf[EDITED] = 'a = 7;\nb = 8;\ni = 3;\n'
+    fixed = watch.check(EDITED)
+    assert fixed.verdict == 'unsat'
+
+def test_watch_checks_again_when_the_file_changes(tmp_path, prepackOf, monkeypatch, capsys):
+    prepackOf[PROGRAM] = 'a = 7;\nb = 6;\ni = 3;\n'
+    prepackOf[EDITED] = 'a = 7;\nb = 6;\ni = 3;\n'
+    programFile = str(tmp_path / 'watched.js')
+    edit(programFile, PROGRAM)
+    sleeps = []
+    def sleep(seconds):
+        # The first pass sees the original, the second the edit, then stop watching
+        sleeps.append(seconds)
+        if len(sleeps) == 1:
+            edit(programFile, EDITED)
+            os.utime(programFile, ns=(1, 1))
+        elif len(sleeps) == 3:
+            raise KeyboardInterrupt
+    monkeypatch.setattr(verify.time, 'sleep', sleep)
+    with pytest.raises(KeyboardInterrupt):
+        verify.watchProgram(programFile)
+    out = capsys.readouterr().out
+    assert out.count('Checked in') == 2
+    assert out.index('unsat') < out.index('Translated 1 of 11 statements') < out.index('b0_2=8 vs. ppb0_2=6')
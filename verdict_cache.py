@@ -0,0 +1,139 @@
+"""
+Persistent cache of verification results.
+
+CI re-verifies the same bundles on every commit, mostly unchanged.  A result
+(verdict, counterexample, the unroll depths it was reached at and the timings
+of the run that produced it) is stored under three keys, each hashed together
+with the checker's encoding version, the z3 version and the unroll policy:
+
+    source   the original's text and the prepack output, looked up before
+             anything is parsed, so a hit never imports esprima or z3
+    ast      the original's AST without positions and raw literal text, for
+             edits that only touch whitespace, comments or number spelling
+    formula  the formula of the first unroll depth, for inputs that differ as
+             JavaScript but translate the same (`===` for `==`, braces, ...)
+
+Entries live in a directory of their own, stored and evicted the way
+PrepackCache keeps prepack output.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+from prepack_cache import PrepackCache
+from smt_terms import LEAF_OPS, postorder
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'prepack-eq', 'verdicts')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# AST fields that don't change what a program means
+POSITION_FIELDS = ('range', 'loc', 'raw')
+
+def encoderVersion():
+    # Any change to the checker's sources may change the encoding
+    h = hashlib.sha256()
+    checkerDir = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(checkerDir)):
+        if name.endswith('.py'):
+            h.update(name.encode())
+            with open(os.path.join(checkerDir, name), 'rb') as f:
+                h.update(f.read())
+    return h.hexdigest()
+
+def solverVersion():
+    # z3's python package and executable, without importing or running either
+    try:
+        from importlib.metadata import version
+        packageVersion = version('z3-solver')
+    except Exception:
+        packageVersion = 'unknown'
+    exePath = shutil.which('z3')
+    if exePath is None:
+        return packageVersion
+    exeStat = os.stat(os.path.realpath(exePath))
+    return '{} {}:{}:{}'.format(packageVersion, os.path.realpath(exePath), exeStat.st_mtime_ns, exeStat.st_size)
+
+def normalizedAST(node):
+    # JSON-able form of an esprima node without positions
+    if isinstance(node, list):
+        return [normalizedAST(item) for item in node]
+    if not hasattr(node, 'type'):
+        return node
+    fields = {name: normalizedAST(value) for name, value in vars(node).items() if name not in POSITION_FIELDS}
+    return sorted(fields.items())
+
+def formulaDigest(clauses, connectingVars, whileChecks):
+    """
+    Hash of the formula's structure, independent of node ids: nodes are
+    numbered in postorder from the clauses
+    """
+    h = hashlib.sha256()
+    numbers = {}
+    for term in postorder(clauses):
+        numbers[term.id] = len(numbers)
+        if term.op in LEAF_OPS:
+            h.update(repr((term.op, term.args)).encode())
+        else:
+            h.update(repr((term.op, [numbers[arg.id] for arg in term.args])).encode())
+        h.update(b'\0')
+    h.update(repr([numbers[clause.id] for clause in clauses]).encode())
+    h.update(repr((connectingVars, whileChecks)).encode())
+    return h.hexdigest()
+
+class VerdictCache:
+    """
+    VerdictCache
+        store: PrepackCache holding the entries as JSON
+        policy: settings the result depends on besides the inputs (unroll
+                depth to start from, incremental deepening, ...)
+    """
+
+    def __init__(self, cacheDir=DEFAULT_CACHE_DIR, maxBytes=DEFAULT_MAX_BYTES, policy=None):
+        self.store = PrepackCache(cacheDir, maxBytes)
+        self.policy = policy if policy is not None else {}
+        self.hits = 0
+        self.misses = 0
+        self._versions = None
+
+    def versions(self):
+        if self._versions is None:
+            self._versions = '{}\0{}'.format(encoderVersion(), solverVersion())
+        return self._versions
+
+    def key(self, kind, *parts):
+        h = hashlib.sha256()
+        for part in (kind, self.versions(), json.dumps(self.policy, sort_keys=True)) + parts:
+            h.update(part if isinstance(part, bytes) else part.encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def sourceKey(self, program, prepackOutput):
+        return self.key('source', program, prepackOutput)
+
+    def astKey(self, parsedTree, prepackOutput):
+        return self.key('ast', json.dumps(normalizedAST(parsedTree)), prepackOutput.strip())
+
+    def formulaKey(self, clauses, connectingVars, whileChecks):
+        return self.key('formula', formulaDigest(clauses, connectingVars, whileChecks))
+
+    def get(self, key):
+        """
+        The stored record for key, None on a miss
+        """
+        data = self.store.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        try:
+            record = json.loads(data.decode())
+        except ValueError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return record
+
+    def put(self, keys, record):
+        data = json.dumps(record).encode()
+        for key in keys:
+            self.store.put(key, data)
@@ -1,9 +1,100 @@
-import copy
-import esprima
-import esprima.nodes as nodes
-import re
+import bisect
+import contextlib
+import inspect
+import math
+import os
 import subprocess
-from z3 import *
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from prepack_cache import PrepackCache, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from prepack_worker import PrepackWorkerPool, PrepackWorkerError, PrepackTimeout, DEFAULT_TIMEOUT
+from function_summary import FunctionSummaryCache, normalizeFunction, compileTemplate, instantiateSummary
+from smt_terms import TermTable, Z3Builder, toPython, postorder, BINARY_OPS, JS_OPERATORS
+from smtlib_stream import SMTLibStream, solveFile
+from solver_portfolio import solvePortfolio, PORTFOLIO_CONFIGS
+from smt_simplify import Simplifier
+from concrete_eval import evaluateScript, toInt, ConcreteUnsupported, UNDEFINED, STEP_BUDGET
+from random_diff import randomDiff, available as numpyAvailable, DEFAULT_LANES
+from cone_slice import sliceQuery
+from loop_summary import analyzeLoop
+from loop_bounds import loopBounds, loopNumbers
+from bit_width import RangeAnalysis, narrowWidths, savedBits, integerBlocker
+from verdict_cache import VerdictCache, DEFAULT_CACHE_DIR as VERDICT_CACHE_DIR, DEFAULT_MAX_BYTES as VERDICT_CACHE_BYTES
+from profiler import Profile
+from symbol_table import SymbolTable, ScopeResolver
+
+# Loaded by loadBackends() once a check needs them, a verdict cache hit runs without either
+esprima = None
+nodes = None
+z3 = None
+
+DEBUG_MODE = False
+LOOP_UNROLL_DEPTH = 2
+INCREMENTAL_MODE = False
+# PrepackCache shared by every run in this process, None to always spawn prepack
+PREPACK_CACHE = None
+# VerdictCache of finished checks, None to always check
+VERDICT_CACHE = None
+# Resident prepack workers, None to spawn prepack once per file
+PREPACK_POOL = None
+# Translated function bodies by alpha-normalized AST, kept across runs in this process
+SUMMARY_CACHE = FunctionSummaryCache()
+# Hash-consed terms of the current check, shared by the original and prepack encodings
+TERMS = TermTable()
+# Interned variables of the current check, their SSA versions and terms (see symbol_table)
+SYMBOLS = SymbolTable(TERMS)
+# id of an Identifier node of the programs being checked -> level of the table its lookup finds it in
+SCOPE_LEVELS = {}
+# SMTLibStream the clauses are written to statement by statement, None to keep them in memory
+SMT_STREAM = None
+# Solver configurations raced on every query (see solver_portfolio), None for the in-process solver
+SOLVER_PORTFOLIO = None
+# Propagate constants and copies before solving (see smt_simplify)
+SIMPLIFY = True
+# Steps the concrete evaluator may take on closed programs before the SMT path decides, 0 to always solve
+CONCRETE_STEPS = STEP_BUDGET
+# Random input vectors run through both programs before solving (needs numpy), 0 to skip
+RANDOM_LANES = DEFAULT_LANES
+# Sliced per-global queries (see cone_slice) solved at once, each in its own z3 context, 0 to solve the query as a whole
+SLICE_WORKERS = os.cpu_count() or 1
+# Encode affine induction loops in closed form instead of unrolling them (see loop_summary)
+SUMMARIZE_LOOPS = True
+# Start unrolling loops at their statically known iteration bound (see loop_bounds)
+BOUND_LOOPS = True
+# id of a WhileStatement of the program being checked -> its iteration bound or None
+LOOP_BOUNDS = {}
+# id of a WhileStatement of the program being checked -> its number in source order
+LOOP_NUMBERS = {}
+# Loop number -> unroll depth, for the loops that needed more than LOOP_UNROLL_DEPTH
+LOOP_DEPTHS = {}
+# Under-unroll check -> (loop number, depth) of the loop it was written for
+CHECK_LOOPS = {}
+# Conditions of the branches and loop iterations enclosing the statement being translated
+PATH_CONDITIONS = []
+# Seconds between checks of the watched file for changes
+WATCH_INTERVAL = 0.5
+# Declare variables with a proven range at the narrowest width holding it (see bit_width)
+NARROW_WIDTHS = True
+# Solve in process over Int, wrapping + - * where they may overflow, when the formula is linear
+INTEGER_ARITHMETIC = False
+# Profile of the phases, node types and formula sizes of the check (see profiler), None to not profile
+PROFILE = None
+
+def loadBackends():
+    global esprima, nodes, z3
+    if z3 is None:
+        import esprima
+        import esprima.nodes as nodes
+        import z3
+
+def profiled(name):
+    # Phase of PROFILE, nothing without --profile
+    return PROFILE.phase(name) if PROFILE is not None else contextlib.nullcontext()
+
+def profileCount(name, n=1):
+    if PROFILE is not None:
+        PROFILE.count(name, n)
 
 def printWithIndent(text, level):
     print('  ' * level, end='')
@@ -16,34 +107,44 @@ def representsInt(s):
     except ValueError:
         return False
 
-def fn_lookup(var, varTable, funcTable, level, flag = 0, funcScope = ''):
-    if (level == -1):
-       print ("Error in variable name lookup")
-       exit(-1)
-
-    # print('------------------')
-    # print('in lookup')
-    # print('{} {} {}'.format(var, level, funcScope))
-    # print('var {}'.format(varTable))
-    # print('func {}'.format(funcTable))
-    # print('------------------')
-
-    if funcScope == '':
-        # Should look inside varTable
-        if level in varTable and var in varTable[level]:
-            if flag == 1:
-                varTable[level][var] += 1
-            return level, varTable[level][var]
+def jsRem(a, b):
+    # JavaScript's %, the result takes the sign of the dividend
+    return int(math.fmod(a, b))
+
+def jsUshr(a, b):
+    # JavaScript's >>>, on the 32-bit pattern of a
+    return (a & 0xffffffff) >> (b & 31)
+
+# Functions available to the python loop conditions in whileChecks
+CHECK_FUNCS = {'jsRem': jsRem, 'jsUshr': jsUshr}
+
+def fn_lookup(var, varTable, funcTable, level, funcScope = '', resolved = None):
+    """
+    Symbol of var as seen from level, from the level the resolver bound it
+    to when given (see symbol_table), else the nearest level that has it
+    """
+    if resolved is not None:
+        if funcScope == '':
+            table = varTable.get(resolved)
         else:
-            return fn_lookup(var, varTable, funcTable, level-1, flag, funcScope)
-    else:
-        # Inside a function, look  at funcTable
-        if level-1 in funcTable and funcScope in funcTable[level-1] and var in funcTable[level-1][funcScope]['varTable']:
-            if flag == 1:
-                funcTable[level-1][funcScope]['varTable'][var] += 1
-            return level, funcTable[level-1][funcScope]['varTable'][var]
+            table = funcTable.get(resolved-1, {}).get(funcScope, {}).get('varTable')
+        symbol = table.get(var) if table is not None else None
+        if symbol is not None:
+            return symbol
+
+    while level >= 0:
+        if funcScope == '':
+            # Should look inside varTable
+            if level in varTable and var in varTable[level]:
+                return varTable[level][var]
         else:
-            return fn_lookup(var, varTable, funcTable, level-1, flag, funcScope)
+            # Inside a function, look  at funcTable
+            if level-1 in funcTable and funcScope in funcTable[level-1] and var in funcTable[level-1][funcScope]['varTable']:
+                return funcTable[level-1][funcScope]['varTable'][var]
+        level -= 1
+
+    print ("Error in variable name lookup")
+    exit(-1)
 
 def funcTable_lookup(funcName, level, funcTable):
     if (level == -1):
@@ -58,6 +159,80 @@ def funcTable_lookup(funcName, level, funcTable):
 class Counter:
     cnt = 0
 
+class VersionLog:
+    """
+    Journal of SSA counter writes, (symbol, oldCount)
+    A snapshot is the journal length, so branches and loop iterations find the
+    variables they changed in time proportional to their own writes instead of
+    copying and diffing the whole table.
+        base: entries trimmed off the front, marks stay unique across trims
+    """
+
+    def __init__(self):
+        self.journal = []
+        self.base = 0
+
+    def trim(self):
+        # Between top-level statements no mark is held, the entries so far can go
+        self.base += len(self.journal)
+        self.journal = []
+
+    def mark(self):
+        profileCount('versionMarks')
+        return self.base + len(self.journal)
+
+    def record(self, symbol, oldCount):
+        # oldCount is None when the write creates the variable
+        self.journal.append((symbol, oldCount))
+
+    def changedSince(self, mark, funcScope):
+        """
+        Variables of funcScope whose counter differs from its value at mark,
+        as (symbol, oldCount, newCount) in order of first write
+        """
+        firstWrite = {}
+        for symbol, oldCount in self.journal[mark - self.base:]:
+            if symbol not in firstWrite and SYMBOLS.scopes[symbol] == funcScope:
+                firstWrite[symbol] = oldCount
+
+        changed = []
+        for symbol, oldCount in firstWrite.items():
+            newCount = SYMBOLS.counts[symbol]
+            # Variables declared after the mark have nothing to connect to
+            if oldCount is not None and oldCount != newCount:
+                changed.append((symbol, oldCount, newCount))
+        return changed
+
+VERSION_LOG = VersionLog()
+
+def newVersion(symbol):
+    # The next SSA version of symbol, journaled for the branches and loops around it
+    VERSION_LOG.record(symbol, SYMBOLS.counts[symbol])
+    SYMBOLS.counts[symbol] += 1
+
+def declareSymbol(table, name, level, funcScope):
+    # Version 0 of a new symbol for name in table, or the symbol it was declared
+    # as there before at its current version: declaring a var again doesn't
+    # reset it, and going back to version 0 would reuse the SSA names of its earlier values
+    symbol = table.get(name)
+    if symbol is None:
+        symbol = SYMBOLS.intern(name, level, funcScope)
+        VERSION_LOG.record(symbol, None)
+        table[name] = symbol
+    return symbol
+
+def versionTable(varTable):
+    # SSA version of every variable of varTable, by level and name
+    return {lvl: {varName: SYMBOLS.counts[symbol] for varName, symbol in localVars.items()} for lvl, localVars in varTable.items()}
+
+def connectChanged(changed):
+    # (new == old) for every changed variable, None when nothing changed
+    connectExpr = None
+    for symbol, oldCount, newCount in changed:
+        tempExpr = TERMS.mk('==', SYMBOLS.term(symbol, newCount), SYMBOLS.term(symbol, oldCount))
+        connectExpr = tempExpr if connectExpr is None else TERMS.mk('and', connectExpr, tempExpr)
+    return connectExpr
+
 def printCondPython(ast, varTable, level, funcScope, funcTable):
     if isinstance(ast, nodes.BinaryExpression):
         # LogicalExpression is just BinaryExpression
@@ -79,7 +254,12 @@ def printCondPython(ast, varTable, level, funcScope, funcTable):
             # Left association, go down leftside first
             leftStr = printCondPython(ast.left, varTable, level, funcScope, funcTable)
             rightStr = printCondPython(ast.right, varTable, level, funcScope, funcTable)
-            tempstr = '(' + leftStr + ast.operator + rightStr + ')'
+            operator = JS_OPERATORS.get(ast.operator, ast.operator)
+            if operator == '%':
+                return 'jsRem({}, {})'.format(leftStr, rightStr)
+            elif operator == '>>>':
+                return 'jsUshr({}, {})'.format(leftStr, rightStr)
+            tempstr = '(' + leftStr + operator + rightStr + ')'
             return tempstr
 
     elif isinstance(ast, nodes.UnaryExpression):
@@ -96,6 +276,10 @@ def printCondPython(ast, varTable, level, funcScope, funcTable):
             retStr = '(not {})'.format(argStr)
         elif ast.operator == '-':
             retStr = ast.operator + argStr
+        elif ast.operator == '~':
+            retStr = '(~{})'.format(argStr)
+        elif ast.operator == '+':
+            retStr = argStr
         else:
             # FIXME: what else is here?
             exit('Unhandled operator in UnaryExpression')
@@ -103,13 +287,11 @@ def printCondPython(ast, varTable, level, funcScope, funcTable):
         return retStr
 
     elif isinstance(ast, nodes.Identifier):
-        lookupName = funcScope + ast.name
-        levelFound, index = fn_lookup(lookupName, varTable, funcTable, level, funcScope=funcScope)
-        if funcScope == '':
-            retStr = '{}{}_{}'.format(lookupName, levelFound, index)
-        else:
-            retStr = '{}{}_{}_{{nInvoke}}'.format(lookupName, levelFound, index)
-        
+        symbol = fn_lookup(funcScope + ast.name, varTable, funcTable, level, funcScope, SCOPE_LEVELS.get(id(ast)))
+        retStr = SYMBOLS.ssaName(symbol)
+        if funcScope != '':
+            retStr += '_{nInvoke}'
+
         return retStr
 
     elif isinstance(ast, nodes.Literal):
@@ -119,6 +301,15 @@ def printCondPython(ast, varTable, level, funcScope, funcTable):
         exit(-1)
 
 def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalSMT = None, incFlag = 0, whileCount = None, loopUnroll=5):
+    if PROFILE is None:
+        return translateNode(ast, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+    PROFILE.enterNode(ast.type)
+    try:
+        return translateNode(ast, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+    finally:
+        PROFILE.exitNode()
+
+def translateNode(ast, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll):
     
     if DEBUG_MODE:
         # print('----------------')printWithIndent
@@ -142,13 +333,22 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
     if isinstance(ast, nodes.Script):
         # Assuming ast.body is always a list..?
         # just need to recurse into each element of body
-        tempStr = ''
+        clauses = []
         for element in ast.body:
-            outStr = printSMT(element, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            tempStr = outStr if tempStr == '' else tempStr + '^' + outStr
+            outExpr = printSMT(element, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            if outExpr is not None:
+                clauses.append(outExpr)
+
+            if SMT_STREAM is not None:
+                # Write the statement out and forget its terms
+                for clause in clauses + additionalSMT:
+                    SMT_STREAM.assertTerm(clause)
+                del clauses[:]
+                del additionalSMT[:]
+                TERMS.release()
+                SMT_STREAM.release()
         
-        for smt in additionalSMT:
-            tempStr = tempStr + '^' + smt
+        clauses += additionalSMT
 
         # print('----------------')
         # print('varTable {}'.format(varTable))
@@ -156,7 +356,7 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
         # print('funcTable {}'.format(funcTable))
         # print('----------------')
 
-        return tempStr, whileCount
+        return clauses, whileCount
 
     elif isinstance(ast, nodes.VariableDeclaration):
         """
@@ -174,12 +374,12 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
         else:
             localVars = funcTable[level-1][funcScope]['varTable']
 
-        retStr = ''
+        declExprs = []
         for decl in ast.declarations:
 
-            lookupName = funcScope + decl.id.name
-            # For declaration just init to 0
-            localVars[lookupName] = 0
+            # For declaration just init to 0, a var declared again keeps its value
+            redeclared = funcScope + decl.id.name in localVars
+            declareSymbol(localVars, funcScope + decl.id.name, level, funcScope)
 
             # # Construct SMT expression
             # tempStr = '({}=={})'.format(lookupName + str(level) + '_' + str(0), lookupName + str(level))
@@ -187,20 +387,15 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
             if decl.init:
                 # RHS can be any expression... like func calls, binary expr, etc
                 # Must do init before left, because left increments counter
-                initStr = printSMT(decl.init, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-                leftStr = printSMT(decl.id, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
-                tempStr = '({}=={})'.format(leftStr, initStr)
-            else:
-                leftStr = printSMT(decl.id, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
-                tempStr = '({}=={})'.format(leftStr, leftStr)
-            
-            if retStr == '':
-                retStr = tempStr
-            else:
-                retStr = retStr + '^' + tempStr
+                initExpr = printSMT(decl.init, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+                leftExpr = printSMT(decl.id, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
+                declExprs.append(TERMS.mk('==', leftExpr, initExpr))
+            elif not redeclared:
+                leftExpr = printSMT(decl.id, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
+                declExprs.append(TERMS.mk('==', leftExpr, leftExpr))
         
         # varTable[level] = localVars
-        return retStr
+        return TERMS.conj(declExprs)
     elif isinstance(ast, nodes.ExpressionStatement):
         """
         ExpressionStatement:
@@ -223,28 +418,24 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
             
             foundLevel, localTable = funcTable_lookup(calledFunc, level, funcTable)
 
-            SMTExpr = localTable['SMTExpr']
             params = localTable['params']
             nInvoke = localTable['nInvoke']
 
             localTable['nInvoke'] += 1
-            # Replace variables with correct nInvoke
-            SMTExpr = SMTExpr.replace('{nInvoke}', str(nInvoke))
 
             if len(params) != len(ast.arguments):
                 print ('Uh-oh, something went wrong!')
                 exit(-1)
 
-            # Replace input parameter with correct values
-            for index, arg in enumerate(ast.arguments):
-                tempStr = printSMT(arg, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-                SMTExpr = SMTExpr.replace('{'+params[index]+'}', tempStr)
+            # Fill the summary's holes with this invocation's names and the argument values
+            args = [printSMT(arg, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll) for arg in ast.arguments]
+            SMTExpr = instantiateSummary(localTable['summary'], localTable['names'], calledFunc, foundLevel, nInvoke, args, TERMS)
+            profileCount('inlinedCalls')
 
             # No need to recursive 
             # FIXME: How to add SMTExpr?
             additionalSMT.append(SMTExpr)
-            retVar = 'ret{}_{}'.format(calledFunc, nInvoke)
-            return retVar
+            return TERMS.var('ret{}_{}'.format(calledFunc, nInvoke))
         else:
             # FIXME: is this right?
             return printSMT(ast.callee, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
@@ -257,10 +448,10 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
         """
 
         # Must do right before left
-        rightStr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-        leftStr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
+        rightExpr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+        leftExpr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, 1, whileCount, loopUnroll)
         
-        return '({}=={})'.format(leftStr, rightStr)
+        return TERMS.mk('==', leftExpr, rightExpr)
 
     elif isinstance(ast, nodes.BlockStatement):
         """
@@ -269,12 +460,13 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
         """
 
         level = level + 1
-        tempstr = ''
+        stmtExprs = []
         for stmt in ast.body:
-            outStr = printSMT(stmt, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            tempstr = outStr if tempstr == '' else '(And({},{}))'.format(tempstr, outStr)
+            outExpr = printSMT(stmt, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            if outExpr is not None:
+                stmtExprs.append(outExpr)
 
-        return tempstr
+        return TERMS.conj(stmtExprs)
 
     elif isinstance(ast, nodes.FunctionExpression):
         """
@@ -317,35 +509,42 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
 
         localTable['varTable'] = {}
         for param in ast.params:
-            localTable['varTable'][funcName + param.name] = 0
+            localTable['varTable'][funcName + param.name] = SYMBOLS.intern(funcName + param.name, level+1, funcName)
 
         localTable['nInvoke'] = 0
 
         localTable['params'] = [funcName + param.name for param in ast.params]
 
-        bindInputStr = ''
-        for index, param in enumerate(ast.params):
-            lookupName = funcName + param.name
-            tempStr = '({{{}}}=={}{}_{}_{{nInvoke}})'.format(lookupName, lookupName, level+1, 0)
-            bindInputStr = tempStr if bindInputStr == '' else bindInputStr + '^' + tempStr
+        # The same helper (up to renaming) is only translated once
+        summaryKey, names, cacheable = normalizeFunction(ast)
+        localTable['names'] = [funcName + name for name in names]
+        summary = SUMMARY_CACHE.get(summaryKey) if cacheable else None
+        profileCount('summaryHits' if summary is not None else 'summariesTranslated')
 
-        tempStr = printSMT(ast.body, varTable, level, funcName, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-        if bindInputStr == '':
-            localTable['SMTExpr'] = tempStr
-        else:
-            localTable['SMTExpr'] = '{}^{}'.format(bindInputStr, tempStr)
+        if summary is None:
+            bodyExprs = []
+            for index, param in enumerate(ast.params):
+                lookupName = funcName + param.name
+                bodyExprs.append(TERMS.mk('==', TERMS.mk('hole', 'arg', lookupName), SYMBOLS.term(localTable['varTable'][lookupName], 0)))
+
+            bodyExprs.append(printSMT(ast.body, varTable, level, funcName, funcTable, additionalSMT, incFlag, whileCount, loopUnroll))
+
+            summary = compileTemplate(TERMS.conj(bodyExprs), localTable['names'], level)
+            if cacheable:
+                SUMMARY_CACHE.put(summaryKey, summary)
+
+        localTable['summary'] = summary
 
         # FunctionDeclaration doesn't need to return anything, return true..
-        return '(1==1)'
+        return TERMS.true()
 
     elif isinstance(ast, nodes.ReturnStatement):
         """
         ReturnStatement
             argument: dict
         """
-        tempStr = printSMT(ast.argument, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-        retStr = '(ret{}_{{nInvoke}}=={})'.format(funcScope, tempStr)
-        return retStr
+        argExpr = printSMT(ast.argument, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+        return TERMS.mk('==', TERMS.mk('hole', 'ret'), argExpr)
 
     elif isinstance(ast, nodes.BinaryExpression):
         """
@@ -357,25 +556,26 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
 
         # LogicalExpression is just BinaryExpression
         if ast.type == 'LogicalExpression':
-            leftStr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            rightStr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            leftExpr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            rightExpr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
             
             if ast.operator == '&&':
-                tempStr = 'And({}, {})'
-                return tempStr.format(leftStr, rightStr)
+                return TERMS.mk('and', leftExpr, rightExpr)
             elif ast.operator == '||':
-                tempStr = 'Or({}, {})'
-                return tempStr.format(leftStr, rightStr)
+                return TERMS.mk('or', leftExpr, rightExpr)
             else:
                 # FIXME: What can this operator be?
-                tempStr = '({}{}{})'.format(leftStr, ast.operator, rightStr)
-                return tempStr
+                print ('Uh-oh. Unhandled operator {} in printSMT'.format(ast.operator))
+                exit(-1)
         else:
             # Left association, go down leftside first
-            leftStr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            rightStr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            tempstr = '(' + leftStr + ast.operator + rightStr + ')'
-            return tempstr
+            leftExpr = printSMT(ast.left, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            rightExpr = printSMT(ast.right, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            operator = JS_OPERATORS.get(ast.operator, ast.operator)
+            if operator not in BINARY_OPS:
+                print ('Uh-oh. Unhandled operator {} in printSMT'.format(ast.operator))
+                exit(-1)
+            return TERMS.mk(operator, leftExpr, rightExpr)
 
     elif isinstance(ast, nodes.UnaryExpression):
         """
@@ -385,17 +585,21 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
             argument: dict
         """
 
-        argStr = printSMT(ast.argument, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+        argExpr = printSMT(ast.argument, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
         # FIXME: what's prefix?
         if ast.operator == '!':
-            retStr = 'Not({})'.format(argStr)
+            retExpr = TERMS.mk('not', argExpr)
         elif ast.operator == '-':
-            retStr = ast.operator + argStr
+            retExpr = TERMS.mk('neg', argExpr)
+        elif ast.operator == '~':
+            retExpr = TERMS.mk('bnot', argExpr)
+        elif ast.operator == '+':
+            retExpr = TERMS.asBV(argExpr)
         else:
             # FIXME: what else is here?
             exit('Unhandled operator in UnaryExpression')
 
-        return retStr
+        return retExpr
 
     elif isinstance(ast, nodes.IfStatement):
         """
@@ -407,48 +611,57 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
 
         # if (b==0) { g = 1 } else { g = 0 }
         #    (b0==0 -> g0 == 1) ^ (b0 != 0 -> g1 == 0) ^ (b0==0 -> g1 == g0)
+        # if (b==0) { g = 1 }
+        #    (b0==0 -> g1 == 1) ^ (b0 != 0 -> g1 == g0)
 
         # Handle condition, should be a simple expression
-        condStr = printSMT(ast.test, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-        conseqStr = printSMT(ast.consequent, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-        retStr = '(Implies({}, {}))'.format(condStr, conseqStr)
+        condExpr = printSMT(ast.test, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+        # Writes of the condition itself happen on both paths
+        conseqMark = VERSION_LOG.mark()
+        PATH_CONDITIONS.append(TERMS.asBool(condExpr))
+        conseqExpr = printSMT(ast.consequent, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+        PATH_CONDITIONS.pop()
+        conseqExpr = TERMS.true() if conseqExpr is None else conseqExpr
+        retExpr = TERMS.mk('implies', condExpr, conseqExpr)
+        conseqChanged = VERSION_LOG.changedSince(conseqMark, funcScope)
 
         if (ast.alternate == None):
-            return retStr
+            # Variables of the consequent keep their state when it doesn't run
+            keepExpr = connectChanged(conseqChanged)
+            if keepExpr is None:
+                return retExpr
+            return TERMS.mk('and', retExpr, TERMS.mk('implies', TERMS.mk('not', condExpr), keepExpr))
         else:
             # Also need to handle the alt. case 
 
-            # Need to save a copy of the varTable
-            # print (varTable)
-            # print ('{} {}'.format(funcScope, level))
-            localTable = varTable if funcScope == '' else funcTable     
-            localTableCopy = copy.deepcopy(localTable)
+            # Remember where the journal was, instead of copying the varTable
+            mark = VERSION_LOG.mark()
 
-            altStr = printSMT(ast.alternate, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            PATH_CONDITIONS.append(TERMS.mk('not', TERMS.asBool(condExpr)))
+            altExpr = printSMT(ast.alternate, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            PATH_CONDITIONS.pop()
+            altExpr = TERMS.true() if altExpr is None else altExpr
             
             # Need to get the counters for variables that have changed.. 
-            connectStr = ''
-            for level in localTable.keys():
-                for varName in localTable[level].keys():
-                    oldCount = localTableCopy[level][varName]
-                    newCount = localTable[level][varName]
-                    if oldCount != newCount:
-                        oldVarName = '{}{}_{}'.format(varName, level, oldCount)
-                        newVarName = '{}{}_{}'.format(varName, level, newCount)
-                        tempStr = '({}=={})'.format(newVarName, oldVarName)
-                        connectStr = tempStr if connectStr == '' else connectStr + '^' + tempStr
-
-            tempStr1 = '(Implies(Not({}),{}))'.format(condStr, altStr)
-
-            if connectStr == '':
+            connectExpr = connectChanged(VERSION_LOG.changedSince(mark, funcScope))
+
+            # ..and the alternate starts from the consequent's versions, which
+            # keep the state from before the if when it runs
+            keepExpr = connectChanged(conseqChanged)
+            if keepExpr is not None:
+                altExpr = TERMS.mk('and', altExpr, keepExpr)
+
+            tempExpr1 = TERMS.mk('implies', TERMS.mk('not', condExpr), altExpr)
+
+            if connectExpr is None:
                 # Nothing changed 
-                retStr = '(And({},{}))'.format(retStr, tempStr1)
+                retExpr = TERMS.mk('and', retExpr, tempExpr1)
             else:
                 # Nothing changed, need to bind
-                tempStr2 = '(Implies({},({})))'.format(condStr, connectStr)
-                retStr = '(And(And({},{}),{}))'.format(retStr, tempStr1, tempStr2)
+                tempExpr2 = TERMS.mk('implies', condExpr, connectExpr)
+                retExpr = TERMS.mk('and', TERMS.mk('and', retExpr, tempExpr1), tempExpr2)
             
-            return retStr
+            return retExpr
 
     elif isinstance(ast, nodes.WhileStatement):
         """
@@ -457,71 +670,237 @@ def printSMT(ast, varTable, level, funcScope = '', funcTable = None, additionalS
             body: dict
         """
 
-        retStr = ''
-        for i in range(LOOP_UNROLL_DEPTH):
-
-            # Save table
-            localTable = varTable if funcScope == '' else funcTable     
-            localTableCopy = copy.deepcopy(localTable)
-
-            condStr = printSMT(ast.test, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-            bodyStr = printSMT(ast.body, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
-
-            # Just do the same thing as IfStatement...
-            # FIXME: Need to add finished_loop_N
-            bodyStr = '(1==1)' if bodyStr == '' else bodyStr
-            thenStr = '(Implies({},{}))'.format(condStr, bodyStr)
-
-            connectStr = ''
-            for level in localTable.keys():
-                for varName in localTable[level].keys():
-                    oldCount = localTableCopy[level][varName]
-                    newCount = localTable[level][varName]
-                    if oldCount != newCount:
-                        oldVarName = '{}{}_{}'.format(varName, level, oldCount)
-                        newVarName = '{}{}_{}'.format(varName, level, newCount)
-                        tempStr = '({}=={})'.format(newVarName, oldVarName)
-                        connectStr = tempStr if connectStr == '' else '(And({},{}))'.format(connectStr, tempStr)
-            
-            # If condition not true, we need to maintain variable state
-            connectStr = '(1==1)' if connectStr == '' else connectStr
-            maintainStr = '(Implies(Not({}),{}))'.format(condStr, connectStr)
-
-            combinedStr = '(And({},{}))'.format(thenStr, maintainStr)
-            retStr = combinedStr if retStr == '' else '(And({},{}))'.format(retStr, combinedStr)
-
-            if i == range(LOOP_UNROLL_DEPTH)[LOOP_UNROLL_DEPTH-1]:
-                pyCondStr = printCondPython(ast.test, varTable, level, funcScope, funcTable)
-                whileCount.append(pyCondStr)
-
-            additionalSMT.append(combinedStr)
-
-        return '(1==1)'
+        if funcScope != '':
+            # A function's body is translated once for all its calls, its
+            # loops would need checks and unwinding assertions per call
+            print ('Uh-oh. Unsupported while loop inside function {}'.format(funcScope))
+            exit(-1)
+
+        number = LOOP_NUMBERS.get(id(ast))
+        # A loop whose summary bounds failed to hold is unrolled from then on
+        if SUMMARIZE_LOOPS and number is not None and not LOOP_DEPTHS.get(number):
+            shape = analyzeLoop(ast)
+            if shape is not None:
+                return summarizeLoop(ast, shape, number, varTable, level, funcTable, additionalSMT, whileCount, loopUnroll)
+
+        startMark = VERSION_LOG.mark()
+
+        depth = LOOP_DEPTHS.get(number, LOOP_UNROLL_DEPTH)
+        if LOOP_BOUNDS.get(id(ast)) is not None:
+            # No run takes more iterations, doubling only goes past it if the check still fails
+            depth = max(depth, LOOP_BOUNDS[id(ast)])
+        for i in range(depth):
+            combinedExpr = unrollWhileIteration(ast, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+            additionalSMT.append(combinedExpr)
+
+        pyCondStr = printCondPython(ast.test, varTable, level, funcScope, funcTable)
+        loopId = len(whileCount)
+        loopRecord = {'check': pyCondStr, 'resumable': False, 'id': loopId, 'ast': ast, 'number': number, 'depth': depth}
+        CHECK_LOOPS[pyCondStr] = (number, depth)
+
+        if number is not None:
+            # Unwinding assertion, the literal holds exactly when the loop is
+            # done after depth iterations or never reached; solved under it as an assumption
+            loopRecord['guard'] = TERMS.conj(PATH_CONDITIONS)
+            loopRecord['unwind'] = unwindingAssertion(loopRecord, depth, varTable, level, funcTable, additionalSMT, whileCount, loopUnroll)
+
+        if INCREMENTAL_MODE:
+            # Code after the loop reads from exit versions, bound to the last
+            # unrolled iteration only under the literal of the current depth,
+            # so deeper unrolls can be appended without touching that code
+            literal = 'unroll{}_{}'.format(loopId, depth)
+            endTable = versionTable(varTable)
+            changedVars = []
+            for symbol, _, endCount in VERSION_LOG.changedSince(startMark, funcScope):
+                newVersion(symbol)
+                changedVars.append((SYMBOLS.levels[symbol], SYMBOLS.names[symbol], SYMBOLS.counts[symbol]))
+                additionalSMT.append(TERMS.mk('implies', TERMS.boolVar(literal),
+                    TERMS.mk('==', SYMBOLS.term(symbol), SYMBOLS.term(symbol, endCount))))
+
+            loopRecord.update({'resumable': True, 'level': level,
+                'literal': literal, 'endTable': endTable, 'changed': changedVars})
+
+        whileCount.append(loopRecord)
+
+        return TERMS.true()
 
     elif isinstance(ast, nodes.Identifier):
-        lookupName = funcScope + ast.name
-        levelFound, index = fn_lookup(lookupName, varTable, funcTable, level, flag=incFlag, funcScope=funcScope)
-        if funcScope == '':
-            retStr = '{}{}_{}'.format(lookupName, levelFound, index)
-        else:
-            retStr = '{}{}_{}_{{nInvoke}}'.format(lookupName, levelFound, index)
-        
-        return retStr
+        # The level the resolver bound this node to saves walking the levels
+        symbol = fn_lookup(funcScope + ast.name, varTable, funcTable, level, funcScope, SCOPE_LEVELS.get(id(ast)))
+        if incFlag == 1:
+            newVersion(symbol)
+        return SYMBOLS.term(symbol)
 
     elif isinstance(ast, nodes.Literal):
-        return ast.raw
+        # Only integers are supported, as 32-bit bitvectors
+        if isinstance(ast.value, bool) or not isinstance(ast.value, (int, float)) or ast.value != int(ast.value):
+            print ('Uh-oh. Unhandled literal {} in printSMT'.format(ast.raw))
+            exit(-1)
+        return TERMS.const(int(ast.value))
     else:
-        return ''
+        return None
+
+def unrollWhileIteration(ast, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll):
+    # One unrolled iteration of a WhileStatement, as an if without else:
+    #   (cond -> body) ^ (!cond -> vars keep their state)
+
+    # Snapshot of the version journal
+    mark = VERSION_LOG.mark()
+
+    condExpr = printSMT(ast.test, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+    PATH_CONDITIONS.append(TERMS.asBool(condExpr))
+    bodyExpr = printSMT(ast.body, varTable, level, funcScope, funcTable, additionalSMT, incFlag, whileCount, loopUnroll)
+    PATH_CONDITIONS.pop()
+
+    # Just do the same thing as IfStatement...
+    # FIXME: Need to add finished_loop_N
+    bodyExpr = TERMS.true() if bodyExpr is None else bodyExpr
+    thenExpr = TERMS.mk('implies', condExpr, bodyExpr)
+
+    connectExpr = connectChanged(VERSION_LOG.changedSince(mark, funcScope))
+
+    # If condition not true, we need to maintain variable state
+    connectExpr = TERMS.true() if connectExpr is None else connectExpr
+    maintainExpr = TERMS.mk('implies', TERMS.mk('not', condExpr), connectExpr)
+
+    return TERMS.mk('and', thenExpr, maintainExpr)
+
+def unwindingAssertion(loopRecord, depth, varTable, level, funcTable, additionalSMT, whileCount, loopUnroll):
+    # Literal equivalent to the loop condition failing in the current state,
+    # where the loop is reached at all
+    literal = 'unwind{}_{}'.format(loopRecord['id'], depth)
+    runningExpr = printSMT(loopRecord['ast'].test, varTable, level, '', funcTable, additionalSMT, 0, whileCount, loopUnroll)
+    runningExpr = TERMS.mk('and', loopRecord['guard'], TERMS.asBool(runningExpr))
+    additionalSMT.append(TERMS.mk('==', TERMS.boolVar(literal), TERMS.mk('not', runningExpr)))
+    return literal
+
+def triangular(k):
+    # k*(k+1)/2, halving whichever factor is even so the division is exact
+    kNext = TERMS.mk('+', k, TERMS.const(1))
+    one = TERMS.const(1)
+    return TERMS.mk('ite', TERMS.mk('==', TERMS.mk('&', k, one), TERMS.const(0)),
+                    TERMS.mk('*', TERMS.mk('>>>', k, one), kNext), TERMS.mk('*', k, TERMS.mk('>>>', kNext, one)))
+
+def closedForm(poly, k, entryTerms):
+    sumExpr = None
+    for (power, name), coef in sorted(poly.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+        if coef == 0:
+            continue
+        base = (TERMS.const(1), k, triangular(k) if power == 2 else None)[power]
+        if name is not None:
+            base = entryTerms[name] if power == 0 else TERMS.mk('*', entryTerms[name], base)
+        termExpr = base if coef == 1 else TERMS.mk('*', TERMS.const(coef), base)
+        sumExpr = termExpr if sumExpr is None else TERMS.mk('+', sumExpr, termExpr)
+    return TERMS.const(0) if sumExpr is None else sumExpr
+
+def summarizeLoop(ast, shape, number, varTable, level, funcTable, additionalSMT, whileCount, loopUnroll):
+    # A global-scope loop with closed forms runs loopCount times: its
+    # condition held after loopCount-1 iterations and fails after loopCount
+    entryTerms = {}
+    for name in shape.names:
+        entryTerms[name] = SYMBOLS.term(fn_lookup(name, varTable, funcTable, level))
+    iterations = TERMS.var('loopCount{}'.format(VERSION_LOG.mark()))
+    clauses = []
+
+    def conditionAfter(k):
+        # Fresh versions of the written variables hold their value after k iterations
+        values = {}
+        for name in shape.assigned:
+            value = closedForm(shape.forms[name], k, entryTerms)
+            if name in shape.setVars:
+                value = TERMS.mk('ite', TERMS.mk('==', k, TERMS.const(0)), entryTerms[name], value)
+            values[name] = value
+        for name in shape.assigned:
+            symbol = fn_lookup(name, varTable, funcTable, level)
+            newVersion(symbol)
+            clauses.append(TERMS.mk('==', SYMBOLS.term(symbol), values[name]))
+        return TERMS.asBool(printSMT(ast.test, varTable, level, '', funcTable, additionalSMT, 0, whileCount, loopUnroll))
+
+    # With the entry values within the bounds of the shape nothing overflows
+    # up to iterationBound, and a run done by then is done after exactly
+    # loopCount iterations.  Whether the run is, is a literal solved under as
+    # an assumption like an unwinding assertion; a run outside the bounds
+    # unrolls the loop instead (see unwindingResult, judgeModel)
+    bounds = []
+    for name in sorted(shape.names):
+        bounds.append(TERMS.mk('>=', entryTerms[name], TERMS.const(-shape.entryBound)))
+        bounds.append(TERMS.mk('<=', entryTerms[name], TERMS.const(shape.entryBound)))
+    bounds.append(TERMS.mk('not', conditionAfter(TERMS.const(shape.iterationBound))))
+    loopId = len(whileCount)
+    literal = 'bounded{}'.format(loopId)
+    guard = TERMS.conj(PATH_CONDITIONS)
+    additionalSMT.append(TERMS.mk('==', TERMS.boolVar(literal), TERMS.mk('implies', guard, TERMS.conj(bounds))))
+    clauses.append(TERMS.mk('implies', TERMS.boolVar(literal), TERMS.mk('<=', iterations, TERMS.const(shape.iterationBound))))
+    # The literal as a number for the python check of a model read from a solver's output
+    inBounds = 'inBounds{}'.format(loopId)
+    additionalSMT.append(TERMS.mk('==', TERMS.var(inBounds), TERMS.asBV(TERMS.boolVar(literal))))
+    pyCondStr = '{} == 0'.format(inBounds)
+    # Depth 0, the loop isn't unrolled at all yet
+    whileCount.append({'check': pyCondStr, 'resumable': False, 'id': loopId, 'ast': ast, 'number': number, 'depth': 0,
+                       'guard': guard, 'unwind': literal})
+    CHECK_LOOPS[pyCondStr] = (number, 0)
+
+    # The condition can only hold on one run of iterations, the one starting
+    # at the first: a loop whose condition fails on entry doesn't run at all
+    heldFirst = conditionAfter(TERMS.const(0))
+    heldBefore = conditionAfter(TERMS.mk('-', iterations, TERMS.const(1)))
+    # The last versions are the ones the code after the loop reads
+    holdsAtExit = conditionAfter(iterations)
+    clauses.append(TERMS.mk('>=', iterations, TERMS.const(0)))
+    clauses.append(TERMS.mk('not', holdsAtExit))
+    clauses.append(TERMS.mk('or', TERMS.mk('==', iterations, TERMS.const(0)), heldFirst))
+    clauses.append(TERMS.mk('or', TERMS.mk('==', iterations, TERMS.const(0)), heldBefore))
+    return TERMS.conj(clauses)
+
+def deepenLoop(loopRecord, newDepth, highTable, funcTable, whileCount):
+    """
+    Append the iterations loopRecord['depth']+1 .. newDepth to an already
+    translated global-scope loop.  Only new clauses are returned, everything
+    asserted for the shallower depth stays valid.
+        highTable: highest SSA counter handed out so far for every variable,
+                   updated in place so new versions never collide
+    """
+    endTable = loopRecord['endTable']
+    level = loopRecord['level']
+    additionalSMT = []
+
+    # Continue from the state at the end of the last unrolled iteration, with
+    # fresh versions above anything used by the code after the loop
+    resumeTable = {}
+    for lvl in endTable.keys():
+        resumeTable[lvl] = {}
+        for varName, endCount in endTable[lvl].items():
+            newCount = max(highTable.get(lvl, {}).get(varName, 0), endCount) + 1
+            symbol = SYMBOLS.intern(varName, lvl, '', newCount)
+            resumeTable[lvl][varName] = symbol
+            additionalSMT.append(TERMS.mk('==', SYMBOLS.term(symbol), SYMBOLS.term(symbol, endCount)))
+
+    for i in range(newDepth - loopRecord['depth']):
+        combinedExpr = unrollWhileIteration(loopRecord['ast'], resumeTable, level, '', funcTable, additionalSMT, 0, whileCount, newDepth)
+        additionalSMT.append(combinedExpr)
+
+    literal = 'unroll{}_{}'.format(loopRecord['id'], newDepth)
+    for lvl, varName, exitCount in loopRecord['changed']:
+        additionalSMT.append(TERMS.mk('implies', TERMS.boolVar(literal),
+            TERMS.mk('==', SYMBOLS.term(resumeTable[lvl][varName], exitCount), SYMBOLS.term(resumeTable[lvl][varName]))))
+
+    loopRecord['check'] = printCondPython(loopRecord['ast'].test, resumeTable, level, '', funcTable)
+    CHECK_LOOPS[loopRecord['check']] = (loopRecord['number'], newDepth)
+    if 'unwind' in loopRecord:
+        loopRecord['unwind'] = unwindingAssertion(loopRecord, newDepth, resumeTable, level, funcTable, additionalSMT, whileCount, newDepth)
+    loopRecord['endTable'] = versionTable(resumeTable)
+    loopRecord['depth'] = newDepth
+    loopRecord['literal'] = literal
+
+    for lvl in loopRecord['endTable'].keys():
+        highLevel = highTable.setdefault(lvl, {})
+        for varName, count in loopRecord['endTable'][lvl].items():
+            highLevel[varName] = max(highLevel.get(varName, 0), count)
+
+    return additionalSMT
 
 def writeSMTCheckScript(fileHandle):
     text = """
-def representsInt(s):
-    try: 
-        int(s)
-        return True
-    except ValueError:
-        return False
-
 if DEBUG_MODE:
     print ('SMT Expression: ')
     print (s.sexpr())
@@ -533,8 +912,8 @@ if s.check() == sat:
         print (smtModel)
 
     smtModelDict = {}
-    for index, item in enumerate(smtModel):
-        smtModelDict[str(item)] = smtModel[item].as_long()
+    for smtVarName, smtVar in bitVecs.items():
+        smtModelDict[smtVarName] = smtModel.eval(smtVar, model_completion=True).as_signed_long()
 
     for _, varTuple in enumerate(connectingVars):
         var, ppVar = varTuple[0], varTuple[1]
@@ -544,12 +923,9 @@ if s.check() == sat:
 
     # Check for under-unrolled
     for item in whileChecks:
-        for smtVarName in [ x.strip() for x in re.split(OPERATOR_STR, item) if x.strip() != '']:
-            if not representsInt(smtVarName) and smtVarName not in ['and', 'or', 'not']:
-                item = item.replace(smtVarName, str(smtModelDict[smtVarName]))
         # If item is True, then we didn't unroll enough
         # return True so we can rerun
-        if eval(item):
+        if eval(item, {'jsRem': jsRem, 'jsUshr': jsUshr}, smtModelDict):
             # returncode 2 for need more unroll
             exit(2)
     
@@ -563,33 +939,263 @@ else:
     """
     fileHandle.write(text + '\n')
 
-def main(program, loopUnroll=5, insertFake=True, fileName=None):
-    OPERATOR_STR = '==|\+|-|\*|/|\(|\)|And|Implies|Or|Not|,|>|>=|<|<=|!='
-    
-    fileHandle = open(fileName, 'w')
-    fileHandle.write('import re\n')
-    fileHandle.write('from z3 import *\n')
-    fileHandle.write('DEBUG_MODE = {}\n'.format(DEBUG_MODE))
-    fileHandle.write('OPERATOR_STR = "{}"\n'.format(OPERATOR_STR))
-    fileHandle.write('s = Solver()\n')
+class SMTResult:
+    """
+    Outcome of an equivalence query
+        verdict: 'unsat' (equivalent), 'sat' (mismatch) or 'unroll' (need more unroll)
+        mismatches: list of (var, value, ppVar, ppValue) from the model
+        model: dict of SSA variable name -> signed value, empty when unsat
+               (the input values when random testing found the mismatch)
+        timings: seconds spent per phase ('parse', 'translate', 'prepack', 'solve')
+        unrollDepth: loop unroll depth the verdict was reached at
+        unrollLoops: loop number -> depth of the loops that need more unrolling,
+                     None for a loop of unknown number, 0 for a summarized loop
+                     that has to be unrolled after all
+        stats: size of the formula, distinct term nodes and construction requests,
+               what simplification removed, the portfolio configuration that solved it,
+               and whether concrete evaluation or random testing decided without a formula,
+               the number of sliced queries, the variables narrowed and the bits it saved
+    """
+
+    def __init__(self, verdict, mismatches=None, model=None):
+        self.verdict = verdict
+        self.mismatches = mismatches if mismatches is not None else []
+        self.model = model if model is not None else {}
+        self.timings = {}
+        self.unrollDepth = LOOP_UNROLL_DEPTH
+        self.unrollLoops = {}
+        self.stats = {}
+
+    def __repr__(self):
+        return 'SMTResult({}, mismatches={})'.format(self.verdict, self.mismatches)
+
+def addClauses(s, builder, clauses):
+    # Convert the clause terms to z3, every node shared with earlier clauses
+    # (or the other encoding) is reused from the builder's memo
+    builder.declareSymbols(TERMS.symbols)
+    for guard in builder.guards:
+        s.add(guard)
+    builder.guards = []
+    with profiled('assert'):
+        for clause in clauses:
+            s.add(builder.convert(clause))
+    profileCount('assertedClauses', len(clauses))
+
+def checkSolver(s, builder, connectingVars, whileChecks, assumptions=None, unwinding=None):
+    """
+    Solve under assumptions and the unwinding assertions
+        whileChecks: under-unroll checks of the loops without an unwinding assertion
+        unwinding: (loop number, depth, literal) of every unwinding assertion
+    """
+    assumptions = assumptions if assumptions is not None else []
+    unwinding = unwinding if unwinding is not None else []
 
-    variableLookup = {}
-    # print(esprima.tokenize(program))
-    parsedTree = esprima.parseScript(program)
     if DEBUG_MODE:
-        print (parsedTree)
+        print ('SMT Expression: ')
+        print (s.sexpr())
 
-    print ('Parsing original program')
-    SMTExpr, whileChecks = printSMT(parsedTree, varTable=variableLookup, level=0, loopUnroll=loopUnroll)
+    with profiled('check'):
+        satisfied = s.check(*(assumptions + [literal for _, _, literal in unwinding])) == z3.sat
+    profileCount('checks')
+    if PROFILE is not None:
+        PROFILE.solverStatistics(s.statistics())
+    if not satisfied:
+        return unwindingResult(s, assumptions, unwinding)
+
+    smtModel = s.model()
     if DEBUG_MODE:
-        # print (variableLookup)
-        print (SMTExpr)
-        print ()
+        print (smtModel)
 
-    # Execute prepack
-    prepackLookup = {}
-    prepackProgramByte = subprocess.check_output(['prepack', programFile])
+    smtModelDict = builder.modelValues(smtModel)
+    return judgeModel(smtModelDict, connectingVars, whileChecks)
+
+def unwindingResult(s, assumptions, unwinding):
+    # No mismatch with every loop done within its depth.  Of the loops in the
+    # unsat core, the ones that can still be running on a mismatching run need
+    # more iterations; a loop done within its depth on every run is left alone
+    if not unwinding:
+        return SMTResult('unsat')
+    core = set(literal.get_id() for literal in s.unsat_core())
+    unrollLoops = {}
+    for number, depth, literal in unwinding:
+        if literal.get_id() not in core or depth <= unrollLoops.get(number, -1):
+            continue
+        if s.check(*(assumptions + [z3.Not(literal)])) == z3.sat:
+            unrollLoops[number] = depth
+    unrollLoops = summariesLast(unrollLoops)
+    if not unrollLoops:
+        return SMTResult('unsat')
+
+    # A later loop can be missing from the core only because an earlier one
+    # being done within its depth already rules out every run.  If it can run
+    # past its own depth it is deepened in the same round instead of the next
+    # ones, at the price of deepening some loops that turn out not to need it.
+    # Summaries (depth 0) are only given up on when their own bounds block
+    first = min(unrollLoops)
+    for number, depth, literal in unwinding:
+        if number <= first or depth == 0 or depth <= unrollLoops.get(number, -1):
+            continue
+        if s.check(*(assumptions + [z3.Not(literal)])) == z3.sat:
+            unrollLoops[number] = depth
+    smtResult = SMTResult('unroll')
+    smtResult.unrollLoops = unrollLoops
+    return smtResult
+
+def summariesLast(unrollLoops):
+    # Summaries (depth 0) are only given up on once no unrolled loop needs more
+    # iterations, the runs an under-unrolled loop cuts short enter the later
+    # loops with any values
+    if any(depth != 0 for depth in unrollLoops.values()):
+        return {number: depth for number, depth in unrollLoops.items() if depth != 0}
+    return unrollLoops
+
+def judgeModel(smtModelDict, connectingVars, whileChecks):
+    # Result for a satisfying assignment: the mismatching globals, or
+    # 'unroll' when a loop could still run past the unrolled iterations
+    mismatches = []
+    for var, ppVar in connectingVars:
+        varVal, ppVarVal = smtModelDict[var], smtModelDict[ppVar]
+        if varVal != ppVarVal:
+            mismatches.append((var, varVal, ppVar, ppVarVal))
 
+    # Check for under-unrolled, whileChecks are python conditions over SSA names
+    unrollLoops = {}
+    for item in whileChecks:
+        # If item is True, then we didn't unroll enough
+        if eval(item, dict(CHECK_FUNCS), dict(smtModelDict)):
+            number, depth = CHECK_LOOPS.get(item, (None, LOOP_UNROLL_DEPTH))
+            unrollLoops[number] = max(depth, unrollLoops.get(number, 0))
+    unrollLoops = summariesLast(unrollLoops)
+    if unrollLoops:
+        smtResult = SMTResult('unroll', mismatches, smtModelDict)
+        smtResult.unrollLoops = unrollLoops
+        return smtResult
+
+    return SMTResult('sat', mismatches, smtModelDict)
+
+def solveContext(query, connectingVars, whileChecks):
+    # Check a (solver, builder) of its own z3 context, from a worker thread:
+    # unlike checkSolver nothing here touches the profile
+    s, builder = query
+    if s.check() != z3.sat:
+        return SMTResult('unsat')
+    return judgeModel(builder.modelValues(s.model()), connectingVars, whileChecks)
+
+def solveInProcess(clauses, connectingVars, whileChecks):
+    builder = Z3Builder()
+    s = z3.Solver()
+    addClauses(s, builder, clauses)
+    return checkSolver(s, builder, connectingVars, whileChecks)
+
+def inferRanges(clauses):
+    # RangeAnalysis of the clauses and the variables it lets NARROW_WIDTHS declare narrower
+    analysis = RangeAnalysis(clauses, TERMS.symbols)
+    analysis.run()
+    widths = narrowWidths(analysis.ranges) if NARROW_WIDTHS else {}
+    return analysis, widths
+
+def checkNames(whileChecks):
+    # SSA names the loop checks read, besides the helpers in CHECK_FUNCS
+    names = []
+    for item in whileChecks:
+        names += [name for name in compile(item, '<whileCheck>', 'eval').co_names if name not in CHECK_FUNCS]
+    return names
+
+def solveStream(smtStream, connectingVars, whileChecks):
+    # Solve the streamed file, asking only for the values the verdict depends on
+    names = []
+    for var, ppVar in connectingVars:
+        names += [var, ppVar]
+    names = [name for name in dict.fromkeys(names + checkNames(whileChecks)) if name in smtStream.declared]
+
+    if SOLVER_PORTFOLIO is not None:
+        verdict, values, winner = solvePortfolio(smtStream.fileName, names, SOLVER_PORTFOLIO)
+        print ('Solved by {}'.format(winner))
+    else:
+        verdict, values = solveFile(smtStream.fileName, names)
+        winner = None
+    if verdict == 'unknown':
+        print ('Uh-oh. Solver returned unknown for {}'.format(smtStream.fileName))
+        exit(-1)
+    if verdict != 'sat':
+        smtResult = SMTResult('unsat')
+    else:
+        # Variables the formula never mentions are unconstrained, like model_completion
+        smtModelDict = dict.fromkeys(checkNames(whileChecks) + [name for pair in connectingVars for name in pair], 0)
+        smtModelDict.update(values)
+        smtResult = judgeModel(smtModelDict, connectingVars, whileChecks)
+
+    if winner is not None:
+        smtResult.stats['solver'] = winner
+    return smtResult
+
+def dumpSMTCheckScript(fileName, clauses, connectingVars, whileChecks, boolVars=None):
+    # Debug dump of the query as a standalone z3 script, not used for solving
+    # boolVars are unroll literals, asserted so the script checks the current depth
+    boolVars = boolVars if boolVars is not None else []
+    # One assignment per distinct node, so shared subterms are written once
+    termLines, clauseNames = toPython(clauses)
+
+    with open(fileName, 'w') as fileHandle:
+        fileHandle.write('import math\n')
+        fileHandle.write('from z3 import *\n')
+        fileHandle.write('DEBUG_MODE = {}\n'.format(DEBUG_MODE))
+        for checkFunc in CHECK_FUNCS.values():
+            fileHandle.write(inspect.getsource(checkFunc))
+        fileHandle.write('s = Solver()\n')
+        fileHandle.write('bitVecs = {}\n')
+        # Every variable was registered with its sort when it was created
+        for smtVarName, sort in TERMS.symbols.items():
+            if sort == 'bool':
+                fileHandle.write("{} = Bool('{}')\n".format(smtVarName, smtVarName))
+            else:
+                fileHandle.write("{} = bitVecs['{}'] = BitVec('{}', 32)\n".format(smtVarName, smtVarName, smtVarName))
+        for line in termLines:
+            fileHandle.write(line + '\n')
+        for clauseName in clauseNames:
+            fileHandle.write('s.add({})\n'.format(clauseName))
+        for boolVarName in boolVars:
+            fileHandle.write('s.add({})\n'.format(boolVarName))
+        fileHandle.write('connectingVars = {}\n'.format(connectingVars))
+        fileHandle.write('whileChecks = {}\n'.format(whileChecks))
+        writeSMTCheckScript(fileHandle)
+
+def spawnPrepack(programFile):
+    global PREPACK_POOL
+    if PREPACK_POOL is not None:
+        try:
+            return PREPACK_POOL.run(programFile)
+        except PrepackTimeout:
+            raise
+        except PrepackWorkerError as e:
+            # Usually the prepack module can't be required from node,
+            # the command line tool may still work
+            print ('Prepack worker unavailable ({}), running prepack directly'.format(e))
+            PREPACK_POOL.close()
+            PREPACK_POOL = None
+    return subprocess.check_output(['prepack', programFile])
+
+def workerVersion():
+    # Prepack version of the resident workers, None when prepack is run directly
+    global PREPACK_POOL
+    if PREPACK_POOL is None:
+        return None
+    try:
+        return PREPACK_POOL.version()
+    except PrepackWorkerError as e:
+        print ('Prepack worker unavailable ({}), running prepack directly'.format(e))
+        PREPACK_POOL.close()
+        PREPACK_POOL = None
+        return None
+
+def runPrepack(programFile):
+    if PREPACK_CACHE is None:
+        return spawnPrepack(programFile)
+    # The workers' output is keyed by the module they loaded, not the prepack executable
+    return PREPACK_CACHE.run(programFile, runner=spawnPrepack, version=workerVersion())
+
+def prepackSource(prepackProgramByte, insertFake):
+    # Prepack's output as a program over pp-prefixed globals
     prepackProgram = ''
     checkSeenVar = {}
     for line in prepackProgramByte.decode().strip().split('\n'):
@@ -603,95 +1209,998 @@ def main(program, loopUnroll=5, insertFake=True, fileName=None):
 
     if insertFake:
         prepackProgram += 'ppy = 100;\n'
+    return prepackProgram
 
-    prepackTree = esprima.parseScript(prepackProgram)
-    print ('Parsing prepack output')
-    prepackSMT, _ = printSMT(prepackTree, varTable=prepackLookup, level=0)
-    if DEBUG_MODE:
-        print (prepackSMT)
-        print ()
-
-    # SMT?
-    # Generate original variables (directly from SMTExpr)
-    seenVar = {}
-    for clause in SMTExpr.split('^'):
-        # ex. ['(ajasd==asd)', '(quiwe==zxc)', (AND(x1, x2) )]
-        # tempStr = clause.replace('(', '').replace(')', '')
-        tempStr = re.sub('\s', '', clause)
-        # FIXME: Need to consider other operators as well
-        for smtVarName in [ x for x in re.split(OPERATOR_STR, tempStr) if x != '']:
-            if smtVarName not in seenVar and not representsInt(smtVarName):
-                seenVar[smtVarName] = True
-                # print("{} = BitVec('{}', 32)".format(smtVarName, smtVarName))
-                fileHandle.write("{} = BitVec('{}', 32)\n".format(smtVarName, smtVarName))
-                # exec("{} = BitVec('{}', 32)".format(smtVarName, smtVarName))
-
-    # Generate prepack variables
-    for clause in prepackSMT.split('^'):
-        # ex. ['(ajasd==asd)', '(quiwe==zxc)']
-        # tempStr = clause.replace('(', '').replace(')', '')
-        tempStr = re.sub('\s', '', clause)
-        # FIXME: Need to consider other operators as well
-        for smtVarName in [ x for x in re.split(OPERATOR_STR, tempStr) if x != '']:
-            if smtVarName not in seenVar and not representsInt(smtVarName):
-                seenVar[smtVarName] = True
-                # print("{} = BitVec('{}', 32)".format(smtVarName, smtVarName))
-                fileHandle.write("{} = BitVec('{}', 32)\n".format(smtVarName, smtVarName))
-                # exec("{} = BitVec('{}', 32)".format(smtVarName, smtVarName))
-
-    # solver = Solver()
-    # Generate the add clauses for original program
-    for clause in SMTExpr.split('^'):
-        # print('s.add({})'.format(clause))
-        fileHandle.write('s.add({})\n'.format(clause))
-        # solver.add(eval(clause))
-
-    # Generate the add clauses for prepack program
-    for clause in prepackSMT.split('^'):
-        #print('s.add({})'.format(clause))
-        fileHandle.write('s.add({})\n'.format(clause))
-        # solver.add(eval(clause))
-
+def compareGlobals(variableLookup, prepackLookup):
+    """
+    The goal, some global differs at the end, and the (var, ppVar) pairs it compares
+    """
     # We are assuming the global variables are defined at level 0
     # And only the state of global variables matters
-    concatStr = 'And('
+    compareExprs = []
     connectingVars = []
-    for varName in variableLookup[0].keys():
+    for varName, programSymbol in variableLookup[0].items():
         # We prepended prepack variables with pp...
-        prepackIndex = prepackLookup[0]['pp' + varName]
-        programIndex = variableLookup[0][varName]
-        programVarName = '{}{}_{}'.format(varName, 0, programIndex)
-        prepackVarName = 'pp{}{}_{}'.format(varName, 0, prepackIndex)
-        compareClause = '({}=={})'.format(programVarName, prepackVarName)
-        concatStr = concatStr + compareClause + ','
+        prepackSymbol = prepackLookup[0]['pp' + varName]
+        programVarName = SYMBOLS.ssaName(programSymbol)
+        prepackVarName = SYMBOLS.ssaName(prepackSymbol)
+        compareExprs.append(TERMS.mk('==', SYMBOLS.term(programSymbol), SYMBOLS.term(prepackSymbol)))
         connectingVars.append((programVarName, prepackVarName))
 
-    concatStr = 'Not(' + concatStr[:-1] + '))'
-    # print (concatStr)
-    fileHandle.write('s.add({})\n'.format(concatStr))
-    # solver.add(eval(concatStr))
+    return TERMS.mk('not', TERMS.conj(compareExprs)), connectingVars
 
-    # if DEBUG_MODE:
-    #     print ('SMT Expression: ')
-    #     print (solver.sexpr())
+def main(program, loopUnroll=5, insertFake=True, fileName=None, incremental=False, programFile='simple_script.js', prepackOutput=None,
+         smtFile=None, cacheKeys=None):
+    """
+    Check program against its prepack output once, at the current LOOP_UNROLL_DEPTH
+        prepackOutput: prepack's output for program, prepack is run when None
+        smtFile: stream the formula to this SMT-LIB2 file (.gz/.xz compressed) and solve from it
+        cacheKeys: VERDICT_CACHE keys the result goes under, the formula's is
+                   looked up and added when given
+    """
+    global INCREMENTAL_MODE, TERMS, SMT_STREAM, LOOP_BOUNDS, LOOP_NUMBERS, CHECK_LOOPS, VERSION_LOG, SYMBOLS, SCOPE_LEVELS
+    loadBackends()
+    # A formula solved from a file is solved in one go, deeper unrolls start over
+    INCREMENTAL_MODE = incremental and smtFile is None and SOLVER_PORTFOLIO is None
+    TERMS = TermTable()
+    SYMBOLS = SymbolTable(TERMS)
+    SCOPE_LEVELS = {}
+    timings = {'parse': 0.0, 'translate': 0.0, 'prepack': 0.0, 'solve': 0.0}
+    if PROFILE is not None:
+        PROFILE.beginRound(unrollDepth=loopUnroll, loopDepths=dict(LOOP_DEPTHS))
 
-    print ('SMT Result: ')
+    variableLookup = {}
+    functionLookup = {}
+    VERSION_LOG = VersionLog()
+    startTime = time.perf_counter()
+    # print(esprima.tokenize(program))
+    with profiled('parse'):
+        parsedTree = esprima.parseScript(program)
+    if DEBUG_MODE:
+        print (parsedTree)
+    timings['parse'] += time.perf_counter() - startTime
 
-    fileHandle.write('connectingVars = {}\n'.format(connectingVars))
-    fileHandle.write('whileChecks = {}\n'.format(whileChecks))
-    writeSMTCheckScript(fileHandle)
-    fileHandle.flush()
-    smtResult = subprocess.run(['python', fileName])
-    
-    if smtResult.returncode == 1:
+    # Execute prepack
+    prepackLookup = {}
+    startTime = time.perf_counter()
+    if prepackOutput is None:
+        with profiled('prepack'):
+            prepackProgramByte = runPrepack(programFile)
+    else:
+        prepackProgramByte = prepackOutput if isinstance(prepackOutput, bytes) else prepackOutput.encode()
+    timings['prepack'] += time.perf_counter() - startTime
+
+    prepackProgram = prepackSource(prepackProgramByte, insertFake)
+
+    startTime = time.perf_counter()
+    with profiled('parse'):
+        prepackTree = esprima.parseScript(prepackProgram)
+    timings['parse'] += time.perf_counter() - startTime
+
+    # Programs without free inputs just run, the formula is only built when that fails
+    if CONCRETE_STEPS > 0:
+        startTime = time.perf_counter()
+        with profiled('evaluate'):
+            smtResult = checkConcrete(parsedTree, prepackTree)
+        timings['evaluate'] = time.perf_counter() - startTime
+        if smtResult is not None:
+            return finishResult(smtResult, timings)
+
+    # Most broken prepack outputs differ on some random input, the solver is only needed to prove equivalence
+    if RANDOM_LANES > 0 and numpyAvailable():
+        startTime = time.perf_counter()
+        with profiled('random'):
+            smtResult = checkRandom(parsedTree, prepackTree)
+        timings['random'] = time.perf_counter() - startTime
+        if smtResult is not None:
+            return finishResult(smtResult, timings)
+
+    SMT_STREAM = SMTLibStream(smtFile) if smtFile else None
+
+    LOOP_BOUNDS = {}
+    if BOUND_LOOPS:
+        startTime = time.perf_counter()
+        with profiled('bounds'):
+            LOOP_BOUNDS = loopBounds(parsedTree)
+        timings['bounds'] = time.perf_counter() - startTime
+        if LOOP_BOUNDS:
+            bounded = [bound for bound in LOOP_BOUNDS.values() if bound is not None]
+            print ('Bounded {} of {} loops statically: {}'.format(len(bounded), len(LOOP_BOUNDS), bounded))
+
+    LOOP_NUMBERS = loopNumbers(parsedTree)
+    CHECK_LOOPS = {}
+    # Both trees stay alive until the check is done, so their node ids stay theirs
+    startTime = time.perf_counter()
+    with profiled('resolve'):
+        SCOPE_LEVELS = ScopeResolver().resolve(parsedTree)
+        SCOPE_LEVELS.update(ScopeResolver().resolve(prepackTree))
+    timings['translate'] += time.perf_counter() - startTime
+    del PATH_CONDITIONS[:]
+
+    print ('Parsing original program')
+    startTime = time.perf_counter()
+    with profiled('translate'):
+        SMTExpr, loopRecords = printSMT(parsedTree, varTable=variableLookup, level=0, funcTable=functionLookup, loopUnroll=loopUnroll)
+    if DEBUG_MODE:
+        # print (variableLookup)
+        print (SMTExpr)
+        print ()
+    timings['translate'] += time.perf_counter() - startTime
+
+    print ('Parsing prepack output')
+    startTime = time.perf_counter()
+    with profiled('translate'):
+        prepackSMT, _ = printSMT(prepackTree, varTable=prepackLookup, level=0)
+    timings['translate'] += time.perf_counter() - startTime
+    if DEBUG_MODE:
+        print (prepackSMT)
+        print ()
+
+    # Clauses for original program, then prepack program
+    clauses = SMTExpr + prepackSMT
+    profileCount('clauses', len(clauses))
+
+    with profiled('globals'):
+        goal, connectingVars = compareGlobals(variableLookup, prepackLookup)
+    whileChecks = [loopRecord['check'] for loopRecord in loopRecords]
+
+    if cacheKeys is not None and SMT_STREAM is None:
+        # The streamed formula is gone already, only what is left of it could be hashed
+        formulaKey = VERDICT_CACHE.formulaKey(clauses + [goal], connectingVars, whileChecks)
+        record = VERDICT_CACHE.get(formulaKey)
+        if record is not None:
+            return cachedResult(record, 'formula')
+        cacheKeys.append(formulaKey)
+
+    if SMT_STREAM is not None:
+        # Most of the formula is already written, there is nothing left to simplify
+        print ('SMT Result: ')
+        startTime = time.perf_counter()
+        with profiled('assert'):
+            for clause in clauses + [goal]:
+                SMT_STREAM.assertTerm(clause)
+            SMT_STREAM.close()
+        with profiled('check'):
+            smtResult = solveStream(SMT_STREAM, connectingVars, whileChecks)
+        timings['solve'] += time.perf_counter() - startTime
+        SMT_STREAM = None
+        return finishResult(smtResult, timings)
+
+    # Deepening and --dump work on the whole formula
+    if SLICE_WORKERS > 0 and not INCREMENTAL_MODE and not fileName:
+        startTime = time.perf_counter()
+        with profiled('slice'):
+            slices, dropped = sliceQuery(clauses, connectingVars, whileChecks, lambda check: checkNames([check]))
+        timings['slice'] = time.perf_counter() - startTime
+        if len(slices) > 1:
+            print ('Sliced into {} queries, {} clauses outside every cone'.format(len(slices), dropped))
+            return solveSlices(slices, timings)
+        if dropped:
+            print ('Sliced away {} clauses outside the cone'.format(dropped))
+            clauses, whileChecks = slices[0].clauses, slices[0].whileChecks
+            # Unwinding assertions of the dropped loops are gone, their literals would be free
+            loopRecords = [loopRecord for loopRecord in loopRecords if loopRecord['check'] in whileChecks]
+    clauses.append(goal)
+
+    simplifier = None
+    if SIMPLIFY:
+        startTime = time.perf_counter()
+        keepNames = [name for pair in connectingVars for name in pair] + checkNames(whileChecks)
+        # Deeper unrolls read variables of the current formula, so keep every definition then
+        simplifier = Simplifier(TERMS, keepNames, dropDead=not INCREMENTAL_MODE)
+        with profiled('simplify'):
+            clauses = simplifier.run(clauses)
+        timings['simplify'] = time.perf_counter() - startTime
+        print ('Simplified: removed {} variables and {} clauses'.format(simplifier.removedVars, simplifier.removedClauses))
+
+    analysis, widths = None, {}
+    if NARROW_WIDTHS or INTEGER_ARITHMETIC:
+        startTime = time.perf_counter()
+        with profiled('widths'):
+            analysis, widths = inferRanges(clauses)
+        timings['widths'] = time.perf_counter() - startTime
+        if NARROW_WIDTHS:
+            print ('Narrowed {} variables, saving {} bits'.format(len(widths), savedBits(widths)))
+
+    if SOLVER_PORTFOLIO is not None:
+        # The portfolio solves from a file, written only now so it gets the simplified formula
+        print ('SMT Result: ')
+        startTime = time.perf_counter()
+        fd, tempSMTFile = tempfile.mkstemp(suffix='.smt2', prefix='verify-')
+        os.close(fd)
+        try:
+            smtStream = SMTLibStream(tempSMTFile, widths)
+            with profiled('assert'):
+                for clause in clauses:
+                    smtStream.assertTerm(clause)
+                smtStream.close()
+            with profiled('check'):
+                smtResult = solveStream(smtStream, connectingVars, whileChecks)
+        finally:
+            os.unlink(tempSMTFile)
+        timings['solve'] += time.perf_counter() - startTime
+        return finishResult(smtResult, timings, simplifier, widths)
+
+    integer = False
+    if INTEGER_ARITHMETIC:
+        blocker = integerBlocker(clauses)
+        if blocker is None:
+            print ('Solving over integers')
+            integer = True
+        else:
+            print ('Integer arithmetic has no exact {}, solving over bitvectors'.format(blocker))
+
+    print ('SMT Result: ')
+    startTime = time.perf_counter()
+    s = z3.Solver()
+    if integer:
+        builder = Z3Builder(integer=True, ranges=analysis.termRanges)
+    else:
+        builder = Z3Builder(widths)
+    addClauses(s, builder, clauses)
+    timings['solve'] += time.perf_counter() - startTime
+    # Highest SSA counter in use, deeper unrolls allocate above it
+    highTable = versionTable(variableLookup)
+
+    while True:
+        literals = [loopRecord['literal'] for loopRecord in loopRecords if loopRecord['resumable']]
+        if fileName:
+            dumpSMTCheckScript(fileName, clauses, connectingVars, whileChecks, literals)
+
+        # Loops with an unwinding assertion are checked by the solver, the rest by their python check
+        unwinding = [(loopRecord['number'], loopRecord['depth'], builder.declare(loopRecord['unwind'], boolean=True))
+                     for loopRecord in loopRecords if 'unwind' in loopRecord]
+        loopChecks = [loopRecord['check'] for loopRecord in loopRecords if 'unwind' not in loopRecord]
+        startTime = time.perf_counter()
+        smtResult = checkSolver(s, builder, connectingVars, loopChecks, [builder.declare(literal, boolean=True) for literal in literals],
+                                unwinding)
+        timings['solve'] += time.perf_counter() - startTime
+
+        # Without incremental mode, or with a summarized loop to unroll, the
+        # caller restarts from scratch with deeper unrolls
+        if smtResult.verdict != 'unroll' or not incremental:
+            break
+        deepened = [loopRecord for loopRecord in loopRecords if loopRecord['number'] in smtResult.unrollLoops]
+        if not deepened or not all(loopRecord['resumable'] for loopRecord in deepened):
+            break
+
+        # Keep the translation and the solver, only append the extra iterations
+        # of the loops that need them
+        newDepths = {number: depth * 2 or LOOP_UNROLL_DEPTH for number, depth in smtResult.unrollLoops.items()}
+        print ('sat, but need to unroll more')
+        print ()
+        print ('Increasing unroll depth of loops {}'.format(formatLoopDepths(newDepths)))
+        startTime = time.perf_counter()
+        newClauses = []
+        with profiled('deepen'):
+            for loopRecord in deepened:
+                newDepth = newDepths[loopRecord['number']]
+                if loopRecord['number'] is not None:
+                    LOOP_DEPTHS[loopRecord['number']] = max(newDepth, LOOP_DEPTHS.get(loopRecord['number'], 0))
+                if loopRecord['depth'] < newDepth:
+                    newClauses += deepenLoop(loopRecord, newDepth, highTable, functionLookup, loopRecords)
+            if simplifier is not None:
+                # Variables substituted away are substituted in the new iterations too
+                newClauses = [simplifier.rewrite(clause) for clause in newClauses]
+        timings['translate'] += time.perf_counter() - startTime
+        profileCount('deepenedLoops', len(deepened))
+        profileCount('clauses', len(newClauses))
+        addClauses(s, builder, newClauses)
+        clauses += newClauses
+        whileChecks = [loopRecord['check'] for loopRecord in loopRecords]
+
+    return finishResult(smtResult, timings, simplifier, widths)
+
+def solveSlices(slices, timings):
+    # Every slice gets its own solver, SLICE_WORKERS of them checking at a
+    # time: in-process, each in a z3 context of its own, or the portfolio's
+    # processes on a file.  The verdicts are combined: under-unrolled if any
+    # slice is, sat with the mismatches of all sat slices otherwise
+    queries = []
+    smtStreams = []
+    removedVars, removedClauses = 0, 0
+    sliceWidths = {}
+    integerSlices = 0
+    startTime = time.perf_counter()
+    try:
+        for slice in slices:
+            compareExprs = [TERMS.mk('==', TERMS.var(var), TERMS.var(ppVar)) for var, ppVar in slice.connectingVars]
+            clauses = slice.clauses + [TERMS.mk('not', TERMS.conj(compareExprs))]
+            if SIMPLIFY:
+                keepNames = [name for pair in slice.connectingVars for name in pair] + checkNames(slice.whileChecks)
+                simplifier = Simplifier(TERMS, keepNames)
+                with profiled('simplify'):
+                    clauses = simplifier.run(clauses)
+                removedVars += simplifier.removedVars
+                removedClauses += simplifier.removedClauses
+            analysis, widths = None, {}
+            if NARROW_WIDTHS or INTEGER_ARITHMETIC:
+                with profiled('widths'):
+                    analysis, widths = inferRanges(clauses)
+            sliceWidths.update(widths)
+
+            if SOLVER_PORTFOLIO is not None:
+                fd, tempSMTFile = tempfile.mkstemp(suffix='.smt2', prefix='verify-slice-')
+                os.close(fd)
+                smtStream = SMTLibStream(tempSMTFile, widths)
+                smtStreams.append(smtStream)
+                with profiled('assert'):
+                    for clause in clauses:
+                        smtStream.assertTerm(clause)
+                    smtStream.close()
+                queries.append(smtStream)
+            else:
+                # Built here, only checked in the worker threads
+                ctx = z3.Context()
+                s = z3.Solver(ctx=ctx)
+                if INTEGER_ARITHMETIC and integerBlocker(clauses) is None:
+                    integerSlices += 1
+                    builder = Z3Builder(integer=True, ranges=analysis.termRanges, ctx=ctx)
+                else:
+                    builder = Z3Builder(widths, ctx=ctx)
+                addClauses(s, builder, clauses)
+                queries.append((s, builder))
+        if SIMPLIFY:
+            print ('Simplified: removed {} variables and {} clauses'.format(removedVars, removedClauses))
+        if NARROW_WIDTHS:
+            print ('Narrowed {} variables, saving {} bits'.format(len(sliceWidths), savedBits(sliceWidths)))
+        if integerSlices:
+            print ('Solving {} of {} slices over integers'.format(integerSlices, len(slices)))
+
+        print ('SMT Result: ')
+        solve = solveStream if SOLVER_PORTFOLIO is not None else solveContext
+        with profiled('check'), ThreadPoolExecutor(max_workers=SLICE_WORKERS) as pool:
+            results = list(pool.map(solve, queries, [slice.connectingVars for slice in slices],
+                                    [slice.whileChecks for slice in slices]))
+        profileCount('checks', len(queries))
+    finally:
+        for smtStream in smtStreams:
+            os.unlink(smtStream.fileName)
+    timings['solve'] += time.perf_counter() - startTime
+
+    verdicts = [result.verdict for result in results]
+    smtResult = SMTResult('unroll' if 'unroll' in verdicts else 'sat' if 'sat' in verdicts else 'unsat')
+    for result in results:
+        smtResult.mismatches += result.mismatches
+        smtResult.model.update(result.model)
+        for number, depth in result.unrollLoops.items():
+            smtResult.unrollLoops[number] = max(depth, smtResult.unrollLoops.get(number, 0))
+    smtResult.stats['slices'] = len(slices)
+    winners = [result.stats['solver'] for result in results if 'solver' in result.stats]
+    if winners:
+        smtResult.stats['solver'] = max(set(winners), key=winners.count)
+    if SIMPLIFY:
+        smtResult.stats.update({'removedVars': removedVars, 'removedClauses': removedClauses})
+    return finishResult(smtResult, timings, widths=sliceWidths)
+
+def checkConcrete(parsedTree, prepackTree):
+    # SMTResult when both programs run to completion on their own, None when the SMT path has to decide
+    try:
+        values = evaluateScript(parsedTree, CONCRETE_STEPS)
+        ppValues = evaluateScript(prepackTree, CONCRETE_STEPS)
+    except ConcreteUnsupported as e:
+        print ('Concrete evaluation gave up ({}), solving symbolically'.format(e))
+        return None
+
+    mismatches = []
+    for varName, varVal in values.items():
+        ppVarVal = ppValues.get('pp' + varName, UNDEFINED)
+        if varVal is UNDEFINED or ppVarVal is UNDEFINED:
+            print ('Concrete evaluation left {} undefined, solving symbolically'.format(varName))
+            return None
+        if toInt(varVal) != toInt(ppVarVal):
+            mismatches.append((varName, toInt(varVal), 'pp' + varName, toInt(ppVarVal)))
+
+    print ('Decided by concrete evaluation')
+    smtResult = SMTResult('sat' if mismatches else 'unsat', mismatches)
+    smtResult.stats['concrete'] = True
+    return smtResult
+
+def checkRandom(parsedTree, prepackTree):
+    # SMTResult when some random input tells the programs apart, None when the SMT path has to decide
+    try:
+        found = randomDiff(parsedTree, prepackTree, RANDOM_LANES)
+    except ConcreteUnsupported as e:
+        print ('Random testing gave up ({}), solving symbolically'.format(e))
+        return None
+    if found is None:
+        print ('Random testing: {} lanes agree, solving symbolically'.format(RANDOM_LANES))
+        return None
+
+    mismatches, inputs = found
+    print ('Random testing found a counterexample for inputs {}'.format(
+        ', '.join('{}={}'.format(name, value) for name, value in sorted(inputs.items()))))
+    smtResult = SMTResult('sat', mismatches, inputs)
+    smtResult.stats['random'] = True
+    return smtResult
+
+def printVerdict(smtResult):
+    for var, varVal, ppVar, ppVarVal in smtResult.mismatches:
+        print ('{}={} vs. {}={}'.format(var, varVal, ppVar, ppVarVal))
+
+    if smtResult.verdict == 'sat':
         print ('sat')
-    elif smtResult.returncode == 2:
+    elif smtResult.verdict == 'unroll':
         print ('sat, but need to unroll more')
-        fileHandle.close()
-        return True
     else:
         print ('unsat')
 
+def finishResult(smtResult, timings, simplifier=None, widths=None):
+    printVerdict(smtResult)
+
+    print ('Formula: {} distinct nodes ({} built)'.format(len(TERMS), TERMS.built))
+
+    smtResult.timings = timings
+    smtResult.unrollDepth = LOOP_UNROLL_DEPTH
+    smtResult.stats.update({'termNodes': len(TERMS), 'termsBuilt': TERMS.built, 'loopDepths': dict(LOOP_DEPTHS)})
+    if simplifier is not None:
+        smtResult.stats.update({'removedVars': simplifier.removedVars, 'removedClauses': simplifier.removedClauses})
+    if widths is not None:
+        smtResult.stats.update({'narrowedVars': len(widths), 'savedBits': savedBits(widths)})
+    if PROFILE is not None:
+        ssaVariables = sum(1 for name, sort in TERMS.symbols.items() if sort == 'bv')
+        unrollLoops = {str(number): depth for number, depth in smtResult.unrollLoops.items()}
+        PROFILE.note(verdict=smtResult.verdict, unrollLoops=unrollLoops, ssaVariables=ssaVariables,
+                     termNodes=len(TERMS), termsBuilt=TERMS.built)
+    return smtResult
+
+def resultRecord(smtResult):
+    return {'verdict': smtResult.verdict, 'mismatches': smtResult.mismatches, 'model': smtResult.model,
+            'unrollDepth': smtResult.unrollDepth, 'timings': smtResult.timings, 'stats': smtResult.stats}
+
+def cachedResult(record, kind):
+    # SMTResult of a VERDICT_CACHE record, with the timings of the run that stored it
+    smtResult = SMTResult(record['verdict'], [tuple(mismatch) for mismatch in record['mismatches']], record['model'])
+    smtResult.timings = record['timings']
+    smtResult.unrollDepth = record['unrollDepth']
+    smtResult.stats = dict(record['stats'], cached=kind)
+    print ('Verdict cache hit on the {}'.format(kind))
+    printVerdict(smtResult)
+    return smtResult
+
+def formatLoopDepths(depths):
+    return ', '.join('{} to {}'.format('?' if number is None else number, depth)
+                     for number, depth in sorted(depths.items(), key=lambda item: (item[0] is None, item[0] or 0)))
+
+def verifyProgram(program, programFile, insertFake=False, fileName=None, incremental=False, prepackOutput=None, unrollDepth=2,
+                  smtFile=None):
+    """
+    Check program until the verdict no longer depends on the unroll depth,
+    doubling the depth (starting from unrollDepth) of the loops that were
+    under-unrolled, or LOOP_UNROLL_DEPTH when they aren't known.  Summarized
+    loops whose bounds may not hold are unrolled from LOOP_UNROLL_DEPTH on
+    """
+    global LOOP_UNROLL_DEPTH, LOOP_DEPTHS
+    LOOP_UNROLL_DEPTH = unrollDepth
+    LOOP_DEPTHS = {}
+    timings = {}
+
+    cacheKeys = None
+    # --dump, --smt2 and --profile ask for what only a real check produces
+    if VERDICT_CACHE is not None and fileName is None and smtFile is None and PROFILE is None:
+        if prepackOutput is None:
+            # Part of the key, the checks below reuse it
+            startTime = time.perf_counter()
+            prepackOutput = runPrepack(programFile)
+            timings['prepack'] = time.perf_counter() - startTime
+        VERDICT_CACHE.policy = {'unrollDepth': unrollDepth, 'incremental': incremental, 'insertFake': insertFake,
+                                'summarizeLoops': SUMMARIZE_LOOPS, 'boundLoops': BOUND_LOOPS}
+        sourceKey = VERDICT_CACHE.sourceKey(program, prepackOutput)
+        record = VERDICT_CACHE.get(sourceKey)
+        if record is not None:
+            return cachedResult(record, 'source')
+
+        loadBackends()
+        astKey = VERDICT_CACHE.astKey(esprima.parseScript(program), prepackOutput)
+        record = VERDICT_CACHE.get(astKey)
+        if record is not None:
+            VERDICT_CACHE.put([sourceKey], record)
+            return cachedResult(record, 'ast')
+        cacheKeys = [sourceKey, astKey]
+
+    runArgs = dict(program=program, insertFake=insertFake, fileName=fileName, incremental=incremental,
+                   programFile=programFile, prepackOutput=prepackOutput, smtFile=smtFile)
+
+    smtResult = main(loopUnroll=LOOP_UNROLL_DEPTH, cacheKeys=cacheKeys, **runArgs)
+    if 'cached' in smtResult.stats:
+        VERDICT_CACHE.put(cacheKeys, resultRecord(smtResult))
+        return smtResult
+    while True:
+        for phase, seconds in smtResult.timings.items():
+            timings[phase] = timings.get(phase, 0.0) + seconds
+        if smtResult.verdict != 'unroll':
+            break
+
+        print ()
+        if None in smtResult.unrollLoops or not smtResult.unrollLoops:
+            LOOP_UNROLL_DEPTH = LOOP_UNROLL_DEPTH * 2
+            print ('Increasing Loop Unroll Depth to {}'.format(LOOP_UNROLL_DEPTH))
+        newDepths = {number: depth * 2 or LOOP_UNROLL_DEPTH for number, depth in smtResult.unrollLoops.items() if number is not None}
+        if newDepths:
+            for number, depth in newDepths.items():
+                LOOP_DEPTHS[number] = max(depth, LOOP_DEPTHS.get(number, 0))
+            print ('Increasing unroll depth of loops {}'.format(formatLoopDepths(newDepths)))
+        smtResult = main(loopUnroll=LOOP_UNROLL_DEPTH, **runArgs)
+
+    smtResult.timings = timings
+    if cacheKeys is not None and smtResult.verdict in ('sat', 'unsat'):
+        VERDICT_CACHE.put(cacheKeys, resultRecord(smtResult))
+    return smtResult
+
+
+def translatorState(varTable, funcTable):
+    # SSA versions and function table a top-level statement starts from, by name
+    return (versionTable(varTable),
+            {lvl: {funcName: dict(localTable, varTable=versionTable({lvl: localTable['varTable']})[lvl])
+                   for funcName, localTable in funcs.items()}
+             for lvl, funcs in funcTable.items()})
+
+def restoreTable(table, versions, level, funcScope):
+    # table with the versions given, the symbols of the names it has are reused
+    restored = {}
+    for varName, count in versions.items():
+        symbol = table.get(varName)
+        if symbol is None:
+            symbol = SYMBOLS.intern(varName, level, funcScope)
+        SYMBOLS.counts[symbol] = count
+        restored[varName] = symbol
+    return restored
+
+def restoreState(state, varTable, funcTable):
+    stateVars, stateFuncs = state
+    oldVars, oldFuncs = dict(varTable), dict(funcTable)
+    varTable.clear()
+    funcTable.clear()
+    for lvl, versions in stateVars.items():
+        varTable[lvl] = restoreTable(oldVars.get(lvl, {}), versions, lvl, '')
+    for lvl, funcs in stateFuncs.items():
+        funcTable[lvl] = {}
+        for funcName, localTable in funcs.items():
+            oldTable = oldFuncs.get(lvl, {}).get(funcName, {}).get('varTable', {})
+            funcTable[lvl][funcName] = dict(localTable, varTable=restoreTable(oldTable, localTable['varTable'], lvl+1, funcName))
+
+def isWrapper(stmt):
+    # (function() { ... })(); runs its body in place, one level deeper
+    return (stmt.type == 'ExpressionStatement' and stmt.expression.type == 'CallExpression'
+            and stmt.expression.callee.type == 'FunctionExpression' and not stmt.expression.callee.params
+            and not stmt.expression.arguments)
+
+def commonPrefix(a, b):
+    # Length of the longest common prefix, halving over slice compares done in C
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+class WatchedStatement:
+    """
+    WatchedStatement
+        ast: esprima node of the statement
+        start, end: its offsets in the program text
+        level: scope level it is translated at, one deeper per wrapper function around it
+        block: number of the statement list it is in
+        source: its text
+        dirty: translate it again even though the text is the same
+        clauses: its clauses, with the ones it added to additionalSMT
+        loopRecords: records of the loops it translated
+        firstLoop, loops: number of its first loop and how many it has
+        before: (translatorState, loop records before it) it was translated from
+        guard: boolean its clauses are asserted under, None until asserted
+        names: variables its clauses mention, once asserted
+    """
+
+    def __init__(self, ast, start, end, level, block, source):
+        self.ast = ast
+        self.start = start
+        self.end = end
+        self.level = level
+        self.block = block
+        self.source = source
+        self.dirty = False
+        self.clauses = []
+        self.loopRecords = []
+        self.firstLoop = 0
+        self.loops = 0
+        self.before = None
+        self.guard = None
+        self.names = set()
+
+    def sameAs(self, other):
+        return not self.dirty and self.level == other.level and self.source == other.source
+
+    def moveTo(self, other):
+        # Same statement, parsed again at another place
+        self.ast, self.start, self.end, self.block = other.ast, other.start, other.end, other.block
+
+class WatchedProgram:
+    """
+    Translation of one program kept per statement: the top-level ones, and
+    those of wrapper functions in place of the wrapper
+        program: text of the program last parsed
+        tree: its esprima Script, None when only part of it was parsed
+        statements: WatchedStatement of every statement, in order
+        varTable, funcTable: translator state after the last one
+        end: translatorState after the last one
+    """
+
+    def __init__(self):
+        self.program = ''
+        self.tree = None
+        self.statements = []
+        self.blocks = 0
+        self.varTable = {}
+        self.funcTable = {}
+        self.end = translatorState({}, {})
+
+    def parse(self, program):
+        """
+        WatchedStatement of every statement of program.  Only the statements
+        around the text that changed since the last parse are parsed again,
+        the others are the old ones at their new offsets.
+        """
+        statements = self.reparse(program) if self.statements else None
+        if statements is None:
+            self.tree = esprima.parseScript(program, {'range': True})
+            statements = self.flatten(program, self.tree.body, 0, 0)
+        else:
+            self.tree = None
+        self.program = program
+        return statements
+
+    def flatten(self, program, body, offset, level, block=None):
+        if block is None:
+            self.blocks += 1
+            block = self.blocks
+        statements = []
+        for stmt in body:
+            if isWrapper(stmt):
+                statements += self.flatten(program, stmt.expression.callee.body.body, offset, level + 1)
+            else:
+                start, end = offset + stmt.range[0], offset + stmt.range[1]
+                statements.append(WatchedStatement(stmt, start, end, level, block, program[start:end]))
+        return statements
+
+    def reparse(self, program):
+        # Parse the statements the change touches with a neighbour on either
+        # side, which has to come out the same so nothing joins across the
+        # edges; None when the change isn't within one statement list
+        old, oldProgram = self.statements, self.program
+        prefix = commonPrefix(oldProgram, program)
+        suffix = min(commonPrefix(oldProgram[::-1], program[::-1]), min(len(oldProgram), len(program)) - prefix)
+        changeStart, changeEnd = prefix, len(oldProgram) - suffix
+        delta = len(program) - len(oldProgram)
+
+        # Statements ending after the change starts and starting before it ends, and their neighbours
+        after = bisect.bisect_right([statement.end for statement in old], changeStart)
+        first = max(after - 1, 0)
+        last = min(bisect.bisect_left([statement.start for statement in old], changeEnd), len(old) - 1)
+        block = old[min(after, last)].block
+        # A neighbour in another list is behind wrapper text, nothing joins across that
+        while first < last and old[first].block != block:
+            first += 1
+        while last > first and old[last].block != block:
+            last -= 1
+        spanStart, spanEnd = old[first].start, old[last].end
+        if changeStart < spanStart or changeEnd > spanEnd or any(statement.block != block for statement in old[first:last + 1]):
+            return None
+
+        try:
+            fragment = esprima.parseScript(program[spanStart:spanEnd + delta], {'range': True})
+        except esprima.Error:
+            return None
+        if not fragment.body:
+            return None
+        edges = []
+        if old[first].end <= changeStart:
+            edges.append((old[first], fragment.body[0], fragment.body[0].range[0] == 0))
+        if changeEnd <= old[last].start:
+            edges.append((old[last], fragment.body[-1], fragment.body[-1].range[1] == spanEnd + delta - spanStart))
+        for statement, stmt, aligned in edges:
+            if not aligned or program[spanStart + stmt.range[0]:spanStart + stmt.range[1]] != statement.source:
+                return None
+
+        parsed = self.flatten(program, fragment.body, spanStart, old[first].level, block)
+        for statement in old[last + 1:]:
+            statement.start += delta
+            statement.end += delta
+        return old[:first] + parsed + old[last + 1:]
+
+    def update(self, statements):
+        """
+        Translate the statements that changed since the last update: from
+        the first changed one on, until the state matches the one an
+        unchanged statement at the end was translated from.  Returns the
+        statements translated and the ones they replace.
+        """
+        global LOOP_NUMBERS
+        old = self.statements
+        prefix = 0
+        while prefix < min(len(old), len(statements)) and old[prefix].sameAs(statements[prefix]):
+            prefix += 1
+        suffix = 0
+        while suffix < min(len(old), len(statements)) - prefix and old[-1 - suffix].sameAs(statements[-1 - suffix]):
+            suffix += 1
+
+        restoreState(old[prefix].before[0] if prefix < len(old) else self.end, self.varTable, self.funcTable)
+        whileCount = [loopRecord for statement in old[:prefix] for loopRecord in statement.loopRecords]
+        firstLoop = old[prefix - 1].firstLoop + old[prefix - 1].loops if prefix else 0
+        added = []
+        reused = []
+        for index in range(prefix, len(statements)):
+            before = (translatorState(self.varTable, self.funcTable), len(whileCount))
+            if index >= len(statements) - suffix:
+                # The rest translates the same from the same state
+                match = old[len(old) - len(statements) + index]
+                if match.firstLoop == firstLoop and match.before == before:
+                    reused = old[len(old) - len(statements) + index:]
+                    restoreState(self.end, self.varTable, self.funcTable)
+                    break
+
+            parsed = statements[index]
+            statement = WatchedStatement(parsed.ast, parsed.start, parsed.end, parsed.level, parsed.block, parsed.source)
+            numbers = loopNumbers(statement.ast)
+            LOOP_NUMBERS = {key: firstLoop + number for key, number in numbers.items()}
+            statement.firstLoop, statement.loops, statement.before = firstLoop, len(numbers), before
+            additionalSMT = []
+            outExpr = printSMT(statement.ast, self.varTable, statement.level, '', self.funcTable, additionalSMT, 0, whileCount,
+                               LOOP_UNROLL_DEPTH)
+            statement.clauses = ([outExpr] if outExpr is not None else []) + additionalSMT
+            statement.loopRecords = whileCount[before[1]:]
+            VERSION_LOG.trim()
+            firstLoop += len(numbers)
+            added.append(statement)
+
+        kept = old[:prefix] + reused
+        for statement, parsed in zip(kept, statements[:prefix] + statements[len(statements) - len(reused):]):
+            if statement is not parsed:
+                statement.moveTo(parsed)
+        retracted = old[prefix:len(old) - len(reused)]
+        self.statements = old[:prefix] + added + reused
+        if not reused:
+            self.end = translatorState(self.varTable, self.funcTable)
+        return added, retracted
+
+    def invalidate(self, numbers):
+        # Statements with one of the loops, None for every statement with a loop
+        for statement in self.statements:
+            if any(number is None or statement.firstLoop <= number < statement.firstLoop + statement.loops for number in numbers):
+                statement.dirty = statement.loops > 0
+
+    def loopRecords(self):
+        return [loopRecord for statement in self.statements for loopRecord in statement.loopRecords]
+
+class WatchSession:
+    """
+    Resident translation and solver of one file, for --watch
+    Both programs are kept per top-level statement, each statement's clauses
+    asserted under a boolean of its own and solved with the booleans of the
+    current statements as assumptions.  An edit re-translates the statements
+    from the first changed one until the translator state matches the old
+    one again, the clauses of the replaced statements drop out of the
+    assumptions and are only deleted when the solver is rebuilt.
+    Globals proven equal stay proven until a statement connected to them
+    through shared variables changes, the goal only compares the others
+    (clauses outside a global's cone don't matter to it, see cone_slice).
+    Concrete evaluation, random testing, simplification, slicing and range
+    analysis work on the whole program and are skipped.
+        original, prepack: WatchedProgram of either program, None before the first check
+        terms, symbols, versionLog, checkLoops, loopDepths, unrollDepth: the
+            translator globals of this session, installed for each check
+        readers: variable name -> current statements whose clauses mention it
+        proven: (var, ppVar) pairs equal in every model of the current statements
+        garbage: clauses in the solver that are no longer assumed
+    """
+
+    def __init__(self, programFile, insertFake=False, unrollDepth=2):
+        self.programFile = programFile
+        self.insertFake = insertFake
+        self.original = None
+        self.prepack = None
+        self.terms = TermTable()
+        self.symbols = SymbolTable(self.terms)
+        self.versionLog = VersionLog()
+        self.checkLoops = {}
+        self.loopDepths = {}
+        self.unrollDepth = unrollDepth
+        self.solver = None
+        self.builder = None
+        self.guards = 0
+        self.readers = {}
+        self.proven = set()
+        self.garbage = 0
+
+    def install(self):
+        global TERMS, SYMBOLS, VERSION_LOG, CHECK_LOOPS, LOOP_DEPTHS, LOOP_UNROLL_DEPTH, LOOP_NUMBERS, LOOP_BOUNDS, INCREMENTAL_MODE
+        global SCOPE_LEVELS
+        TERMS, SYMBOLS, VERSION_LOG, CHECK_LOOPS, LOOP_DEPTHS = self.terms, self.symbols, self.versionLog, self.checkLoops, self.loopDepths
+        # Edits change what the statements around them see, lookups walk the levels
+        SCOPE_LEVELS = {}
+        LOOP_UNROLL_DEPTH = self.unrollDepth
+        LOOP_NUMBERS = {}
+        LOOP_BOUNDS = {}
+        # Deepening starts over from the current depths instead
+        INCREMENTAL_MODE = False
+        del PATH_CONDITIONS[:]
+
+    def assertStatement(self, statement):
+        self.guards += 1
+        statement.guard = 'watch{}'.format(self.guards)
+        statement.names = self.assertGuarded(statement.guard, statement.clauses)
+        statement.names.discard(statement.guard)
+        for name in statement.names:
+            self.readers.setdefault(name, set()).add(statement)
+
+    def assertGuarded(self, guard, clauses):
+        # Only these clauses' variables are declared, not every symbol so far
+        root = TERMS.mk('implies', TERMS.boolVar(guard), TERMS.conj(clauses))
+        names = set()
+        for term in postorder([root]):
+            if term.op in ('var', 'boolvar'):
+                self.builder.declare(term.args[0], term.op == 'boolvar')
+                names.add(term.args[0])
+        self.solver.add(self.builder.convert(root))
+        return names
+
+    def affectedNames(self, statements):
+        # Names connected to the statements through the current ones
+        names = set()
+        visited = set(statements)
+        stack = [name for statement in statements for name in statement.names]
+        while stack:
+            name = stack.pop()
+            if name in names:
+                continue
+            names.add(name)
+            for statement in self.readers.get(name, ()):
+                if statement not in visited:
+                    visited.add(statement)
+                    stack += statement.names
+        return names
+
+    def rebuild(self):
+        # A new solver with only the current statements
+        self.solver = z3.Solver()
+        self.builder = Z3Builder()
+        self.garbage = 0
+        for statement in self.original.statements + self.prepack.statements:
+            self.assertStatement(statement)
+
+    def check(self, program):
+        global LOOP_BOUNDS, LOOP_UNROLL_DEPTH
+        timings = {'parse': 0.0, 'translate': 0.0, 'prepack': 0.0, 'solve': 0.0}
+        self.install()
+        first = self.original is None
+        if first:
+            self.original = WatchedProgram()
+            self.prepack = WatchedProgram()
+            self.solver = z3.Solver()
+            self.builder = Z3Builder()
+
+        startTime = time.perf_counter()
+        statements = self.original.parse(program)
+        timings['parse'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        prepackProgram = prepackSource(runPrepack(self.programFile), self.insertFake)
+        timings['prepack'] += time.perf_counter() - startTime
+        startTime = time.perf_counter()
+        prepackStatements = self.prepack.parse(prepackProgram)
+        timings['parse'] += time.perf_counter() - startTime
+
+        if first and BOUND_LOOPS:
+            # Only the first translation starts from the bounds, later ones from the depths it ended at
+            LOOP_BOUNDS = loopBounds(self.original.tree)
+        translated = 0
+        while True:
+            startTime = time.perf_counter()
+            added, retracted = self.original.update(statements)
+            ppAdded, ppRetracted = self.prepack.update(prepackStatements)
+            LOOP_BOUNDS = {}
+            for statement in added:
+                for loopRecord in statement.loopRecords:
+                    if loopRecord['number'] is not None:
+                        LOOP_DEPTHS[loopRecord['number']] = max(loopRecord['depth'], LOOP_DEPTHS.get(loopRecord['number'], 0))
+            _, connectingVars = compareGlobals(self.original.varTable, self.prepack.varTable)
+            timings['translate'] += time.perf_counter() - startTime
+            translated += len(added) + len(ppAdded)
+
+            startTime = time.perf_counter()
+            for statement in retracted + ppRetracted:
+                for name in statement.names:
+                    self.readers[name].discard(statement)
+            self.garbage += sum(len(statement.clauses) for statement in retracted + ppRetracted)
+            live = self.original.statements + self.prepack.statements
+            if self.garbage > max(len(live), 1000):
+                self.rebuild()
+            else:
+                for statement in added + ppAdded:
+                    self.assertStatement(statement)
+
+            affected = self.affectedNames(added + ppAdded + retracted + ppRetracted)
+            self.proven = set(pair for pair in self.proven if pair[0] not in affected and pair[1] not in affected)
+            pending = [pair for pair in connectingVars if pair not in self.proven]
+            if not pending:
+                smtResult = SMTResult('unsat')
+                timings['solve'] += time.perf_counter() - startTime
+                break
+
+            # The goal changes with every edit, it is retracted like a statement
+            self.guards += 1
+            goalGuard = 'watch{}'.format(self.guards)
+            self.assertGuarded(goalGuard, [TERMS.mk('not', TERMS.conj([TERMS.mk('==', TERMS.var(var), TERMS.var(ppVar))
+                                                                        for var, ppVar in pending]))])
+            self.garbage += 1
+
+            loopRecords = self.original.loopRecords()
+            assumptions = [self.builder.declare(statement.guard, boolean=True) for statement in live]
+            assumptions.append(self.builder.declare(goalGuard, boolean=True))
+            unwinding = [(loopRecord['number'], loopRecord['depth'], self.builder.declare(loopRecord['unwind'], boolean=True))
+                         for loopRecord in loopRecords if 'unwind' in loopRecord]
+            loopChecks = [loopRecord['check'] for loopRecord in loopRecords if 'unwind' not in loopRecord]
+            smtResult = checkSolver(self.solver, self.builder, pending, loopChecks, assumptions, unwinding)
+            timings['solve'] += time.perf_counter() - startTime
+            if smtResult.verdict == 'unsat':
+                self.proven.update(pending)
+            if smtResult.verdict != 'unroll':
+                break
+
+            # Only the statements with the loops are translated again
+            if None in smtResult.unrollLoops or not smtResult.unrollLoops:
+                LOOP_UNROLL_DEPTH = self.unrollDepth = LOOP_UNROLL_DEPTH * 2
+                print ('Increasing Loop Unroll Depth to {}'.format(LOOP_UNROLL_DEPTH))
+            newDepths = {number: depth * 2 or LOOP_UNROLL_DEPTH for number, depth in smtResult.unrollLoops.items() if number is not None}
+            if newDepths:
+                for number, depth in newDepths.items():
+                    LOOP_DEPTHS[number] = max(depth, LOOP_DEPTHS.get(number, 0))
+                print ('Increasing unroll depth of loops {}'.format(formatLoopDepths(newDepths)))
+            self.original.invalidate(list(smtResult.unrollLoops) or [None])
+            statements, prepackStatements = self.original.statements, self.prepack.statements
+
+        total = len(self.original.statements) + len(self.prepack.statements)
+        print ('Translated {} of {} statements, compared {} of {} globals'.format(translated, total, len(pending), len(connectingVars)))
+        printVerdict(smtResult)
+        smtResult.timings = timings
+        smtResult.stats = {'translatedStatements': translated, 'statements': total, 'comparedGlobals': len(pending),
+                           'loopDepths': dict(LOOP_DEPTHS)}
+        return smtResult
+
+def fileStamp(programFile):
+    try:
+        stat = os.stat(programFile)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+def watchProgram(programFile, insertFake=False, unrollDepth=2):
+    """
+    Check programFile, then again whenever it changes, until interrupted
+    """
+    loadBackends()
+    session = WatchSession(programFile, insertFake, unrollDepth)
+    stamp = None
+    while True:
+        newStamp = fileStamp(programFile)
+        if newStamp is not None and newStamp != stamp:
+            stamp = newStamp
+            with open(programFile) as f:
+                program = f.read()
+            startTime = time.perf_counter()
+            try:
+                session.check(program)
+            except esprima.Error as e:
+                # Most likely saved halfway through an edit
+                print ('Parse error: {}'.format(e))
+            except (SystemExit, subprocess.CalledProcessError, PrepackTimeout) as e:
+                # The translator exit()s on unsupported input, possibly halfway through the state
+                print ('Check failed: {}'.format(e))
+                session = WatchSession(programFile, insertFake, session.unrollDepth)
+            print ('Checked in {:.3f}s, watching {}'.format(time.perf_counter() - startTime, programFile))
+            print ()
+        time.sleep(WATCH_INTERVAL)
+
 
 if __name__ == '__main__':
 
@@ -707,6 +2216,58 @@ if __name__ == '__main__':
     parser.add_argument("-v", "--verbose", help="increase output verbosity",
                     action="store_true")
     parser.add_argument("-f", "--file", help="input JavaScript file (default simple_script.js)")
+    parser.add_argument("-i", "--incremental", help="deepen loops incrementally, reusing the translation and solver",
+                    action="store_true")
+    parser.add_argument("--no-prepack-cache", help="always run prepack instead of using the on-disk cache",
+                    action="store_true")
+    parser.add_argument("--prepack-cache-dir", default=DEFAULT_CACHE_DIR,
+                    help="prepack output cache directory (default {})".format(DEFAULT_CACHE_DIR))
+    parser.add_argument("--prepack-cache-size", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                    help="prepack output cache size in MB (default {})".format(DEFAULT_MAX_BYTES // (1024 * 1024)))
+    parser.add_argument("--prepack-workers", type=int, default=1,
+                    help="resident prepack worker processes, 0 to spawn prepack per file (default 1)")
+    parser.add_argument("--prepack-worker-cmd", default=None,
+                    help="command line of a prepack worker (default: node prepack_worker.js)")
+    parser.add_argument("--prepack-timeout", type=float, default=DEFAULT_TIMEOUT,
+                    help="seconds allowed per prepack request (default {})".format(DEFAULT_TIMEOUT))
+    parser.add_argument("--summary-cache-dir", default=None,
+                    help="also keep translated function summaries in this directory")
+    parser.add_argument("--no-verdict-cache", help="always check instead of reusing the result of an earlier check",
+                    action="store_true")
+    parser.add_argument("--verdict-cache-dir", default=VERDICT_CACHE_DIR,
+                    help="verdict cache directory (default {})".format(VERDICT_CACHE_DIR))
+    parser.add_argument("--watch", help="check again whenever the file changes, translating only the edited statements",
+                    action="store_true")
+    parser.add_argument("--profile", nargs='?', const='profile.json', default=None, metavar="FILE",
+                    help="write time and peak memory per phase, translation time per AST node type, formula sizes "
+                         "and z3 statistics as JSON (default profile.json); tracing memory slows the check down")
+    parser.add_argument("--dump", nargs='?', const='pyz3_output.py', default=None,
+                    help="also write the query as a standalone z3 script (default pyz3_output.py)")
+    parser.add_argument("--smt2", default=None, metavar="FILE",
+                    help="stream the formula to this SMT-LIB2 file while translating and solve from it, "
+                         "compressed if it ends in .gz or .xz")
+    parser.add_argument("--portfolio", nargs='?', const='', default=None, metavar="CONFIGS",
+                    help="race solver configurations in separate processes, first answer wins; comma separated "
+                         "from {} (default: every installed one)".format(', '.join(PORTFOLIO_CONFIGS)))
+    parser.add_argument("--no-simplify", help="hand the formula to the solver without constant and copy propagation",
+                    action="store_true")
+    parser.add_argument("--no-concrete", help="always solve symbolically, even for programs without free inputs",
+                    action="store_true")
+    parser.add_argument("--random-lanes", type=int, default=DEFAULT_LANES, metavar="N",
+                    help="random inputs tried on both programs before solving, 0 to skip "
+                         "(default %(default)s, needs numpy)")
+    parser.add_argument("--no-loop-summaries", help="unroll every loop, even affine induction loops with a closed form",
+                    action="store_true")
+    parser.add_argument("--no-loop-bounds", help="start every loop at the unroll depth instead of its static iteration bound",
+                    action="store_true")
+    parser.add_argument("--no-narrow", help="declare every variable with 32 bits, even when its range fits in fewer",
+                    action="store_true")
+    parser.add_argument("--int-arith", help="solve over integers with wraparound guards when the formula is linear "
+                                            "(in-process solver only)",
+                    action="store_true")
+    parser.add_argument("--slice-workers", type=int, default=SLICE_WORKERS, metavar="N",
+                    help="solve one query per group of globals with connected cones, N at a time, "
+                         "0 to solve the query as a whole (default %(default)s)")
     args = parser.parse_args()
 
 
@@ -719,6 +2280,43 @@ if __name__ == '__main__':
     if args.file:
         programFile = args.file
 
+    if not args.no_prepack_cache:
+        PREPACK_CACHE = PrepackCache(args.prepack_cache_dir, args.prepack_cache_size * 1024 * 1024)
+
+    if args.no_concrete:
+        CONCRETE_STEPS = 0
+
+    if args.no_simplify:
+        SIMPLIFY = False
+
+    RANDOM_LANES = args.random_lanes
+    SLICE_WORKERS = args.slice_workers
+    if args.no_loop_summaries:
+        SUMMARIZE_LOOPS = False
+    if args.no_loop_bounds:
+        BOUND_LOOPS = False
+    if args.no_narrow:
+        NARROW_WIDTHS = False
+    if args.int_arith:
+        INTEGER_ARITHMETIC = True
+
+    if args.portfolio is not None:
+        SOLVER_PORTFOLIO = [name for name in args.portfolio.split(',') if name]
+        for name in SOLVER_PORTFOLIO:
+            if name not in PORTFOLIO_CONFIGS:
+                print ('Unknown solver configuration {}, choose from {}'.format(name, ', '.join(PORTFOLIO_CONFIGS)))
+                exit(-1)
+
+    if args.summary_cache_dir:
+        SUMMARY_CACHE = FunctionSummaryCache(args.summary_cache_dir)
+
+    if not args.no_verdict_cache:
+        VERDICT_CACHE = VerdictCache(args.verdict_cache_dir, VERDICT_CACHE_BYTES)
+
+    if args.prepack_workers > 0:
+        workerCmd = args.prepack_worker_cmd.split() if args.prepack_worker_cmd else None
+        PREPACK_POOL = PrepackWorkerPool(args.prepack_workers, workerCmd, args.prepack_timeout)
+
     try:
         with open(programFile) as f:
             program = f.read()
@@ -727,11 +2325,20 @@ if __name__ == '__main__':
         exit(-1)
 
 
-    tempFile = 'pyz3_output.py'
-    redo = main(program=program, loopUnroll=LOOP_UNROLL_DEPTH, insertFake=INSERT_FAKE_CODE, fileName=tempFile)
+    if args.watch:
+        try:
+            watchProgram(programFile, insertFake=INSERT_FAKE_CODE, unrollDepth=LOOP_UNROLL_DEPTH)
+        except KeyboardInterrupt:
+            pass
+        exit(0)
 
-    while redo:
-        LOOP_UNROLL_DEPTH = LOOP_UNROLL_DEPTH * 2
-        print ()
-        print ('Increasing Loop Unroll Depth to {}'.format(LOOP_UNROLL_DEPTH))
-        redo = main(program=program, loopUnroll=LOOP_UNROLL_DEPTH, insertFake=INSERT_FAKE_CODE, fileName=tempFile)
+    if args.profile:
+        PROFILE = Profile()
+
+    tempFile = args.dump
+    smtResult = verifyProgram(program, programFile, insertFake=INSERT_FAKE_CODE, fileName=tempFile,
+                              incremental=args.incremental, unrollDepth=LOOP_UNROLL_DEPTH, smtFile=args.smt2)
+
+    if PROFILE is not None:
+        PROFILE.write(args.profile, file=programFile, verdict=smtResult.verdict, timings=smtResult.timings)
+        print ('Profile written to {}'.format(args.profile))